@@ -0,0 +1,160 @@
+import asyncio
+import concurrent.futures
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+from app.services.instances.restaurant import Restaurant, RestaurantsGroup
+from app.config.config import CONF
+from app.utils.logger import setup_logger
+
+# 设置日志
+LOGGER = setup_logger("moco.log")
+
+
+class AsyncRestaurantEnricher:
+    """
+    基于asyncio的餐厅信息补全引擎
+
+    单个餐厅内互不依赖的网络步骤（英文名、英文地址、区域街道）并发执行，类型分类排在区域街道之后，
+    所有餐厅的请求复用同一个事件循环，并按API端点共享并发上限
+    """
+    # 默认的各端点并发上限
+    DEFAULT_LIMITS = {'youdao': 8, 'gaode': 16, 'kimi': 4}
+
+    # 需要网络I/O的步骤及其对应端点：各链之间互不依赖、并发执行，链内按顺序执行
+    # （类型分类会读取区域街道步骤写入的餐厅信息，与顺序补全generate()保持相同的先后关系）
+    IO_CHAINS = [
+        [('_generate_english_name', 'youdao')],
+        [('_generate_english_address', 'youdao')],
+        [('_extract_district_and_street_v2', 'gaode'), ('_generate_type', 'kimi')],
+    ]
+
+    def __init__(self, conf=CONF, max_in_flight: int = 64, limits: Optional[Dict[str, int]] = None,
+                 log: Optional[Callable[[str, str], None]] = None):
+        """
+        初始化补全引擎
+
+        :param conf: 配置服务实例
+        :param max_in_flight: 同时在途的阻塞调用上限
+        :param limits: 各端点并发上限，如 {'youdao': 8, 'gaode': 16, 'kimi': 4}
+        :param log: 日志函数，签名为 log(level, message)
+        """
+        self.conf = conf
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.limits = dict(self.DEFAULT_LIMITS)
+        if limits:
+            self.limits.update(limits)
+        self.log = log or self._default_log
+        self.success_count = 0
+        self.failed_count = 0
+
+    @staticmethod
+    def _default_log(level: str, message: str) -> None:
+        if level == "ERROR":
+            LOGGER.error(message)
+        elif level == "WARNING":
+            LOGGER.warning(message)
+        else:
+            LOGGER.info(message)
+
+    async def _run_blocking(self, func, *args):
+        loop = asyncio.get_running_loop()
+        async with self._in_flight:
+            return await loop.run_in_executor(self._executor, func, *args)
+
+    async def _run_step(self, restaurant: Restaurant, step: str, endpoint: str) -> bool:
+        """
+        在端点并发上限内执行单个I/O步骤
+        """
+        async with self._semaphores[endpoint]:
+            return await self._run_blocking(getattr(restaurant, step))
+
+    async def _run_chain(self, restaurant: Restaurant, chain: List[Tuple[str, str]]) -> List[Tuple[str, object]]:
+        """
+        按顺序执行一条I/O步骤链，某一步异常时仍继续执行后续步骤（与generate()一致）
+
+        :return: [(步骤名, 返回值或异常), ...]
+        """
+        results = []
+        for step, endpoint in chain:
+            try:
+                results.append((step, await self._run_step(restaurant, step, endpoint)))
+            except Exception as e:
+                results.append((step, e))
+        return results
+
+    async def _enrich_one(self, restaurant: Restaurant, idx: int, total: int) -> Tuple[int, Optional[str]]:
+        """
+        补全单个餐厅：先执行本地步骤，再并发执行I/O步骤，最后执行依赖前序结果的步骤
+        """
+        start_time = time.time()
+        restaurant_name = getattr(restaurant.inst, 'rest_chinese_name', f"餐厅_{idx}")
+        try:
+            success = restaurant._generate_id_by_name()
+            success &= restaurant._generate_belonged_cp()
+
+            chain_results = await asyncio.gather(
+                *[self._run_chain(restaurant, chain) for chain in self.IO_CHAINS])
+            for step, res in (item for results in chain_results for item in results):
+                if isinstance(res, Exception):
+                    self.log("WARNING", f"[{idx+1}/{total}] 餐厅 {restaurant_name} 步骤 {step} 异常: {res}")
+                    success = False
+                else:
+                    success &= bool(res)
+
+            success &= restaurant._generate_contact_info()
+            success &= restaurant._calculate_distance(restaurant.cp_location)
+            success &= restaurant._generate_verified_date()
+
+            if success:
+                restaurant.status = 'ready'
+                success = restaurant.check()
+
+            elapsed = time.time() - start_time
+            if success:
+                self.success_count += 1
+                self.log("INFO", f"[{idx+1}/{total}] 完成处理餐厅: {restaurant_name}，耗时: {elapsed:.2f}秒")
+                return idx, None
+            self.failed_count += 1
+            self.log("WARNING", f"[{idx+1}/{total}] 餐厅 {restaurant_name} 信息未完整生成，耗时: {elapsed:.2f}秒")
+            return idx, "信息未完整生成"
+        except Exception as e:
+            self.failed_count += 1
+            self.log("ERROR", f"[{idx+1}/{total}] 处理餐厅 {restaurant_name} 时出错: {e}\n{traceback.format_exc()}")
+            return idx, str(e)
+
+    async def _enrich_all(self, restaurants: List[Restaurant]) -> None:
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._semaphores = {endpoint: asyncio.Semaphore(max(1, int(limit)))
+                            for endpoint, limit in self.limits.items()}
+        total = len(restaurants)
+        tasks = [asyncio.create_task(self._enrich_one(r, idx, total)) for idx, r in enumerate(restaurants)]
+        done_count = 0
+        for task in asyncio.as_completed(tasks):
+            await task
+            done_count += 1
+            if done_count % 10 == 0 or done_count == total:
+                self.log("INFO", f"进度: {done_count}/{total} ({done_count / total * 100:.1f}%)")
+
+    def run(self, restaurants_group: RestaurantsGroup) -> RestaurantsGroup:
+        """
+        补全餐厅组合中所有餐厅的信息
+
+        :param restaurants_group: 餐厅组合
+        :return: 处理后的餐厅组合（成员与原组合相同且顺序不变）
+        """
+        restaurants = restaurants_group.members
+        if not restaurants:
+            self.log("WARNING", "餐厅列表为空，无需生成信息")
+            return restaurants_group
+
+        self.log("INFO", f"使用异步引擎处理 {len(restaurants)} 个餐厅，在途上限: {self.max_in_flight}，端点并发: {self.limits}")
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_in_flight, thread_name_prefix="moco-enrich")
+        try:
+            asyncio.run(self._enrich_all(restaurants))
+        finally:
+            self._executor.shutdown(wait=True)
+
+        self.log("INFO", f"餐厅信息生成完成，共处理 {len(restaurants)} 个餐厅，成功: {self.success_count}，失败: {self.failed_count}")
+        return RestaurantsGroup(list(restaurants), group_type=restaurants_group.group_type)
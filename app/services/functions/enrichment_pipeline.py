@@ -0,0 +1,430 @@
+import time
+import traceback
+import concurrent.futures
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from app.services.instances.restaurant import (
+    Restaurant, RestaurantsGroup, query_gaode, lookup_gaode_poi, get_city_code_from_excel,
+    extract_district_from_address
+)
+from app.config.config import CONF
+from app.utils.logger import setup_logger
+from app.utils.query import robust_query, is_circuit_open
+
+# 设置日志
+LOGGER = setup_logger("moco.log")
+
+
+def _is_missing(value) -> bool:
+    """判断字段是否缺失（None/NaN/空字符串）"""
+    if value is None:
+        return True
+    try:
+        if pd.isna(value):
+            return True
+    except (TypeError, ValueError):
+        pass
+    return not value
+
+
+class CityGeoIndex:
+    """
+    单个城市的地理索引，由高德行政区划树一次性构建，
+    提供区县候选、各区县下的街道候选以及街道中心点数组
+    """
+    def __init__(self, geoinfo: Optional[Dict]):
+        self.districts = []
+        self.streets_by_district = defaultdict(list)
+        self.all_streets = []
+        self._centers = {}
+        if geoinfo:
+            self._build(geoinfo)
+
+    def _build(self, item: Dict, district_name: Optional[str] = None) -> None:
+        level = item.get('level', '')
+        name = item.get('name', '')
+        if level == 'district':
+            self.districts.append({'name': name, 'center': item.get('center', '')})
+            district_name = name
+        elif level == 'street':
+            street = {'name': name, 'center': item.get('center', '')}
+            self.all_streets.append(street)
+            if district_name:
+                self.streets_by_district[district_name].append(street)
+        for child in item.get('districts', []) or []:
+            self._build(child, district_name)
+
+    def street_candidates(self, district: Optional[str]) -> List[Dict]:
+        if district:
+            return self.streets_by_district.get(district, [])
+        return self.all_streets
+
+    def street_centers(self, district: Optional[str]) -> np.ndarray:
+        """返回街道中心点数组（经度, 纬度），按区县缓存"""
+        key = district or ''
+        if key not in self._centers:
+            centers = []
+            for street in self.street_candidates(district):
+                try:
+                    lng, lat = street['center'].split(',')
+                    centers.append((float(lng), float(lat)))
+                except (ValueError, AttributeError):
+                    centers.append((np.inf, np.inf))
+            self._centers[key] = np.array(centers, dtype=float).reshape(-1, 2)
+        return self._centers[key]
+
+
+class PipelineStage:
+    """
+    补全流水线中的一个阶段，作用于整个餐厅组合
+    """
+    def __init__(self, name: str, func: Callable[[List[Restaurant]], None], deps: List[str] = None):
+        self.name = name
+        self.func = func
+        self.deps = deps or []
+
+
+class RestaurantEnrichmentPipeline:
+    """
+    按阶段批量补全餐厅信息的流水线
+
+    与 Restaurant.generate() 逐个餐厅顺序执行不同，这里每个阶段一次处理整个餐厅组合，
+    并按依赖关系（DAG）调度：同一层级的阶段并行执行，各阶段内部使用批量原语
+    （去重翻译、按城市构建一次地理索引、向量化距离计算等），并记录每个阶段的耗时
+    """
+    def __init__(self, conf=CONF, num_workers: int = 8, log: Optional[Callable[[str, str], None]] = None):
+        """
+        初始化流水线
+
+        :param conf: 配置服务实例
+        :param num_workers: 阶段内部并发请求数
+        :param log: 日志函数，签名为 log(level, message)
+        """
+        self.conf = conf
+        self.num_workers = max(1, int(num_workers))
+        self.log = log or self._default_log
+        self.timings = {}
+        self.geo_indexes = {}
+        self.stages = {}
+        for stage in self._default_stages():
+            self.add_stage(stage)
+
+    @staticmethod
+    def _default_log(level: str, message: str) -> None:
+        if level == "ERROR":
+            LOGGER.error(message)
+        elif level == "WARNING":
+            LOGGER.warning(message)
+        else:
+            LOGGER.info(message)
+
+    def _default_stages(self) -> List[PipelineStage]:
+        return [
+            PipelineStage('id', self._stage_id),
+            PipelineStage('belonged_cp', self._stage_belonged_cp),
+            PipelineStage('english_name', self._stage_english_name, ['id']),
+            PipelineStage('english_address', self._stage_english_address, ['id']),
+            PipelineStage('district_street', self._stage_district_street, ['id']),
+            PipelineStage('type', self._stage_type, ['district_street']),
+            PipelineStage('contact', self._stage_contact, ['id']),
+            PipelineStage('distance', self._stage_distance, ['belonged_cp']),
+            PipelineStage('verified_date', self._stage_verified_date,
+                          ['english_name', 'english_address', 'type', 'contact', 'distance']),
+        ]
+
+    def add_stage(self, stage: PipelineStage) -> None:
+        """
+        添加或替换阶段
+        """
+        self.stages[stage.name] = stage
+
+    def _levels(self) -> List[List[PipelineStage]]:
+        """
+        按依赖关系对阶段进行拓扑分层
+        """
+        remaining = dict(self.stages)
+        done = set()
+        levels = []
+        while remaining:
+            ready = [s for s in remaining.values() if all(d in done or d not in self.stages for d in s.deps)]
+            if not ready:
+                raise ValueError(f"流水线阶段存在循环依赖: {list(remaining)}")
+            levels.append(ready)
+            for s in ready:
+                done.add(s.name)
+                del remaining[s.name]
+        return levels
+
+    def _map(self, func: Callable, items: List, max_workers: Optional[int] = None) -> List:
+        """
+        并发执行阻塞调用，保持结果顺序
+        """
+        if not items:
+            return []
+        workers = min(max_workers or self.num_workers, len(items))
+        if workers <= 1:
+            return [func(item) for item in items]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(func, items))
+
+    def _limit(self, endpoint: str, default: int) -> int:
+        limits = getattr(self.conf.runtime, 'API_CONCURRENCY', None) or {}
+        return max(1, int(limits.get(endpoint, default)))
+
+    # ================== 阶段实现 ==================
+
+    def _stage_id(self, members: List[Restaurant]) -> None:
+        for r in members:
+            r._generate_id_by_name()
+
+    def _stage_belonged_cp(self, members: List[Restaurant]) -> None:
+        for r in members:
+            r._generate_belonged_cp()
+
+    def _dedup_generate(self, members: List[Restaurant], source_field: str, target_field: str, step: str) -> None:
+        """
+        按源字段去重后只对每个不同的文本调用一次生成步骤，再把结果复制给同名餐厅
+        """
+        groups = defaultdict(list)
+        for r in members:
+            if _is_missing(getattr(r.inst, target_field, None)):
+                groups[getattr(r.inst, source_field, None)].append(r)
+        if not groups:
+            return
+        representatives = [rs[0] for rs in groups.values()]
+        self._map(lambda r: getattr(r, step)(), representatives, self._limit('youdao', 8))
+        for rs in groups.values():
+            value = getattr(rs[0].inst, target_field, None)
+            for r in rs[1:]:
+                setattr(r.inst, target_field, value)
+        self.log("INFO", f"{target_field}: {sum(len(rs) for rs in groups.values())} 条记录，去重后实际翻译 {len(groups)} 条")
+
+    def _stage_english_name(self, members: List[Restaurant]) -> None:
+        self._dedup_generate(members, 'rest_chinese_name', 'rest_english_name', '_generate_english_name')
+
+    def _stage_english_address(self, members: List[Restaurant]) -> None:
+        self._dedup_generate(members, 'rest_chinese_address', 'rest_english_address', '_generate_english_address')
+
+    def _get_geo_index(self, city: str) -> CityGeoIndex:
+        """
+        每个城市只获取一次行政区划并构建索引
+        """
+        if city not in self.geo_indexes:
+            geoinfo = None
+            runtime_geoinfo = getattr(self.conf.runtime, 'geoinfo', None)
+            if isinstance(runtime_geoinfo, dict):
+                geoinfo = runtime_geoinfo.get(city)
+            if geoinfo is None:
+                geoinfo = robust_query(query_gaode, self.conf.KEYS.gaode_keys, endpoint='gaode_district',
+                                       hedge=True, cache_key=city, city=city)
+                if geoinfo is not None:
+                    if not isinstance(runtime_geoinfo, dict):
+                        setattr(self.conf.runtime, 'geoinfo', {})
+                    self.conf.runtime.geoinfo[city] = geoinfo
+                else:
+                    self.log("ERROR", f"无法获取城市 {city} 的地理信息")
+            self.geo_indexes[city] = CityGeoIndex(geoinfo)
+        return self.geo_indexes[city]
+
+    def _lookup_districts_by_poi(self, pending: List[Restaurant]) -> None:
+        """
+        对无法从地址直接提取区域的餐厅，按(地址, 城市代码)去重后并发查询POI
+        """
+        city_codes = {}
+        for rest_city in {r.inst.rest_city for r in pending}:
+            city_codes[rest_city] = get_city_code_from_excel(rest_city)
+
+        queries = defaultdict(list)
+        for r in pending:
+            city_code = city_codes.get(r.inst.rest_city)
+            if not city_code:
+                r.inst.rest_district = "未知区"
+                continue
+            queries[(r.inst.rest_chinese_address, city_code)].append(r)
+
+        def poi_lookup(query):
+            address, city_code = query
+            return lookup_gaode_poi(self.conf.KEYS.gaode_keys, address, city_code, "050000",
+                                    use_cache=getattr(self.conf.runtime, 'POI_CACHE', True))
+
+        query_keys = list(queries)
+        results = self._map(poi_lookup, query_keys, self._limit('gaode', 16))
+        for query, poi_result in zip(query_keys, results):
+            adname = ''
+            if poi_result and poi_result.get('pois'):
+                adname = poi_result['pois'][0].get('adname', '')
+            for r in queries[query]:
+                if adname:
+                    r.inst.rest_district = adname
+                elif is_circuit_open('gaode_poi'):
+                    r.inst.rest_district = r.inst.rest_city.split("市")[0] + "区"
+                else:
+                    r.inst.rest_district = "未知区"
+
+    def _assign_streets(self, index: CityGeoIndex, district: Optional[str], members: List[Restaurant]) -> None:
+        """
+        同一区县的餐厅共享街道候选：先做地址包含匹配，剩余的按经纬度向量化求最近街道
+        """
+        candidates = index.street_candidates(district)
+        nearest_needed = []
+        for r in members:
+            address = r.inst.rest_chinese_address or ''
+            matched = next((s['name'] for s in candidates if s['name'] in address), None)
+            if matched:
+                r.inst.rest_street = matched
+            elif _is_missing(getattr(r.inst, 'rest_location', None)) or not candidates:
+                r.inst.rest_street = "未知街道"
+            else:
+                nearest_needed.append(r)
+        if not nearest_needed:
+            return
+
+        centers = index.street_centers(district)
+        points = []
+        valid = []
+        for r in nearest_needed:
+            try:
+                lng, lat = str(r.inst.rest_location).split(',')
+                points.append((float(lng), float(lat)))
+                valid.append(r)
+            except ValueError:
+                r.inst.rest_street = "未知街道"
+        if not valid:
+            return
+        points = np.array(points, dtype=float)
+        dist = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        nearest = dist.argmin(axis=1)
+        for r, i in zip(valid, nearest):
+            r.inst.rest_street = candidates[int(i)]['name']
+
+    def _stage_district_street(self, members: List[Restaurant]) -> None:
+        by_city = defaultdict(list)
+        for r in members:
+            by_city[str(r.inst.rest_city).split("市")[0]].append(r)
+
+        for city, city_members in by_city.items():
+            index = self._get_geo_index(city)
+
+            # 区域：地址正则提取优先，其余批量POI查询
+            pending = []
+            for r in city_members:
+                if not _is_missing(getattr(r.inst, 'rest_district', None)):
+                    continue
+                extracted = extract_district_from_address(r.inst.rest_chinese_address)
+                if extracted:
+                    r.inst.rest_district = extracted
+                else:
+                    pending.append(r)
+            if pending:
+                try:
+                    self._lookup_districts_by_poi(pending)
+                except Exception as e:
+                    self.log("ERROR", f"批量查询POI区域失败: {e}")
+                    for r in pending:
+                        r.inst.rest_district = city + "区"
+
+            # 街道：按区县分组，共享候选和中心点数组
+            by_district = defaultdict(list)
+            for r in city_members:
+                if _is_missing(getattr(r.inst, 'rest_street', None)):
+                    by_district[getattr(r.inst, 'rest_district', None)].append(r)
+            for district, district_members in by_district.items():
+                try:
+                    self._assign_streets(index, district, district_members)
+                except Exception as e:
+                    self.log("ERROR", f"批量提取街道失败({district}): {e}")
+                    for r in district_members:
+                        r.inst.rest_street = "未知街道"
+
+    def _stage_type(self, members: List[Restaurant]) -> None:
+        pending = [r for r in members if _is_missing(getattr(r.inst, 'rest_type', None))]
+        batch_size = int(getattr(self.conf.runtime, 'LLM_BATCH_SIZE', 20) or 1)
+        if batch_size > 1:
+            # 多家餐厅合并为一次大模型对话
+            classified = RestaurantsGroup(pending).generate_types_batch(
+                batch_size=batch_size, max_workers=self._limit('kimi', 4))
+            self.log("INFO", f"批量类型分析: 待分类 {len(pending)} 家，大模型分类 {classified} 家")
+        else:
+            self._map(lambda r: r._generate_type(), pending, self._limit('kimi', 4))
+
+    def _stage_contact(self, members: List[Restaurant]) -> None:
+        for r in members:
+            r._generate_contact_info()
+
+    def _stage_distance(self, members: List[Restaurant]) -> None:
+        """
+        向量化计算所有餐厅到CP的距离（公里）
+        """
+        pending = [r for r in members if _is_missing(getattr(r.inst, 'rest_distance', None))]
+        if not pending:
+            return
+        if not hasattr(self.conf.runtime, 'CP'):
+            for r in pending:
+                r.inst.rest_distance = 0
+            return
+
+        cp_lat, cp_lon = map(float, self.conf.runtime.CP['cp_location'].split(','))
+        coords = np.full((len(pending), 2), np.nan)
+        for i, r in enumerate(pending):
+            try:
+                res_lon, res_lat = map(float, str(r.inst.rest_location).split(','))
+                coords[i] = (res_lat, res_lon)
+            except (ValueError, AttributeError):
+                pass
+        lat1, lon1 = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+        lat2, lon2 = np.radians(cp_lat), np.radians(cp_lon)
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        distances = 2 * 6371 * np.arcsin(np.sqrt(a))
+        for r, d in zip(pending, distances):
+            if not np.isnan(d):
+                r.inst.rest_distance = float(d)
+
+    def _stage_verified_date(self, members: List[Restaurant]) -> None:
+        for r in members:
+            r._generate_verified_date()
+
+    # ================== 执行 ==================
+
+    def run(self, restaurants_group: RestaurantsGroup) -> RestaurantsGroup:
+        """
+        对整个餐厅组合执行流水线
+
+        :param restaurants_group: 餐厅组合
+        :return: 处理后的餐厅组合（成员与原组合相同且顺序不变）
+        """
+        members = restaurants_group.members
+        if not members:
+            self.log("WARNING", "餐厅列表为空，无需生成信息")
+            return restaurants_group
+
+        self.timings = {}
+        total_start = time.time()
+        self.log("INFO", f"使用分阶段流水线处理 {len(members)} 个餐厅")
+
+        def run_stage(stage: PipelineStage) -> None:
+            start = time.time()
+            try:
+                stage.func(members)
+            except Exception as e:
+                self.log("ERROR", f"阶段 {stage.name} 执行失败: {e}\n{traceback.format_exc()}")
+            finally:
+                self.timings[stage.name] = time.time() - start
+                self.log("INFO", f"阶段 {stage.name} 完成，耗时: {self.timings[stage.name]:.2f}秒")
+
+        for level in self._levels():
+            if len(level) == 1:
+                run_stage(level[0])
+            else:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=len(level)) as executor:
+                    list(executor.map(run_stage, level))
+
+        for r in members:
+            if r.check():
+                r.status = 'ready'
+
+        self.timings['total'] = time.time() - total_start
+        summary = ", ".join(f"{name}={elapsed:.2f}s" for name, elapsed in self.timings.items())
+        self.log("INFO", f"流水线处理完成，各阶段耗时: {summary}")
+        return RestaurantsGroup(list(members), group_type=restaurants_group.group_type)
@@ -237,6 +237,10 @@ class GetReceiveRecordService:
         """
         根据收油数分配车辆号码，并将结果与原DataFrame合并
         
+        按区域依次将餐厅装车：每车累计到随机目标桶数（min~max之间，每装满一车重新生成）即发车；
+        再加一家会超过max时，若已达到min则先发车，否则继续装入；区域末尾不足min的餐厅不分配。
+        各区域在收油数的前缀和上用二分查找确定每车的截止位置，最后一次性生成结果列
+        
         :param df_restaurants: 包含'镇/街道', '区域', '餐厅类型', '收油数'的DataFrame
         :param df_vehicles: 包含'车牌号'的DataFrame
         :param total_barrels: 总桶数限制
@@ -251,135 +255,316 @@ class GetReceiveRecordService:
         random_barrel_per_car = random.randint(min_barrel_per_car, max_barrel_per_car)
         ## 乱序排列车牌号
         vehicle_sorted_df = df_vehicles.sample(frac=1, replace=False)
-        result_rows = []
-        
-        total_accumulated = 0  # 所有车辆的累计收油数
-        should_break = False  # 控制外层循环的标志
+        has_limit = isinstance(total_barrels, (int, float)) and not pd.isna(total_barrels)
         
+        amounts = df_restaurants['rr_amount'].to_numpy()
+        amounts = amounts.astype(np.int64 if np.issubdtype(amounts.dtype, np.integer) else np.float64)
         
-
-        # 按区域分组
-        grouped = df_restaurants.groupby('rest_district',sort=False)
+        # 按区域分组（保持区域首次出现的顺序，区域内保持原顺序；区域为空的行不参与分配）
+        codes = df_restaurants.groupby('rest_district', sort=False).ngroup().to_numpy()
+        order = np.argsort(codes, kind='stable')
+        order = order[codes[order] >= 0]
+        groups = np.split(order, np.flatnonzero(np.diff(codes[order])) + 1) if len(order) else []
         
+        selected = []         # 分配到车辆的行位置（各车辆一段）
+        vehicle_indices = []  # 每车的编号
+        vehicle_amounts = []  # 每车的收油数
+        vehicle_sizes = []    # 每车的餐厅数
+        total_accumulated = 0  # 所有车辆的累计收油数
+        should_break = False  # 控制外层循环的标志
         current_vehicle_index = 0
-        for area, group in grouped:
-            accumulated_sum = 0
-            temp_group = []
-            
-            for index, row in group.iterrows():
-                # 先计算如果加上当前行的桶数会是多少
-                potential_sum = accumulated_sum + row['rr_amount']
-                
-                # 如果加上当前行会超过max_barrel_per_car，先处理当前temp_group
-                if potential_sum > max_barrel_per_car:
-                    # 只有当accumulated_sum达到min_barrel_per_car才处理
-                    if accumulated_sum >= min_barrel_per_car:
-                        # 检查添加这组数据是否会超过总桶数限制
-                        print(f"当前累计桶数: {total_accumulated}, 目标桶数: {total_barrels}")
-                        if isinstance(total_barrels, (int, float)) and not pd.isna(total_barrels):
-                            # 先检查加上这组是否会超过目标桶数
-                            if total_accumulated + accumulated_sum > total_barrels:
-                                should_break = True  # 设置跳出标志
-                                break
-                        
-                        # 分配车牌号
-                        total_accumulated += accumulated_sum
-
-                        for temp_row in temp_group:
-                            temp_row = temp_row.copy()  # 防止修改原DataFrame
-                            temp_row['rr_vehicle_license_plate'] = None
-                            temp_row['rr_vehicle'] = None
-                            temp_row['rr_amount_of_day'] = accumulated_sum
-                            temp_row['temp_vehicle_index'] = current_vehicle_index
-                            result_rows.append(temp_row)
-                                
-                        current_vehicle_index += 1    
-                        # 重置累计值和临时组
-                        accumulated_sum = 0
-                        temp_group = []
-                        # 重新生成随机目标桶数
-                        random_barrel_per_car = random.randint(min_barrel_per_car, max_barrel_per_car)
-                        
-                        # 如果加入当前行超过最大的桶数限制，那么之前的先处理，当前行作为下一组的第一条数据
-                        temp_group.append(row)
-                        accumulated_sum = row['rr_amount']
-                    else:
-                        # 如果accumulated_sum小于min_barrel_per_car，继续累加即使会超过max_barrel_per_car
-                        temp_group.append(row)
-                        accumulated_sum = potential_sum
+        
+        for positions in groups:
+            prefix = np.concatenate(([0], np.cumsum(amounts[positions])))
+            count = len(positions)
+            start = 0
+            # 上一车因超过max而发车时，触发发车的餐厅直接装入下一车（不检查目标桶数）
+            carried = False
+            while start < count:
+                base = prefix[start]
+                # 第一个使累计桶数达到目标的位置（end为不含的截止位置）
+                end = max(int(np.searchsorted(prefix, base + random_barrel_per_car, side='left')),
+                          start + (2 if carried else 1))
+                if end > count:
+                    # 区域内剩余餐厅达不到目标桶数：区域末尾达到min则发车
+                    accumulated_sum = prefix[count] - base
+                    if accumulated_sum < min_barrel_per_car:
+                        break
+                    end, in_loop, carried = count, False, False
+                elif prefix[end] - base <= max_barrel_per_car:
+                    # 在min~max之间达到目标桶数，装入后发车
+                    accumulated_sum = prefix[end] - base
+                    in_loop, carried = True, False
+                elif end - 1 > start and prefix[end - 1] - base >= min_barrel_per_car:
+                    # 再装一家会超过max且已达到min，先发车
+                    end -= 1
+                    accumulated_sum = prefix[end] - base
+                    in_loop, carried = True, True
                 else:
-                    # 如果加上当前行不会超过max_barrel_per_car，继续累加
-                    temp_group.append(row)
-                    accumulated_sum = potential_sum
-                    
-                    # 如果累计值在min和max之间，且达到或超过随机目标值，处理当前组
-                    if min_barrel_per_car <= accumulated_sum <= max_barrel_per_car and accumulated_sum >= random_barrel_per_car:
-                        # 检查添加这组数据是否会超过总桶数限制
-                        print(f"当前累计桶数: {total_accumulated}, 目标桶数: {total_barrels}")
-                        if isinstance(total_barrels, (int, float)) and not pd.isna(total_barrels):
-                            # 先检查加上这组是否会超过目标桶数
-                            if total_accumulated + accumulated_sum > total_barrels:
-                                should_break = True  # 设置跳出标志
-                                break
-                        
-                        # 分配车牌号
-                        total_accumulated += accumulated_sum
-
-                        for temp_row in temp_group:
-                            temp_row = temp_row.copy()  # 防止修改原DataFrame
-                            temp_row['rr_vehicle_license_plate'] = None
-                            temp_row['rr_vehicle'] = None
-                            temp_row['rr_amount_of_day'] = accumulated_sum
-                            temp_row['temp_vehicle_index'] = current_vehicle_index
-                            result_rows.append(temp_row)
-                                
-                        current_vehicle_index += 1    
-                        # 重置累计值和临时组
-                        accumulated_sum = 0
-                        temp_group = []
-                        # 重新生成随机目标桶数
-                        random_barrel_per_car = random.randint(min_barrel_per_car, max_barrel_per_car)
-            
-            # 处理最后一组数据（如果达到最小桶数要求）
-            if accumulated_sum >= min_barrel_per_car and not should_break:
+                    # 未达到min时即使超过max也继续装入，由下一家触发发车
+                    accumulated_sum = prefix[end] - base
+                    in_loop, carried = end < count, True
+                
                 # 检查添加这组数据是否会超过总桶数限制
-                print(f"当前累计桶数: {total_accumulated}, 目标桶数: {total_barrels}")
-                if isinstance(total_barrels, (int, float)) and not pd.isna(total_barrels):
-                    # 先检查加上这组是否会超过目标桶数
-                    if total_accumulated + accumulated_sum > total_barrels:
-                        break
+                if has_limit and total_accumulated + accumulated_sum > total_barrels:
+                    should_break = True
+                    break
                 
-                # 分配车牌号
+                # 分配车辆
                 total_accumulated += accumulated_sum
-
-                for temp_row in temp_group:
-                    temp_row = temp_row.copy()
-                    temp_row['rr_vehicle_license_plate'] = None
-                    temp_row['rr_vehicle'] = None
-                    temp_row['rr_amount_of_day'] = accumulated_sum
-                    temp_row['temp_vehicle_index'] = current_vehicle_index
-                    result_rows.append(temp_row)
-                    
+                selected.append(positions[start:end])
+                vehicle_indices.append(current_vehicle_index)
+                vehicle_amounts.append(accumulated_sum)
+                vehicle_sizes.append(end - start)
                 current_vehicle_index += 1
+                if not in_loop:
+                    break
+                # 重新生成随机目标桶数
+                random_barrel_per_car = random.randint(min_barrel_per_car, max_barrel_per_car)
+                start = end
             
             # 如果外层循环需要跳出，则不处理剩余数据
             if should_break:
                 break
                 
         # 创建结果DataFrame前检查是否有数据
-        if not result_rows:
+        if not selected:
             raise ValueError("没有符合分配条件的数据，请确保每个区域的收油量达到要求（35-44桶）")
             
             
         # 创建结果DataFrame
-        result_df = pd.DataFrame(result_rows)
+        result_df = df_restaurants.iloc[np.concatenate(selected)].copy()
+        result_df['rr_vehicle_license_plate'] = None
+        result_df['rr_vehicle'] = None
+        result_df['rr_amount_of_day'] = np.repeat(vehicle_amounts, vehicle_sizes)
+        result_df['temp_vehicle_index'] = np.repeat(vehicle_indices, vehicle_sizes)
         
         return result_df
     
+    def _oil_pack_trips_optimal(self, df_restaurants: pd.DataFrame, df_vehicles: pd.DataFrame, total_barrels: int, min_barrel_per_car: int=35, max_barrel_per_car: int=44) -> pd.DataFrame:
+        """
+        优化装车：在每车min~max的约束下使收油量尽量大，输出格式与_oil_assign_vehicle_numbers相同
+        
+        每个区域的候选方案是把餐厅序列切分为若干连续的车辆（可跳过部分餐厅），每车桶数在min~max之间，
+        单家超过max的餐厅单独装车；序列取操作员给定的顺序或按街道归并后的顺序（街道按首次出现的顺序）。
+        1. 无总桶数限制（或各区域最优方案的总量不超过限制）时，各区域用动态规划求两种顺序下收油量最大的切分，
+           取收油量较大者；收油量相同时取跨街道次数较少者；
+        2. 超过总桶数限制时，对上述全部候选切分求可达总桶数（位集动态规划），取不超过限制的最大总量，
+           再逐区域回溯出对应的车辆。
+        按操作员顺序装车的合法结果（每车min~max桶或单家超过max）都在候选方案中，
+        因此收油量不低于_oil_assign_vehicle_numbers的合法结果。车辆按区域顺序、序列顺序编号
+        
+        :param df_restaurants: 已按区域顺序排序的餐厅收油数据
+        :param df_vehicles: 车辆数据
+        :param total_barrels: 总桶数限制
+        :param min_barrel_per_car: 每车收购量最小值
+        :param max_barrel_per_car: 每车收购量最大值
+        :return: 处理后的DataFrame
+        """
+        has_limit = isinstance(total_barrels, (int, float)) and not pd.isna(total_barrels)
+        amounts = df_restaurants['rr_amount'].to_numpy(dtype=np.float64)
+        streets = (df_restaurants['rest_street'].astype(str).to_numpy() if 'rest_street' in df_restaurants.columns
+                   else np.full(len(df_restaurants), '', dtype=object))
+        
+        # 每个区域的两种候选顺序：[(行位置数组, 最优切分[(起点, 终点), ...], 收油量, 跨街道次数), ...]
+        # 按区域首次出现的顺序处理（区域为空的行不参与分配）
+        district_codes, district_names = pd.factorize(df_restaurants['rest_district'])
+        districts = []
+        for code in range(len(district_names)):
+            positions = np.flatnonzero(district_codes == code)
+            street_codes = pd.factorize(streets[positions])[0]
+            grouped = positions[np.argsort(street_codes, kind='stable')]
+            candidates = []
+            for order in (positions, grouped):
+                cuts, total, crossings = self._oil_best_cuts(amounts[order], pd.factorize(streets[order])[0],
+                                                             min_barrel_per_car, max_barrel_per_car)
+                candidates.append((order, cuts, total, crossings))
+            # 收油量优先，相同时跨街道次数少者优先（排在前面的候选即首选）
+            candidates.sort(key=lambda c: (-round(c[2], 6), c[3]))
+            districts.append(candidates)
+        
+        def trips_of(order, cuts):
+            prefix = np.concatenate(([0.0], np.cumsum(amounts[order])))
+            return [(order[j:i], prefix[i] - prefix[j]) for j, i in cuts]
+        
+        trips = []  # [(行位置数组, 桶数), ...]
+        for candidates in districts:
+            order, cuts, _, _ = candidates[0]
+            trips.extend(trips_of(order, cuts))
+        
+        # 超过总桶数限制时，在全部候选切分中选择不超过限制的最大总量
+        if has_limit and sum(total for _, total in trips) > total_barrels:
+            capacity = int(math.floor(total_barrels))
+            mask = (1 << (capacity + 1)) - 1
+            # reachable[d][k][i]: 第d个区域第k种顺序的前i家餐厅能组成的桶数集合（第s位表示s桶）
+            reachable = [[self._oil_reachable_cuts(amounts[order], min_barrel_per_car, max_barrel_per_car, capacity)
+                          for order, _, _, _ in candidates] for candidates in districts]
+            # totals[d]: 前d个区域能组成的总桶数集合
+            totals = [1]
+            for district_reach in reachable:
+                reach = 0
+                for order_reach in district_reach:
+                    reach |= order_reach[-1]
+                combined = 0
+                for s in range(reach.bit_length()):
+                    if (reach >> s) & 1:
+                        combined |= totals[-1] << s
+                totals.append(combined & mask)
+            target = totals[-1].bit_length() - 1
+            trips = []
+            for d in range(len(districts) - 1, -1, -1):
+                # 本区域取s桶，且前面的区域能组成target-s桶；优先使用首选顺序
+                found = None
+                for s in range(target, -1, -1):
+                    if not (totals[d] >> (target - s)) & 1:
+                        continue
+                    for k, order_reach in enumerate(reachable[d]):
+                        if (order_reach[-1] >> s) & 1:
+                            found = (s, k)
+                            break
+                    if found:
+                        break
+                s, k = found
+                order = districts[d][k][0]
+                cuts = self._oil_trace_cuts(amounts[order], reachable[d][k], s, min_barrel_per_car, max_barrel_per_car)
+                trips = trips_of(order, cuts) + trips
+                target -= s
+        
+        if not trips:
+            raise ValueError(f"没有符合分配条件的数据，请确保每个区域的收油量达到要求（{min_barrel_per_car}-{max_barrel_per_car}桶）")
+        
+        # 车辆内保持餐厅的原有顺序
+        rows = [np.sort(trip_rows) for trip_rows, _ in trips]
+        sizes = [len(trip_rows) for trip_rows in rows]
+        result_df = df_restaurants.iloc[np.concatenate(rows)].copy()
+        result_df['rr_vehicle_license_plate'] = None
+        result_df['rr_vehicle'] = None
+        day_amounts = [total for _, total in trips]
+        if np.issubdtype(df_restaurants['rr_amount'].dtype, np.integer):
+            day_amounts = [int(round(total)) for total in day_amounts]
+        result_df['rr_amount_of_day'] = np.repeat(day_amounts, sizes)
+        result_df['temp_vehicle_index'] = np.repeat(np.arange(len(trips)), sizes)
+        
+        return result_df
+    
+    @staticmethod
+    def _oil_trip_windows(prefix: np.ndarray, min_barrel_per_car: float, max_barrel_per_car: float):
+        """
+        以第i家结尾（i从1开始）的车辆，起点j需满足 prefix[i]-max <= prefix[j] <= prefix[i]-min 且 j < i，
+        返回每个i对应的起点范围[lows[i-1], highs[i-1])
+        """
+        count = len(prefix) - 1
+        lows = np.searchsorted(prefix, prefix[1:] - max_barrel_per_car, side='left')
+        highs = np.minimum(np.searchsorted(prefix, prefix[1:] - min_barrel_per_car, side='right'),
+                           np.arange(1, count + 1))
+        return lows, highs
+    
+    def _oil_best_cuts(self, values: np.ndarray, street_codes: np.ndarray, min_barrel_per_car: float, max_barrel_per_car: float):
+        """
+        将序列切分为连续的车辆（可跳过餐厅），收油量最大；收油量相同时跨街道次数最少
+        
+        :param values: 按序列顺序的收油数
+        :param street_codes: 按序列顺序的街道编码
+        :return: (切分[(起点, 终点), ...], 收油量, 跨街道次数)
+        """
+        eps = 1e-9
+        count = len(values)
+        if count == 0:
+            return [], 0.0, 0
+        prefix = np.concatenate(([0.0], np.cumsum(values)))
+        lows, highs = self._oil_trip_windows(prefix, min_barrel_per_car, max_barrel_per_car)
+        # changes[k]: 第0~k家之间的街道切换次数，一车[j, i)内的切换次数为changes[i-1]-changes[j]
+        changes = np.concatenate(([0], np.cumsum(street_codes[1:] != street_codes[:-1])))
+        
+        best_amount = np.zeros(count + 1)             # best_amount[i]: 前i家的最大收油量
+        best_crossings = np.zeros(count + 1, dtype=np.int64)
+        start_of = np.full(count + 1, -1)             # 以第i家结尾的车辆起点，-1表示第i家不装车
+        # 以j为起点的车辆：收油量 = gain_amount[j] + prefix[i]，跨街道次数 = gain_crossings[j] + changes[i-1]
+        gain_amount = np.zeros(count + 1)
+        gain_crossings = np.zeros(count + 1, dtype=np.int64)
+        for i in range(1, count + 1):
+            amount, crossings = best_amount[i - 1], best_crossings[i - 1]
+            lo, hi = lows[i - 1], highs[i - 1]
+            if lo < hi:
+                window = gain_amount[lo:hi]
+                ties = np.flatnonzero(window >= window.max() - eps)
+                j = lo + int(ties[np.argmin(gain_crossings[lo:hi][ties])])
+                trip_amount, trip_crossings = gain_amount[j] + prefix[i], gain_crossings[j] + changes[i - 1]
+                if trip_amount > amount + eps or (trip_amount > amount - eps and trip_crossings < crossings):
+                    amount, crossings, start_of[i] = trip_amount, trip_crossings, j
+            if values[i - 1] > max_barrel_per_car and best_amount[i - 1] + values[i - 1] > amount + eps:
+                # 单家超过max的餐厅单独装车
+                amount, crossings, start_of[i] = best_amount[i - 1] + values[i - 1], best_crossings[i - 1], i - 1
+            best_amount[i], best_crossings[i] = amount, crossings
+            if i < count:
+                gain_amount[i] = amount - prefix[i]
+                gain_crossings[i] = crossings - changes[i]
+        
+        cuts = []
+        i = count
+        while i > 0:
+            j = start_of[i]
+            if j < 0:
+                i -= 1
+                continue
+            cuts.append((int(j), i))
+            i = j
+        return cuts[::-1], float(best_amount[count]), int(best_crossings[count])
+    
+    def _oil_reachable_cuts(self, values: np.ndarray, min_barrel_per_car: float, max_barrel_per_car: float, capacity: int) -> List[int]:
+        """
+        求序列的所有切分方案能组成的桶数集合（每车桶数向上取整，保证不超过限制）
+        
+        :return: 列表，第i项为前i家餐厅能组成的桶数位集（第s位表示s桶，不超过capacity）
+        """
+        prefix = np.concatenate(([0.0], np.cumsum(values)))
+        lows, highs = self._oil_trip_windows(prefix, min_barrel_per_car, max_barrel_per_car)
+        mask = (1 << (capacity + 1)) - 1
+        reach = [1]
+        for i in range(1, len(prefix)):
+            current = reach[i - 1]
+            for j in range(lows[i - 1], highs[i - 1]):
+                size = int(math.ceil(prefix[i] - prefix[j] - 1e-9))
+                if size <= capacity:
+                    current |= reach[j] << size
+            if values[i - 1] > max_barrel_per_car:
+                size = int(math.ceil(values[i - 1] - 1e-9))
+                if size <= capacity:
+                    current |= reach[i - 1] << size
+            reach.append(current & mask)
+        return reach
+    
+    def _oil_trace_cuts(self, values: np.ndarray, reach: List[int], target: int, min_barrel_per_car: float, max_barrel_per_car: float):
+        """
+        按_oil_reachable_cuts的结果回溯出恰好组成target桶的切分[(起点, 终点), ...]
+        """
+        prefix = np.concatenate(([0.0], np.cumsum(values)))
+        lows, highs = self._oil_trip_windows(prefix, min_barrel_per_car, max_barrel_per_car)
+        cuts = []
+        i = len(values)
+        while i > 0 and target > 0:
+            starts = list(range(lows[i - 1], highs[i - 1]))
+            if values[i - 1] > max_barrel_per_car:
+                starts.append(i - 1)
+            for j in starts:
+                size = int(math.ceil(prefix[i] - prefix[j] - 1e-9))
+                if size <= target and (reach[j] >> (target - size)) & 1:
+                    cuts.append((j, i))
+                    target -= size
+                    i = j
+                    break
+            else:
+                # 第i家不装车
+                i -= 1
+        return cuts[::-1]
+    
     def _allocate_barrels(self, result_df: pd.DataFrame, count_of_barrel_55: int) -> pd.DataFrame:
         """
         分配180KG和55KG桶
         
+        将餐厅随机排序后依次改用55KG桶，直到55KG桶总数达到目标；
+        每家改用55KG桶后的总重量不低于原180KG桶的重量
+        
         Args:
             result_df: 包含餐厅信息的DataFrame
             count_of_barrel_55: 目标55KG桶数
@@ -389,86 +574,35 @@ class GetReceiveRecordService:
         """
         if count_of_barrel_55 is None:
             return result_df
-        else:
-
-            # 初始化 rr_amount_180 和 rr_amount_55 列
-            result_df['rr_amount_180'] = result_df['rr_amount']
-            result_df['rr_amount_55'] = 0
-
-            # 记录所有选择的行的索引
-            selected_indices = []
 
-            # 获取所有可用的索引
-            available_indices = list(result_df.index)
-
-            # 跟踪55KG桶的总数
-            total_55_barrels = 0
-
-            while total_55_barrels < count_of_barrel_55:
-                if not available_indices:
-                    break  # 如果没有可用的索引，退出循环
-
-                # 随机选择一行
-                selected_index = random.choice(available_indices)
-                selected_row = result_df.loc[selected_index]
-                rr_amount = selected_row['rr_amount']
-
-                # 计算55KG桶的最大可能数量
-                max_55_barrels = math.ceil(rr_amount * 180 / 55) + 1
-
-                # 随机选择一个不超过最大值的55KG桶数
-                rr_amount_55 = random.randint(1, max_55_barrels)
-
-                # 计算剩余重量
-                remaining_weight = 180 * rr_amount - rr_amount_55 * 55
-
-                if remaining_weight < 150:
-                    # 如果剩余重量小于150，将剩余重量全部转换为55KG桶
-                    additional_55_barrels = math.ceil(remaining_weight / 55)
-                    rr_amount_55 += additional_55_barrels
-                    # 设置180KG桶数为0
-                    result_df.at[selected_index, 'rr_amount_180'] = 0
-                else:
-                    # 保持原有的180KG桶数，根据剩余重量计算
-                    result_df.at[selected_index, 'rr_amount_180'] = math.ceil(remaining_weight/180)
-
-                # 更新55KG桶数
-                result_df.at[selected_index, 'rr_amount_55'] = rr_amount_55
-
-                # 验证重量是否满足要求
-                new_weight = (result_df.at[selected_index, 'rr_amount_180'] * 180 + 
-                            result_df.at[selected_index, 'rr_amount_55'] * 55)
-                original_weight = rr_amount * 180
-
-                if new_weight >= original_weight:
-                    # 记录选择的行索引
-                    selected_indices.append(selected_index)
-                    # 更新总55KG桶数
-                    total_55_barrels = result_df['rr_amount_55'].sum()
-                    print(f"处理行 {selected_index}: 55KG桶数={rr_amount_55}, 总55KG桶数={total_55_barrels}")
-                else:
-                    # 如果不满足要求，恢复原值
-                    result_df.at[selected_index, 'rr_amount_180'] = rr_amount
-                    result_df.at[selected_index, 'rr_amount_55'] = 0
-
-                # 从可用索引中移除已处理的索引
-                available_indices.remove(selected_index)
-
-            # 打印最终结果
-            # print("\n最终分配结果:")
-            # print(f"目标55KG桶数: {count_of_barrel_55}")
-            # print(f"实际55KG桶数: {total_55_barrels}")
-            # print(f"处理的行数: {len(selected_indices)}")
-            
-            # 验证每行的重量平衡
-            for idx in selected_indices:
-                original_weight = result_df.loc[idx, 'rr_amount'] * 180
-                allocated_weight = (result_df.loc[idx, 'rr_amount_180'] * 180 + 
-                                result_df.loc[idx, 'rr_amount_55'] * 55)
-                print(f"行 {idx}: 原始重量={original_weight}, 分配后重量={allocated_weight}")
-            
+        # 初始化 rr_amount_180 和 rr_amount_55 列
+        result_df['rr_amount_180'] = result_df['rr_amount']
+        result_df['rr_amount_55'] = 0
+        if count_of_barrel_55 <= 0 or result_df.empty:
             return result_df
 
+        # 随机排列所有行，按排列顺序为每行计算候选的桶数
+        order = np.random.permutation(len(result_df))
+        amounts = result_df['rr_amount'].to_numpy(dtype=np.float64)[order]
+        original_weight = amounts * 180
+        # 55KG桶数在 1 ~ 最大可能数量 之间随机选择
+        max_55_barrels = np.ceil(original_weight / 55).astype(np.int64) + 1
+        barrels_55 = np.random.randint(1, max_55_barrels + 1)
+        remaining_weight = original_weight - barrels_55 * 55
+        # 剩余重量小于150时全部转换为55KG桶，否则剩余重量用180KG桶补足
+        small_remainder = remaining_weight < 150
+        barrels_55 = np.where(small_remainder, barrels_55 + np.ceil(remaining_weight / 55).astype(np.int64), barrels_55)
+        barrels_180 = np.where(small_remainder, 0, np.ceil(remaining_weight / 180).astype(np.int64))
+
+        # 取到55KG桶累计数首次达到目标的那一行为止
+        count = min(int(np.searchsorted(np.cumsum(barrels_55), count_of_barrel_55, side='left')) + 1, len(order))
+        selected = order[:count]
+        result_df.iloc[selected, result_df.columns.get_loc('rr_amount_180')] = barrels_180[:count]
+        result_df.iloc[selected, result_df.columns.get_loc('rr_amount_55')] = barrels_55[:count]
+
+        LOGGER.info(f"55KG桶分配完成: 目标{count_of_barrel_55}桶，实际{int(barrels_55[:count].sum())}桶，涉及{count}家餐厅")
+        return result_df
+
     # 从餐厅获取收油记录
     def get_restaurant_oil_records(
             self,res_info: list[dict],vehicle_info: list[dict],
@@ -595,7 +729,11 @@ class GetReceiveRecordService:
 
             # 分配车辆号码，确定收油每辆车的收油记录、条数，不是最后的车辆信息，车辆需要最后重新分配，只是记录个车次数
             try:
-                result_df = self._oil_assign_vehicle_numbers(cp_restaurants_df_sorted, cp_vehicle_df, total_barrels, min_barrel_per_car,max_barrel_per_car)
+                # 运行时配置TRIP_PACKER为optimal时使用优化装车，默认按顺序装车
+                if getattr(self.conf.runtime, 'TRIP_PACKER', 'greedy') == 'optimal':
+                    result_df = self._oil_pack_trips_optimal(cp_restaurants_df_sorted, cp_vehicle_df, total_barrels, min_barrel_per_car,max_barrel_per_car)
+                else:
+                    result_df = self._oil_assign_vehicle_numbers(cp_restaurants_df_sorted, cp_vehicle_df, total_barrels, min_barrel_per_car,max_barrel_per_car)
                 if result_df.empty:
                     raise ValueError("无法完成车辆分配，请确保每个区域的收油量达到要求（35-44桶）")
             except Exception as e:
@@ -655,6 +793,74 @@ class GetReceiveRecordService:
             # 其他未预期的错误，包装成 ValueError
             raise ValueError(f"生成收油表时发生错误: {str(e)}")
     # 
+    def _daily_car_plan(self, total: int, days: int, min_cars: int, max_cars: int) -> np.ndarray:
+        """
+        随机生成每天的车辆数：每天在 [min_cars, max_cars] 之间且总数等于total
+
+        每天先分配min_cars辆，其余车辆在各天剩余的 max_cars-min_cars 个名额中无放回地随机抽取
+        （多元超几何分布），一次生成，不需要反复修正。
+        车辆总数少于 days*min_cars 时下限降为 total//days（部分日期可能没有车辆）
+
+        :param total: 车辆总数
+        :param days: 天数
+        :param min_cars: 每天最少车辆数
+        :param max_cars: 每天最多车辆数
+        :return: 每天的车辆数数组
+        """
+        min_cars = min(min_cars, total // days)
+        if total > days * max_cars:
+            raise ValueError(f"{total} 车次无法在 {days} 天内完成（每天最多 {max_cars} 辆车）")
+        extra = np.random.default_rng().multivariate_hypergeometric(
+            np.full(days, max_cars - min_cars, dtype=np.int64), total - days * min_cars)
+        return min_cars + extra
+
+    def _allocate_balance_vehicles(self, trip_dates: np.ndarray, cp_vehicle_group: VehicleGroup) -> tuple:
+        """
+        为平衡表的每个车次分配收油车辆（to_rest类型），同一车辆在冷却期内不重复使用
+
+        车辆的状态、上次使用日期和冷却天数一次性读出，按日期（升序）逐天从可用车辆中无放回随机抽取，
+        分配完成后回写每辆车最后一次使用的日期
+
+        :param trip_dates: 每个车次的日期（升序）
+        :param cp_vehicle_group: CP的车辆组合
+        :return: (车辆ID数组, 车牌号数组)，与trip_dates一一对应
+        """
+        vehicles = cp_vehicle_group.filter_by_type(vehicle_type="to_rest").members
+        infos = [vehicle.info for vehicle in vehicles]
+        usable = np.array([info.get('vehicle_status') == "available" for info in infos], dtype=bool)
+        last_use = pd.to_datetime(pd.Series([info.get('vehicle_last_use') or None for info in infos], dtype=object)).dt.normalize().to_numpy(copy=True)
+        cooldown = pd.to_numeric(pd.Series([info.get('vehicle_cooldown_days') for info in infos], dtype=object), errors='coerce').fillna(0).to_numpy()
+        reusable = cooldown <= 0  # 没有冷却期的车辆同一天可重复使用
+
+        trip_dates = pd.to_datetime(pd.Series(trip_dates)).to_numpy()
+        chosen = np.empty(len(trip_dates), dtype=np.int64)
+        for day in np.unique(trip_dates):
+            positions = np.flatnonzero(trip_dates == day)
+            needed = len(positions)
+            date_str = pd.Timestamp(day).strftime('%Y-%m-%d')
+            elapsed = (day - last_use) / np.timedelta64(1, 'D')
+            available = np.flatnonzero(usable & (np.isnan(elapsed) | (elapsed >= cooldown)))
+            if len(available) == 0:
+                raise ValueError(f"日期 {date_str} 没有可用车辆，该日期需要 {needed} 辆车进行收油作业")
+            picks = np.random.choice(available, size=min(needed, len(available)), replace=False)
+            if len(picks) < needed:
+                repeatable = available[reusable[available]]
+                if len(repeatable) == 0:
+                    raise ValueError(f"日期 {date_str} 车辆分配失败，需要 {needed} 辆车，但只有 {len(available)} 辆可用车辆")
+                picks = np.concatenate([picks, np.random.choice(repeatable, size=needed - len(picks))])
+            chosen[positions] = picks
+            last_use[picks] = day
+
+        # 更新车辆最后使用时间
+        for idx in np.unique(chosen):
+            cp_vehicle_group.update_vehicle_info(
+                infos[idx]['vehicle_id'],
+                {'vehicle_last_use': pd.Timestamp(last_use[idx]).strftime('%Y-%m-%d')}
+            )
+        vehicle_ids = np.array([info['vehicle_id'] for info in infos], dtype=object)
+        vehicle_plates = np.array([info['vehicle_license_plate'] for info in infos], dtype=object)
+        return vehicle_ids[chosen], vehicle_plates[chosen]
+
     def get_restaurant_balance(self,oil_records_df: pd.DataFrame, n: int,current_date: str, cp_vehicle_group:VehicleGroup ):
 
         """
@@ -689,99 +895,17 @@ class GetReceiveRecordService:
         if n > len(all_dates_in_month):
             raise ValueError(f'输入天数n={n}大于当月天数{len(all_dates_in_month)}')
         dates_in_month = sorted(random.sample(list(all_dates_in_month), n))
-        delivery_dates = []
-        days = len(dates_in_month)
-        total = len(restaurant_balance_df)
-        base = car_number_of_day
-        
-        # 1. 给每天随机分配车辆数，范围是 [base-3, base+3]
-        plan = []
-        for _ in range(days):
-            # 随机选择 -3 到 +3 的调整值
-            adjustment = random.randint(-3, 3)
-            daily_cars = max(1, base + adjustment)  # 确保每天至少有1辆车
-            plan.append(daily_cars)
-
-        # 2. 计算当前总分配数
-        current_total = sum(plan)
-        diff = total - current_total
 
-        # 3. 调整分配方案，使总数等于目标总数
-        while diff != 0:
-            if diff > 0:
-                # 需要增加车辆，随机选择一天增加1辆（但不能超过base+3）
-                available_days = [i for i in range(days) if plan[i] < base + 3]
-                if available_days:
-                    day_to_add = random.choice(available_days)
-                    plan[day_to_add] += 1
-                    diff -= 1
-                else:
-                    break  # 所有天都已达到最大值
-            else:  # diff < 0
-                # 需要减少车辆，随机选择一天减少1辆（但不能低于max(1, base-3)）
-                min_cars = max(1, base - 3)
-                available_days = [i for i in range(days) if plan[i] > min_cars]
-                if available_days:
-                    day_to_reduce = random.choice(available_days)
-                    plan[day_to_reduce] -= 1
-                    diff += 1
-                else:
-                    break  # 所有天都已达到最小值
-
-        # 4. 检查所有天数都在 [max(1, base-3), base+3] 范围内
-        min_allowed = max(1, base - 3)
-        max_allowed = base + 3
-        assert all(min_allowed <= x <= max_allowed for x in plan)
-        # 4. 生成 delivery_dates
-        for day, count in zip(dates_in_month, plan):
-            delivery_dates.extend([day.date()] * count)
-        # 保证 delivery_dates 长度和 restaurant_balance_df 一致
-        delivery_dates = delivery_dates[:len(restaurant_balance_df)]
+        # 给每天随机分配车辆数，范围是 [max(1, base-3), base+3]，总数等于车辆总数
+        plan = self._daily_car_plan(len(restaurant_balance_df), len(dates_in_month),
+                                    max(1, car_number_of_day - 3), car_number_of_day + 3)
+        restaurant_balance_df['balance_date'] = np.repeat([day.date() for day in dates_in_month], plan)
 
-        restaurant_balance_df['balance_date'] = delivery_dates[:len(restaurant_balance_df)]
-        # 用于存储更新后的车辆分配
-        updated_vehicle_assignments = []
-        # 根据每辆车去重
+        # 根据每辆车去重，按日期分配车辆
         restaurant_balance_temp = restaurant_balance_df[['balance_date','balance_cp','balance_district', 'balance_vehicle_license_plate', 'balance_amount_of_day','temp_vehicle_index']].drop_duplicates()
-        # 按日期分组，以便统计每天需要的车辆数量
-        daily_vehicle_needs = restaurant_balance_temp.groupby('balance_date').size()
-        # 逐行分配车辆
-        for index, row in restaurant_balance_temp.iterrows():
-            date = row['balance_date']
-            date_str = date.strftime('%Y-%m-%d')
-            
-            # 获取当天可用的车辆
-            available_vehicles = cp_vehicle_group.filter_available(date_str)
-            available_vehicles = available_vehicles.filter_by_type(vehicle_type="to_rest")
-            
-            # 如果没有可用车辆，记录并继续使用原车辆
-            if available_vehicles.count() == 0:
-                needed = daily_vehicle_needs[date]
-                raise ValueError(f"日期 {date_str} 没有可用车辆，该日期需要 {needed} 辆车进行收油作业")
-            
-            # 分配一辆可用车辆
-            allocated_vehicle = available_vehicles.allocate(date=date_str)
-            if allocated_vehicle is None:
-                needed = daily_vehicle_needs[date]
-                available = available_vehicles.count()
-                raise ValueError(f"日期 {date_str} 车辆分配失败，需要 {needed} 辆车，但只有 {available} 辆可用车辆")
-            # 更新车辆最后使用时间
-            cp_vehicle_group.update_vehicle_info(
-                allocated_vehicle.info['vehicle_id'],
-                {'vehicle_last_use': date_str}
-            )
-            # 记录新的分配
-            updated_vehicle_assignments.append({
-                'temp_vehicle_index': row['temp_vehicle_index'],
-                'balance_date': date,
-                'balance_district': row['balance_district'],
-                'balance_cp': row['balance_cp'],
-                'new_vehicle_id': allocated_vehicle.info['vehicle_id'],
-                'new_vehicle_license_plate': allocated_vehicle.info['vehicle_license_plate']
-            })
-
-        # 创建更新后的车辆分配DataFrame
-        updated_assignments_df = pd.DataFrame(updated_vehicle_assignments)
+        vehicle_ids, vehicle_plates = self._allocate_balance_vehicles(restaurant_balance_temp['balance_date'].to_numpy(), cp_vehicle_group)
+        updated_assignments_df = restaurant_balance_temp[['temp_vehicle_index', 'balance_date', 'balance_district', 'balance_cp']].assign(
+            new_vehicle_id=vehicle_ids, new_vehicle_license_plate=vehicle_plates)
 
         # 更新平衡表中的车辆信息
         restaurant_balance_df = pd.merge(
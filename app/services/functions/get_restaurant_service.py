@@ -2,6 +2,7 @@ import os
 import json
 import requests
 import pandas as pd
+import numpy as np
 from typing import Dict, Any, List, Optional, Union
 import threading
 import time
@@ -9,10 +10,14 @@ import sys
 import concurrent.futures
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
 from app.services.instances.restaurant import Restaurant, RestaurantsGroup
-from app.utils.logger import setup_logger
+from app.services.functions.async_enrichment import AsyncRestaurantEnricher
+from app.services.functions.enrichment_pipeline import RestaurantEnrichmentPipeline
+from app.services.functions.process_enrichment import ProcessPoolEnricher
+from app.services.functions.restaurant_index import RestaurantIndex
+from app.utils.logger import setup_logger, AsyncFileLogWriter
 from app.utils.file_io import rp
 from app.config.config import CONF
-from app.utils.query import robust_query
+from app.utils.query import robust_query, get_rate_limiter
 import re
 import math
 import logging
@@ -207,38 +212,6 @@ class GetRestaurantService:
                 urls.append(url)
             return urls
         
-        ## 获取高德餐厅信息
-        def get_gaode_restaurant(urls):
-            j = 0
-            datalist = []
-            for url in urls:
-                # print(url)
-                res = requests.request('GET', url=url)
-                time.sleep(1)
-                res = json.loads(res.text)
-                l = res.get('pois')
-                if l is not None and len(l)>0:
-                    for i in l:
-                        j += 1
-                        dict1 = {
-                            'rest_chinese_name': i.get('name') if i.get('name') is not None else '',
-                            'rest_chinese_address': i.get('address') if i.get('address') is not None else '',
-                            'rest_contact_phone': i.get('tel') if i.get('tel') is not None else '',
-                            'rest_location': i.get('location') if i.get('location') is not None else '',
-                            'rest_district': i.get('adname') if i.get('adname') is not None else '',
-                            'rest_type_gaode': i.get('type') if i.get('type') is not None else '',
-                            'distance': i.get('distance') if i.get('distance') is not None else '',
-                            'rest_city': i.get('cityname') if i.get('cityname') is not None else '',
-                            'rest_type': self.gaode_keywords if self.gaode_keywords is not None else '',
-                        }
-                        # 注意：不再在这里设置rest_type字段，而是在run方法中根据use_llm参数决定是否设置
-                        datalist.append(dict1)
-                    if len(l)<20: ## 当最后一次小于20的话说明最后一页，退出
-                        break
-                else:
-                    break
-            return datalist
-        
         # 如果是输入的坐标，直接匹配周边搜索
         if loc:
             LOGGER.info(f"使用周边搜索，地址: {self.gaode_address}")
@@ -246,7 +219,7 @@ class GetRestaurantService:
         else:
             LOGGER.info(f"使用关键词搜索，关键词: {self.gaode_keywords}")
             urls = create_gaode_url()
-        restaurantList = get_gaode_restaurant(urls)
+        restaurantList = self._fetch_gaode_pages(urls, self.gaode_token, self.gaode_keywords)
         ## 写入excel
         # fileName = types + '-' + self.address + '-' + self.keywords + '.xls'
         # if self.maptype == 3:
@@ -281,6 +254,159 @@ class GetRestaurantService:
         LOGGER.info("Serp API搜索功能尚未实现")
         return False
     
+    def _gaode_limiter(self, token):
+        """获取高德密钥对应的限流器（运行时配置GAODE_QPS，默认每秒3次）"""
+        gaode_qps = getattr(self.conf.runtime, 'GAODE_QPS', 3)
+        return get_rate_limiter(f"gaode_search:{token}", gaode_qps, burst=max(1, int(gaode_qps)))
+
+    def _parse_gaode_pois(self, pois, keywords=None) -> list[dict]:
+        """将高德POI列表转换为餐厅信息字典列表"""
+        datalist = []
+        for i in pois:
+            dict1 = {
+                'rest_chinese_name': i.get('name') if i.get('name') is not None else '',
+                'rest_chinese_address': i.get('address') if i.get('address') is not None else '',
+                'rest_contact_phone': i.get('tel') if i.get('tel') is not None else '',
+                'rest_location': i.get('location') if i.get('location') is not None else '',
+                'rest_district': i.get('adname') if i.get('adname') is not None else '',
+                'rest_type_gaode': i.get('type') if i.get('type') is not None else '',
+                'distance': i.get('distance') if i.get('distance') is not None else '',
+                'rest_city': i.get('cityname') if i.get('cityname') is not None else '',
+                'rest_type': keywords if keywords is not None else '',
+            }
+            # 注意：不再在这里设置rest_type字段，而是在run方法中根据use_llm参数决定是否设置
+            datalist.append(dict1)
+        return datalist
+
+    def _fetch_gaode_page(self, session, url, limiter, max_retries=3) -> dict:
+        """按密钥限流请求一页高德搜索结果，超出QPS时稍后重试"""
+        global_qps = getattr(self.conf.runtime, 'GAODE_GLOBAL_QPS', None)
+        for attempt in range(max_retries):
+            if global_qps:
+                # 所有密钥、所有搜索任务共享的总QPS上限
+                get_rate_limiter("gaode_search:*", global_qps, burst=max(1, int(global_qps))).acquire()
+            limiter.acquire()
+            res = json.loads(session.get(url, timeout=10).text)
+            if res.get('infocode') == '10021' and attempt < max_retries - 1:  # CUQPS_HAS_EXCEEDED_THE_LIMIT
+                time.sleep(0.5 * (attempt + 1))
+                continue
+            return res
+        return res
+
+    def _fetch_gaode_pages(self, urls, token, keywords=None, first=None) -> list[dict]:
+        """
+        获取高德搜索的全部分页结果：先请求第一页得到count，其余页并发请求
+        
+        :param urls: 各页的请求URL（按页码顺序）
+        :param token: 高德地图token，用于限流
+        :param keywords: 搜索关键词
+        :param first: 已请求过的第一页响应，可选
+        :return: 餐厅信息列表
+        """
+        datalist = []
+        if not urls:
+            return datalist
+        limiter = self._gaode_limiter(token)
+        page_concurrency = max(1, int(getattr(self.conf.runtime, 'GAODE_PAGE_CONCURRENCY', 4)))
+        with requests.Session() as session:
+            # 先请求第一页，根据count计算总页数
+            if first is None:
+                first = self._fetch_gaode_page(session, urls[0], limiter)
+            l = first.get('pois')
+            if not l:
+                return datalist
+            datalist.extend(self._parse_gaode_pois(l, keywords))
+            if len(l) < 20:  ## 第一页不足20条说明只有一页
+                return datalist
+            try:
+                total_pages = min(len(urls), math.ceil(int(first.get('count', 0)) / 20))
+            except (TypeError, ValueError):
+                total_pages = len(urls)
+            if total_pages <= 1:
+                total_pages = len(urls)  # count不可用时按最大页数请求，遇到空页或不足20条的页截止
+
+            # 其余页并发请求，到达后立即解析
+            pages = {}
+            with concurrent.futures.ThreadPoolExecutor(max_workers=page_concurrency) as executor:
+                futures = {executor.submit(self._fetch_gaode_page, session, urls[page - 1], limiter): page
+                           for page in range(2, total_pages + 1)}
+                for future in concurrent.futures.as_completed(futures):
+                    pages[futures[future]] = self._parse_gaode_pois(future.result().get('pois') or [], keywords)
+
+            # 按页码顺序合并，遇到空页或不足20条的页截止
+            for page in range(2, total_pages + 1):
+                page_data = pages.get(page) or []
+                datalist.extend(page_data)
+                if len(page_data) < 20:
+                    break
+        return datalist
+
+    def _gaode_tiled_search(self, token=None, keywords=None, center=None, radius=50000, max_depth=6) -> list[dict]:
+        """
+        分块搜索高德餐厅信息：以中心点和半径确定矩形范围，结果数达到单次查询上限的矩形
+        四等分后继续搜索（四叉树），直到每个矩形都不再被截断
+        
+        :param token: 高德地图token
+        :param keywords: 搜索关键词
+        :param center: 中心点坐标"经度,纬度"
+        :param radius: 搜索半径（米）
+        :param max_depth: 最大细分层数
+        :return: 餐厅信息列表
+        """
+        lon, lat = map(float, center.split(','))
+        d_lat = radius / 111320
+        d_lon = radius / (111320 * math.cos(math.radians(lat)))
+        # 单个矩形可获取的结果上限
+        cap = min(self.n * 20, int(getattr(self.conf.runtime, 'GAODE_RESULT_CAP', 900)))
+        tile_concurrency = max(1, int(getattr(self.conf.runtime, 'GAODE_TILE_CONCURRENCY', 4)))
+        limiter = self._gaode_limiter(token)
+
+        def tile_urls(tile):
+            min_lon, min_lat, max_lon, max_lat = tile
+            polygon = f"{min_lon:.6f},{max_lat:.6f}|{max_lon:.6f},{min_lat:.6f}"
+            return ['https://restapi.amap.com/v3/place/polygon?key={}&polygon={}&keywords={}&types={}'
+                    '&offset=20&page={}&extensions=all&show_fields=business'.format(
+                        token, polygon, keywords, '餐饮', i) for i in range(1, self.n + 1)]
+
+        def search_tile(tile, depth):
+            # 返回 (餐厅信息列表, 需要继续搜索的子矩形列表)
+            urls = tile_urls(tile)
+            with requests.Session() as session:
+                first = self._fetch_gaode_page(session, urls[0], limiter)
+            try:
+                count = int(first.get('count', 0))
+            except (TypeError, ValueError):
+                count = 0
+            if count >= cap and depth < max_depth:
+                min_lon, min_lat, max_lon, max_lat = tile
+                mid_lon, mid_lat = (min_lon + max_lon) / 2, (min_lat + max_lat) / 2
+                return [], [((min_lon, min_lat, mid_lon, mid_lat), depth + 1), ((mid_lon, min_lat, max_lon, mid_lat), depth + 1),
+                            ((min_lon, mid_lat, mid_lon, max_lat), depth + 1), ((mid_lon, mid_lat, max_lon, max_lat), depth + 1)]
+            if count >= cap:
+                LOGGER.warning(f"分块已达最大细分层数 {max_depth}，结果可能被截断: {tile}")
+            return self._fetch_gaode_pages(urls, token, keywords, first=first), []
+
+        datalist = []
+        seen = set()
+        request_tiles = 0
+        pending = [((lon - d_lon, lat - d_lat, lon + d_lon, lat + d_lat), 0)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=tile_concurrency) as executor:
+            while pending:
+                request_tiles += len(pending)
+                futures = [executor.submit(search_tile, tile, depth) for tile, depth in pending]
+                pending = []
+                for future in concurrent.futures.as_completed(futures):
+                    tile_data, children = future.result()
+                    pending.extend(children)
+                    # 矩形边界上的POI可能被相邻矩形重复返回
+                    for item in tile_data:
+                        key = (item['rest_chinese_name'], item['rest_location'])
+                        if key not in seen:
+                            seen.add(key)
+                            datalist.append(item)
+        LOGGER.info(f"分块搜索完成，关键词: {keywords}，共搜索 {request_tiles} 个矩形，获得 {len(datalist)} 条结果")
+        return datalist
+
     def _tripadvisor_search(self, keywords=None, city=None) -> List[Dict]:
         """
         从TripAdvisor API获取餐厅信息
@@ -346,6 +472,9 @@ class GetRestaurantService:
         1. 门店名相似度>=60%
         2. 地址相似度>=60%
         3. 位置距离<=1000米
+        
+        按距离阈值将坐标划分网格，每家餐厅只与相邻网格中已保留的餐厅比较，
+        先向量化计算距离，再对距离满足条件的餐厅计算名称和地址相似度
         """
         if restaurant_list is None:
             restaurant_list = self.info
@@ -359,55 +488,70 @@ class GetRestaurantService:
                              key=lambda x: (x.get('rest_chinese_name', ''), x.get('updated_time', '')), 
                              reverse=True)
         
-        for i, item1 in enumerate(sorted_list):
-            # 假设当前项不是重复项
-            is_duplicate = False
-            name1 = item1.get('rest_chinese_name', '')
-            address1 = item1.get('rest_chinese_address', '')
-            location1 = item1.get('rest_location', '')
-            
-            # 解析经纬度
-            lat1, lon1 = None, None
-            if location1 and isinstance(location1, str) and ',' in location1:
+        # 一次性解析经纬度（弧度），无法解析的为NaN，这类餐厅不会被判定为重复
+        coords = np.full((len(sorted_list), 2), np.nan)
+        for i, item in enumerate(sorted_list):
+            location = item.get('rest_location', '')
+            if location and isinstance(location, str) and ',' in location:
                 try:
-                    lat_str, lon_str = location1.split(',', 1)
-                    lat1, lon1 = float(lat_str.strip()), float(lon_str.strip())
+                    lat_str, lon_str = location.split(',', 1)
+                    coords[i] = (float(lat_str.strip()), float(lon_str.strip()))
                 except (ValueError, TypeError):
                     pass
-            
-            # 与已保留的项比较
-            for item2 in deduped_info:
-                name2 = item2.get('rest_chinese_name', '')
-                address2 = item2.get('rest_chinese_address', '')
-                location2 = item2.get('rest_location', '')
-                
-                # 解析经纬度
-                lat2, lon2 = None, None
-                if location2 and isinstance(location2, str) and ',' in location2:
-                    try:
-                        lat_str, lon_str = location2.split(',', 1)
-                        lat2, lon2 = float(lat_str.strip()), float(lon_str.strip())
-                    except (ValueError, TypeError):
-                        pass
-                
-                # 计算相似度和距离
-                name_similarity = self._calculate_text_similarity(name1, name2)
-                address_similarity = self._calculate_text_similarity(address1, address2)
-                distance = self._calculate_distance(lat1, lon1, lat2, lon2)
-                
-                
-                # 判断是否为重复项
-                if (name_similarity >= self.name_similarity_threshold and 
-                    address_similarity >= self.address_similarity_threshold and 
-                    distance <= self.distance_threshold):
-                    LOGGER.info(f"去重信息: 餐厅名:{name1}-{name2}({name_similarity}) 地址:{address1}-{address2}({address_similarity}) 距离:{distance}米")
-                    is_duplicate = True
-                    duplicate_count += 1
-                    break
+        coords = np.radians(coords)
+        valid = ~np.isnan(coords).any(axis=1)
+        
+        # 网格尺寸：保证距离不超过阈值的两点一定落在相邻网格中
+        earth_radius = 6371000
+        cos_lat = np.cos(coords[valid, 0])
+        cell_lat = max(self.distance_threshold / earth_radius, 1e-9)
+        if valid.any() and (np.all(cos_lat > 0) or np.all(cos_lat < 0)):
+            cell_lon = cell_lat / (np.abs(cos_lat).min() * 2 / math.pi)
+        else:
+            cell_lon = float('inf')  # 纬度跨越极点等异常数据，不按经度分块
+        
+        def cell_of(i):
+            lon_cell = 0 if math.isinf(cell_lon) else int(math.floor(coords[i, 1] / cell_lon))
+            return int(math.floor(coords[i, 0] / cell_lat)), lon_cell
+        
+        grid = {}  # 网格 -> 已保留餐厅在sorted_list中的下标列表
+        for i, item1 in enumerate(sorted_list):
+            is_duplicate = False
+            if valid[i]:
+                cell_x, cell_y = cell_of(i)
+                neighbors = [j for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                             for j in grid.get((cell_x + dx, cell_y + dy), ())]
+                if neighbors:
+                    neighbors.sort()  # 按保留顺序比较，与逐一比较的结果一致
+                    candidates = np.asarray(neighbors)
+                    # 向量化Haversine距离（米）
+                    lat1, lon1 = coords[i]
+                    lat2, lon2 = coords[candidates, 0], coords[candidates, 1]
+                    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+                    distances = 2 * earth_radius * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+                    name1 = item1.get('rest_chinese_name', '')
+                    address1 = item1.get('rest_chinese_address', '')
+                    for j, distance in zip(candidates[distances <= self.distance_threshold],
+                                           distances[distances <= self.distance_threshold]):
+                        item2 = sorted_list[j]
+                        name2 = item2.get('rest_chinese_name', '')
+                        name_similarity = self._calculate_text_similarity(name1, name2)
+                        if name_similarity < self.name_similarity_threshold:
+                            continue
+                        address2 = item2.get('rest_chinese_address', '')
+                        address_similarity = self._calculate_text_similarity(address1, address2)
+                        if address_similarity < self.address_similarity_threshold:
+                            continue
+                        LOGGER.info(f"去重信息: 餐厅名:{name1}-{name2}({name_similarity}) 地址:{address1}-{address2}({address_similarity}) 距离:{distance}米")
+                        is_duplicate = True
+                        duplicate_count += 1
+                        break
             
             # 如果不是重复项，加入去重后的列表
             if not is_duplicate:
                 deduped_info.append(item1)
+                if valid[i]:
+                    grid.setdefault(cell_of(i), []).append(i)
         
         # 更新信息列表
         count_before = len(self.info)
@@ -467,6 +611,18 @@ class GetRestaurantService:
             print(f"计算距离出错: {e}, 坐标值: {lat1},{lon1} 和 {lat2},{lon2}")
             return 0
         
+    def _apply_incremental(self) -> None:
+        """
+        对照基准数据（已有餐厅主数据）过滤搜索结果，只保留新餐厅和有变化的餐厅
+        
+        有变化的餐厅沿用已有的翻译、类型等信息，只清空需要重新生成的字段
+        """
+        index = RestaurantIndex(self.benchmark)
+        new_items, changed_items, unchanged = index.partition(self.info)
+        self.info = new_items + changed_items
+        self.incremental_stats = {'new': len(new_items), 'changed': len(changed_items), 'unchanged': unchanged}
+        LOGGER.info(f"增量模式：新餐厅 {len(new_items)} 条，有变化 {len(changed_items)} 条，未变化已跳过 {unchanged} 条")
+
     def _info_to_restaurant(self, model_class=None, cp_id=None) -> None:
         """
         将餐厅信息转换为餐厅实体
@@ -498,22 +654,28 @@ class GetRestaurantService:
         LOGGER.info(f"已将 {len(self.info)} 条餐厅信息转换为餐厅实体")
     
 
-    def gen_info_v2(self, restaurants_group: RestaurantsGroup, num_workers: int = 4, logger_file: str = None) -> RestaurantsGroup:
+    def gen_info_v2(self, restaurants_group: RestaurantsGroup, num_workers: int = 4, logger_file: str = None,
+                    on_complete=None) -> RestaurantsGroup:
         """
         并行生成餐厅信息(改进版)，支持日志到文件，保证主线程能够返回
         
         :param restaurants_group: 餐厅组合
         :param num_workers: 并行工作线程数，当为1时不使用多线程
         :param logger_file: 日志文件路径，如果提供则将日志写入该文件
+        :param on_complete: 单个餐厅处理结束（无论成功与否）时的回调，签名为 on_complete(idx, restaurant)，
+                            线程模式下在工作线程中调用
         :return: 处理后的餐厅组合
         """
         # 创建心跳文件路径（用于监控进程是否活跃）
         # heartbeat_file = None
         status_file = None
         
-        # 定义直接写入主日志的函数
+        # 指定日志文件时使用异步写入队列，工作线程不会因磁盘I/O阻塞
+        log_writer = AsyncFileLogWriter(logger_file) if logger_file else None
+        
+        # 定义写入主日志的函数
         def write_log(level, message):
-            if not logger_file:
+            if log_writer is None:
                 # 如果没有指定日志文件，记录到控制台或标准日志
                 if level == "ERROR":
                     LOGGER.error(message)
@@ -522,50 +684,38 @@ class GetRestaurantService:
                 else:
                     LOGGER.info(message)
                 return
-                
+            log_writer.write(level, message)
+        
+        # 结束前写完剩余日志
+        def finish(result):
+            if log_writer is not None:
+                log_writer.close()
+            return result
+        
+        # 通知调用方单个餐厅已处理结束，回调异常不影响补全本身
+        def notify(idx, restaurant):
+            if on_complete is None:
+                return
             try:
-                # 使用跨平台方案实现超时功能
-                import threading
-                
-                # 设置超时标志
-                write_timeout = False
-                
-                # 定义超时处理函数
-                def timeout_callback():
-                    nonlocal write_timeout
-                    write_timeout = True
-                
-                # 创建定时器，1秒后触发超时
-                timer = threading.Timer(1.0, timeout_callback)
-                timer.start()
-                
-                try:
-                    # 记录起始时间
-                    start_time = time.time()
-                    
-                    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-                    log_line = f"{timestamp} - {level} - {message}\n"
-                    with open(logger_file, 'a', encoding='utf-8') as f:
-                        f.write(log_line)
-                        f.flush()
-                        # 只有ERROR级别的日志才强制fsync，减少磁盘I/O
-                        if level == "ERROR" and not write_timeout and (time.time() - start_time) < 0.5:
-                            try:
-                                os.fsync(f.fileno())  # 确保写入磁盘
-                            except:
-                                pass
-                finally:
-                    # 取消定时器
-                    timer.cancel()
-                    
-                # 检查是否超时
-                if write_timeout:
-                    print(f"WARNING: 写入日志超时: {message[:50]}...")
+                on_complete(idx, restaurant)
             except Exception as e:
-                # 如果写入日志失败，尝试记录到控制台
-                print(f"写入日志文件失败: {e}")
+                write_log("ERROR", f"餐厅 {idx} 的完成回调出错: {e}")
         
+        # 其他引擎整体返回后再逐个通知
+        def finish_all(result):
+            for idx, restaurant in enumerate(result.members):
+                notify(idx, restaurant)
+            return finish(result)
         
+        # 运行时配置指定异步或流水线模式时，交由对应引擎处理
+        enrich_mode = getattr(self.conf.runtime, 'ENRICH_MODE', 'thread')
+        if enrich_mode == 'async':
+            return finish_all(self.gen_info_async(restaurants_group, log=write_log))
+        if enrich_mode == 'pipeline':
+            return finish_all(self.gen_info_pipeline(restaurants_group, num_workers=num_workers, log=write_log))
+        if enrich_mode == 'process':
+            return finish_all(self.gen_info_process(restaurants_group, threads_per_process=num_workers, log=write_log))
+
         # 获取餐厅列表
         restaurants = restaurants_group.members
         total_count = len(restaurants)
@@ -575,7 +725,17 @@ class GetRestaurantService:
         
         if not restaurants:
             write_log("WARNING", "餐厅列表为空，无需生成信息")
-            return restaurants_group
+            return finish(restaurants_group)
+        
+        # 计数器更新锁
+        counter_lock = threading.Lock()
+        
+        # 工作线程的逐餐厅日志只写入日志文件（未指定日志文件时错误输出到控制台）
+        def write_worker_log(level, message):
+            if log_writer is not None:
+                log_writer.write(level, message)
+            elif level == "ERROR":
+                print(f"ERROR - {message.splitlines()[0]}")
         
         # 处理单个餐厅的函数
         def process_restaurant(restaurant, idx):
@@ -599,49 +759,6 @@ class GetRestaurantService:
                 except Exception:
                     pass
             
-            # 线程级别的日志同步锁
-            log_lock = threading.Lock()
-            
-            # 定义带超时功能的文件写入函数
-            def write_file_with_timeout(log_line, is_error=False):
-                try:
-                    # 使用跨平台方案实现超时功能
-                    import threading
-                    
-                    # 设置超时标志
-                    write_timeout = False
-                    
-                    # 定义超时处理函数
-                    def timeout_callback():
-                        nonlocal write_timeout
-                        write_timeout = True
-                    
-                    # 创建定时器，1秒后触发超时
-                    timer = threading.Timer(1.0, timeout_callback)
-                    timer.start()
-                    
-                    try:
-                        # 记录起始时间
-                        start_time = time.time()
-                        
-                        with open(logger_file, 'a', encoding='utf-8') as f:
-                            f.write(log_line)
-                            f.flush()
-                            # 错误日志尝试fsync，但有超时保护
-                            if is_error and not write_timeout and (time.time() - start_time) < 0.5:
-                                try:
-                                    os.fsync(f.fileno())
-                                except:
-                                    pass
-                    finally:
-                        # 取消定时器
-                        timer.cancel()
-                        
-                    # 检查是否超时
-                    return not write_timeout
-                except Exception:
-                    return False
-            
             start_time = time.time()
             restaurant_name = ""
             
@@ -649,14 +766,10 @@ class GetRestaurantService:
                 # 获取餐厅名称
                 restaurant_name = restaurant.inst.rest_chinese_name if hasattr(restaurant, 'inst') and hasattr(restaurant.inst, 'rest_chinese_name') else f"餐厅_{idx}"
                 
-                # 使用锁保护日志写入和计数器更新
-                with log_lock:
-                    # 直接写入文件而不是使用logger
-                    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-                    log_line = f"{timestamp} - INFO - [{idx+1}/{total_count}] 开始处理餐厅: {restaurant_name}\n"
-                    write_file_with_timeout(log_line)
-                    
-                    # 更新处理计数
+                write_worker_log("INFO", f"[{idx+1}/{total_count}] 开始处理餐厅: {restaurant_name}")
+                
+                # 使用锁保护计数器更新
+                with counter_lock:
                     processed_count += 1
                 
                 # 生成餐厅信息，增加额外的错误处理
@@ -680,44 +793,32 @@ class GetRestaurantService:
                     gc.collect()
                     raise
                 
-                # 使用锁保护日志写入和计数器更新
-                with log_lock:
+                with counter_lock:
                     success_count += 1
-                    elapsed = time.time() - start_time
-                    # 直接写入文件而不是使用logger
-                    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-                    log_line = f"{timestamp} - INFO - [{idx+1}/{total_count}] 完成处理餐厅: {restaurant_name}，耗时: {elapsed:.2f}秒\n"
-                    write_file_with_timeout(log_line)
+                elapsed = time.time() - start_time
+                write_worker_log("INFO", f"[{idx+1}/{total_count}] 完成处理餐厅: {restaurant_name}，耗时: {elapsed:.2f}秒")
                 
                 # 再次进行垃圾回收，确保内存被释放
                 gc.collect()
                 
-                # 显式释放不再需要的对象
-                log_lock = None
-                
+                notify(idx, restaurant)
                 return (idx, restaurant, None)
             except Exception as e:
-                # 使用锁保护日志写入和计数器更新
-                with log_lock:
+                with counter_lock:
                     failed_count += 1
-                    error_msg = str(e)
-                    tb_str = traceback.format_exc()
-                    # 直接写入文件而不是使用logger
-                    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-                    log_line = f"{timestamp} - ERROR - [{idx+1}/{total_count}] 处理餐厅 {restaurant_name if restaurant_name else f'餐厅_{idx}'} 时出错: {error_msg}\n{tb_str}\n"
-                    if not write_file_with_timeout(log_line, is_error=True):
-                        # 写入超时或失败，尝试输出到控制台
-                        print(f"ERROR - 处理餐厅 {restaurant_name if restaurant_name else f'餐厅_{idx}'} 时出错: {error_msg}")
+                error_msg = str(e)
+                tb_str = traceback.format_exc()
+                write_worker_log("ERROR", f"[{idx+1}/{total_count}] 处理餐厅 {restaurant_name if restaurant_name else f'餐厅_{idx}'} 时出错: {error_msg}\n{tb_str}")
                 
                 # 主动进行多次垃圾回收
                 for _ in range(3):
                     gc.collect()
                 
                 # 显式释放不再需要的对象
-                log_lock = None
                 error_msg = None
                 tb_str = None
                 
+                notify(idx, restaurant)
                 return (idx, restaurant, error_msg)
         
         try:
@@ -797,15 +898,73 @@ class GetRestaurantService:
             write_log("INFO", completion_msg)
 
             
-            return result_group
+            return finish(result_group)
         except Exception as e:
             error_msg = str(e)
             tb_str = traceback.format_exc()
             write_log("ERROR", f"生成餐厅信息过程中发生严重错误: {error_msg}\n{tb_str}")
 
-            return restaurants_group
+            return finish(restaurants_group)
     
 
+    def gen_info_async(self, restaurants_group: RestaurantsGroup, max_in_flight: int = None, log=None) -> RestaurantsGroup:
+        """
+        使用asyncio引擎生成餐厅信息，单个餐厅的各I/O步骤并发执行，并按端点共享并发上限
+        
+        :param restaurants_group: 餐厅组合
+        :param max_in_flight: 同时在途的请求上限，默认读取运行时配置ASYNC_MAX_IN_FLIGHT
+        :param log: 日志函数，签名为 log(level, message)
+        :return: 处理后的餐厅组合
+        """
+        if max_in_flight is None:
+            max_in_flight = getattr(self.conf.runtime, 'ASYNC_MAX_IN_FLIGHT', 64)
+        limits = getattr(self.conf.runtime, 'API_CONCURRENCY', None)
+        enricher = AsyncRestaurantEnricher(conf=self.conf, max_in_flight=max_in_flight, limits=limits, log=log)
+        try:
+            return enricher.run(restaurants_group)
+        except Exception as e:
+            LOGGER.error(f"异步生成餐厅信息过程中发生严重错误: {e}\n{traceback.format_exc()}")
+            return restaurants_group
+
+    def gen_info_pipeline(self, restaurants_group: RestaurantsGroup, num_workers: int = 8, log=None) -> RestaurantsGroup:
+        """
+        使用分阶段流水线生成餐厅信息，每个阶段一次处理整个餐厅组合，各阶段耗时保存在self.stage_timings中
+        
+        :param restaurants_group: 餐厅组合
+        :param num_workers: 阶段内部并发请求数
+        :param log: 日志函数，签名为 log(level, message)
+        :return: 处理后的餐厅组合
+        """
+        pipeline = RestaurantEnrichmentPipeline(conf=self.conf, num_workers=num_workers, log=log)
+        try:
+            return pipeline.run(restaurants_group)
+        except Exception as e:
+            LOGGER.error(f"流水线生成餐厅信息过程中发生严重错误: {e}\n{traceback.format_exc()}")
+            return restaurants_group
+        finally:
+            self.stage_timings = pipeline.timings
+
+    def gen_info_process(self, restaurants_group: RestaurantsGroup, num_processes: int = None,
+                         threads_per_process: int = 4, log=None) -> RestaurantsGroup:
+        """
+        使用多进程生成餐厅信息，餐厅组合按分片交给子进程处理
+        
+        :param restaurants_group: 餐厅组合
+        :param num_processes: 子进程数，默认读取运行时配置PROCESS_WORKERS，未配置时为CPU核数
+        :param threads_per_process: 每个子进程内的线程数
+        :param log: 日志函数，签名为 log(level, message)
+        :return: 处理后的餐厅组合
+        """
+        if num_processes is None:
+            num_processes = getattr(self.conf.runtime, 'PROCESS_WORKERS', None)
+        enricher = ProcessPoolEnricher(conf=self.conf, num_processes=num_processes,
+                                       threads_per_process=threads_per_process, log=log)
+        try:
+            return enricher.run(restaurants_group)
+        except Exception as e:
+            LOGGER.error(f"多进程生成餐厅信息过程中发生严重错误: {e}\n{traceback.format_exc()}")
+            return restaurants_group
+
     def gen_info(self, restaurants_group: RestaurantsGroup, num_workers: int = 4) -> RestaurantsGroup:
         """
         并行生成餐厅信息
@@ -868,7 +1027,8 @@ class GetRestaurantService:
         """
         return RestaurantsGroup(self.restaurants, group_type=group_type)
     
-    def run(self, cities=None, cp_id=None, model_class=None, file_path=None, use_api=True, if_gen_info=True, use_llm=True) -> RestaurantsGroup:
+    def run(self, cities=None, cp_id=None, model_class=None, file_path=None, use_api=True, if_gen_info=True, use_llm=True,
+            incremental=None) -> RestaurantsGroup:
 
         """
         执行获取餐厅信息的完整流程
@@ -880,6 +1040,7 @@ class GetRestaurantService:
         :param use_api: 是否使用API获取餐厅信息
         :param if_gen_info: 是否生成餐厅信息，如翻译和类型分析等
         :param use_llm: 是否使用大模型生成餐厅类型，默认为True
+        :param incremental: 是否只处理基准数据中没有或有变化的餐厅，默认读取运行时配置INCREMENTAL_SEARCH
         :return: 餐厅组合
         """
         # 如果提供了文件路径，从文件加载
@@ -919,7 +1080,11 @@ class GetRestaurantService:
                         except:
                             radius = 50000
 
+                        search_mode = getattr(self.conf.runtime, 'SEARCH_MODE', 'around')
+
                         def _gaode_search_func(key):
+                            if search_mode == 'tiled':
+                                return self._gaode_tiled_search(token = key, keywords = key_words, center = city_lat_lng, radius = radius)
                             return self._gaode_search(n = self.n, token = key, keywords = key_words, address = city_lat_lng, maptype = 1, radius = radius)
                         restaurant_list = robust_query(_gaode_search_func, self.conf.KEYS.gaode_keys)
                         
@@ -949,6 +1114,12 @@ class GetRestaurantService:
         # 去重
         self._dedup(restaurant_list=restaurant_list)
         
+        # 增量模式：跳过基准数据中已有且未变化的餐厅
+        if incremental is None:
+            incremental = getattr(self.conf.runtime, 'INCREMENTAL_SEARCH', False)
+        if incremental and self.benchmark:
+            self._apply_incremental()
+        
         # 转换为餐厅实体
         self._info_to_restaurant(model_class=model_class, cp_id=cp_id)
         
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+from app.utils.file_io import rp
+from app.utils.logger import setup_logger
+
+# 设置日志
+LOGGER = setup_logger("moco.log")
+
+# 默认的队列数据库路径
+DEFAULT_QUEUE_PATH = rp("jobs.sqlite", folder=["var", "run"])
+
+# 任务状态
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = 'queued', 'running', 'completed', 'failed', 'cancelled'
+
+# 失败重试的退避时间(秒)，按已尝试次数递增
+RETRY_BACKOFF = 30
+
+
+class JobQueue:
+    """
+    持久化的本地任务队列（SQLite，WAL模式，可跨进程共享）
+
+    补全/搜索任务写入队列后由任务进程领取执行；领取顺序为：
+    当前运行任务数较少的CP优先（同一台机器上多个CP的任务公平轮转）-> 优先级高者优先 -> 先提交者优先。
+    失败的任务按退避时间自动重试，运行中但心跳超时的任务（进程崩溃或程序重启）重新排队，
+    队列状态在程序重启后保留
+    """
+    def __init__(self, path: str = None):
+        """
+        :param path: SQLite文件路径，默认为 var/run/jobs.sqlite
+        """
+        self.path = path or DEFAULT_QUEUE_PATH
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, job_type TEXT, argv TEXT, cp_id TEXT, priority INTEGER DEFAULT 0, "
+            "status TEXT, attempts INTEGER DEFAULT 0, max_attempts INTEGER DEFAULT 3, worker TEXT, "
+            "cancel_requested INTEGER DEFAULT 0, error TEXT, created_at REAL, not_before REAL DEFAULT 0, "
+            "started_at REAL, heartbeat_at REAL, finished_at REAL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+
+    def enqueue(self, job_type: str, argv: List[str], cp_id: str = None, priority: int = 0,
+                max_attempts: int = 3, job_id: str = None) -> str:
+        """
+        提交任务
+
+        :param job_type: 任务类型（complete / search）
+        :param argv: 传给脚本的命令行参数
+        :param cp_id: 任务所属CP，用于公平调度
+        :param priority: 优先级，越大越先执行
+        :param max_attempts: 最大尝试次数（含首次）
+        :param job_id: 任务ID，默认自动生成
+        :return: 任务ID
+        """
+        job_id = job_id or str(uuid.uuid4())
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, job_type, argv, cp_id, priority, status, max_attempts, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, job_type, json.dumps(argv, ensure_ascii=False), cp_id, int(priority), QUEUED,
+                 max(1, int(max_attempts)), time.time()))
+        return job_id
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """
+        领取下一个可执行的任务
+
+        :param worker: 领取任务的进程标识
+        :return: 任务信息，没有可执行的任务时返回None
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT j.* FROM jobs j "
+                    "LEFT JOIN (SELECT cp_id, COUNT(*) AS n FROM jobs WHERE status = ? GROUP BY cp_id) r "
+                    "ON j.cp_id IS r.cp_id "
+                    "LEFT JOIN (SELECT cp_id, MAX(started_at) AS t FROM jobs GROUP BY cp_id) s "
+                    "ON j.cp_id IS s.cp_id "
+                    "WHERE j.status = ? AND j.not_before <= ? "
+                    "ORDER BY COALESCE(r.n, 0), j.priority DESC, COALESCE(s.t, 0), j.created_at LIMIT 1",
+                    (RUNNING, QUEUED, now)).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, started_at = ?, "
+                        "heartbeat_at = ? WHERE id = ?", (RUNNING, worker, now, now, row['id']))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = self._to_dict(row)
+        job.update(status=RUNNING, worker=worker, attempts=job['attempts'] + 1)
+        return job
+
+    def heartbeat(self, job_id: str) -> bool:
+        """
+        更新运行中任务的心跳
+
+        :return: 是否已请求取消该任务
+        """
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = ?",
+                               (time.time(), job_id, RUNNING))
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def finish(self, job_id: str, status: str, error: str = None) -> str:
+        """
+        记录任务结果，失败且未达到最大尝试次数时重新排队
+
+        :param status: completed / failed / cancelled
+        :return: 任务的最终状态（重试时为queued）
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT attempts, max_attempts, cancel_requested FROM jobs WHERE id = ?",
+                                     (job_id,)).fetchone()
+            if row is None:
+                return status
+            if status == FAILED and not row['cancel_requested'] and row['attempts'] < row['max_attempts']:
+                status = QUEUED
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, worker = NULL, error = ?, not_before = ? WHERE id = ?",
+                    (QUEUED, error, now + RETRY_BACKOFF * row['attempts'], job_id))
+            else:
+                self._conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                                   (status, error, now, job_id))
+        return status
+
+    def request_cancel(self, job_id: str) -> Optional[str]:
+        """
+        取消任务：排队中的任务直接取消，运行中的任务由执行进程在下一个检查点停止
+
+        :return: 任务当前状态，任务不存在时返回None
+        """
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                               (CANCELLED, time.time(), job_id, QUEUED))
+            self._conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?",
+                               (job_id, RUNNING))
+            row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row['status'] if row else None
+
+    def requeue_stale(self, timeout: float = 60) -> int:
+        """
+        将心跳超时的运行中任务重新排队（达到最大尝试次数的记为失败）
+
+        :param timeout: 心跳超时时间(秒)
+        :return: 处理的任务数
+        """
+        deadline = time.time() - timeout
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute("SELECT id, attempts, max_attempts FROM jobs WHERE status = ? AND heartbeat_at < ?",
+                                          (RUNNING, deadline)).fetchall()
+                for row in rows:
+                    if row['attempts'] < row['max_attempts']:
+                        self._conn.execute("UPDATE jobs SET status = ?, worker = NULL, error = ? WHERE id = ?",
+                                           (QUEUED, "执行进程已退出", row['id']))
+                    else:
+                        self._conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                                           (FAILED, "执行进程已退出", time.time(), row['id']))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if rows:
+            LOGGER.warning(f"{len(rows)} 个任务的执行进程已退出，已重新排队")
+        return len(rows)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, statuses: List[str] = None) -> List[Dict[str, Any]]:
+        """按提交时间列出任务，可按状态过滤"""
+        query, params = "SELECT * FROM jobs", ()
+        if statuses:
+            query += f" WHERE status IN ({','.join('?' * len(statuses))})"
+            params = tuple(statuses)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY created_at", params).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def pending_count(self) -> int:
+        """排队中和运行中的任务数"""
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*) AS n FROM jobs WHERE status IN (?, ?)",
+                                     (QUEUED, RUNNING)).fetchone()
+        return row['n']
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job['argv'] = json.loads(job['argv'] or '[]')
+        return job
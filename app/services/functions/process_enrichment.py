@@ -0,0 +1,158 @@
+import os
+import pickle
+import time
+import traceback
+import multiprocessing
+import concurrent.futures
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.services.instances.restaurant import Restaurant, RestaurantsGroup
+from app.models import RestaurantModel
+from app.config.config import CONF
+from app.utils.logger import setup_logger
+
+# 设置日志
+LOGGER = setup_logger("moco.log")
+
+
+def _runtime_snapshot(conf) -> Dict[str, Any]:
+    """
+    提取可以传递给子进程的运行时配置（跳过无法序列化的项）
+    """
+    snapshot = {}
+    for key, value in vars(conf.runtime).items():
+        try:
+            pickle.dumps(value)
+        except Exception:
+            continue
+        snapshot[key] = value
+    return snapshot
+
+
+def _init_worker(runtime: Dict[str, Any]) -> None:
+    """
+    子进程初始化：应用主进程的运行时配置（含已查询的城市地理信息），
+    类型缓存、POI缓存等持久化缓存在子进程中首次使用时各自打开
+    """
+    for key, value in runtime.items():
+        setattr(CONF.runtime, key, value)
+
+
+def _enrich_shard(records: List[Dict[str, Any]], model, cp_location, threads: int) -> List[Tuple[Optional[Dict], bool, Optional[str]]]:
+    """
+    在子进程中补全一批餐厅，返回 [(补全后的字段字典, 是否全部生成成功, 错误信息), ...]
+    """
+    def enrich(record):
+        try:
+            restaurant = Restaurant(dict(record), model=model, conf=CONF, cp_location=cp_location)
+            success = restaurant.generate()
+            return restaurant.inst.model_dump(), bool(success), None
+        except Exception as e:
+            return None, False, f"{e}\n{traceback.format_exc()}"
+
+    if threads <= 1:
+        return [enrich(record) for record in records]
+    # 子进程内仍用少量线程重叠网络等待
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(enrich, records))
+
+
+class ProcessPoolEnricher:
+    """
+    多进程餐厅信息补全引擎
+
+    将餐厅组合切分为若干分片交给子进程处理，子进程之间不争用GIL；
+    主进程与子进程之间只传递字段字典，不传递Restaurant对象
+    """
+    def __init__(self, conf=CONF, num_processes: int = None, threads_per_process: int = 4, shard_size: int = 50,
+                 log: Optional[Callable[[str, str], None]] = None):
+        """
+        初始化补全引擎
+
+        :param conf: 配置服务实例
+        :param num_processes: 子进程数，默认为CPU核数
+        :param threads_per_process: 每个子进程内的线程数
+        :param shard_size: 每个分片的餐厅数
+        :param log: 日志函数，签名为 log(level, message)
+        """
+        self.conf = conf
+        self.num_processes = max(1, int(num_processes or os.cpu_count() or 1))
+        self.threads_per_process = max(1, int(threads_per_process))
+        self.shard_size = max(1, int(shard_size))
+        self.log = log or self._default_log
+        self.success_count = 0
+        self.failed_count = 0
+
+    @staticmethod
+    def _default_log(level: str, message: str) -> None:
+        if level == "ERROR":
+            LOGGER.error(message)
+        elif level == "WARNING":
+            LOGGER.warning(message)
+        else:
+            LOGGER.info(message)
+
+    @staticmethod
+    def _to_record(restaurant: Restaurant) -> Dict[str, Any]:
+        inst = restaurant.inst
+        return inst.model_dump() if hasattr(inst, 'model_dump') else dict(vars(inst))
+
+    def run(self, restaurants_group: RestaurantsGroup) -> RestaurantsGroup:
+        """
+        补全餐厅组合中所有餐厅的信息
+
+        :param restaurants_group: 餐厅组合
+        :return: 处理后的餐厅组合（成员与原组合相同且顺序不变）
+        """
+        restaurants = restaurants_group.members
+        if not restaurants:
+            self.log("WARNING", "餐厅列表为空，无需生成信息")
+            return restaurants_group
+
+        start_time = time.time()
+        model = type(restaurants[0].inst) if hasattr(restaurants[0].inst, 'model_dump') else RestaurantModel
+        cp_location = restaurants[0].cp_location
+        shards = [list(range(i, min(i + self.shard_size, len(restaurants))))
+                  for i in range(0, len(restaurants), self.shard_size)]
+        num_processes = min(self.num_processes, len(shards))
+        self.log("INFO", f"使用多进程处理 {len(restaurants)} 个餐厅，进程数: {num_processes}，"
+                         f"每进程线程数: {self.threads_per_process}，分片数: {len(shards)}")
+
+        done_count = 0
+        # 统一使用spawn启动子进程：fork会把父进程的SQLite连接、线程和锁一并复制到子进程
+        with concurrent.futures.ProcessPoolExecutor(max_workers=num_processes, initializer=_init_worker,
+                                                    initargs=(_runtime_snapshot(self.conf),),
+                                                    mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {
+                executor.submit(_enrich_shard, [self._to_record(restaurants[i]) for i in shard],
+                                model, cp_location, self.threads_per_process): shard
+                for shard in shards
+            }
+            for future in concurrent.futures.as_completed(futures):
+                shard = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    self.failed_count += len(shard)
+                    self.log("ERROR", f"分片处理失败（{len(shard)} 个餐厅）: {e}")
+                    continue
+                for idx, (record, success, error) in zip(shard, results):
+                    restaurant = restaurants[idx]
+                    if record is None:
+                        self.failed_count += 1
+                        self.log("ERROR", f"处理餐厅 {restaurant.inst.rest_chinese_name} 时出错: {error}")
+                        continue
+                    # 将子进程的结果写回原餐厅对象（未全部生成成功的也保留已生成的字段，但不标记为就绪）
+                    for key, value in record.items():
+                        setattr(restaurant.inst, key, value)
+                    if success:
+                        restaurant.status = 'ready'
+                        self.success_count += 1
+                    else:
+                        self.failed_count += 1
+                        self.log("WARNING", f"餐厅 {restaurant.inst.rest_chinese_name} 信息未完整生成")
+                done_count += len(shard)
+                self.log("INFO", f"进度: {done_count}/{len(restaurants)} ({done_count / len(restaurants) * 100:.1f}%)")
+
+        self.log("INFO", f"餐厅信息生成完成，共处理 {len(restaurants)} 个餐厅，成功: {self.success_count}，"
+                         f"失败: {self.failed_count}，耗时: {time.time() - start_time:.2f}秒")
+        return RestaurantsGroup(list(restaurants), group_type=restaurants_group.group_type)
@@ -0,0 +1,166 @@
+import math
+from typing import Dict, List, Optional, Tuple
+import pandas as pd
+from app.utils.hash import hash_text
+from app.utils.type_cache import normalize_name
+from app.utils.logger import setup_logger
+
+# 设置日志
+LOGGER = setup_logger("moco.log")
+
+# 地址或坐标变化时需要重新生成的派生字段
+ADDRESS_DERIVED_FIELDS = ['rest_english_address', 'rest_district', 'rest_street']
+LOCATION_DERIVED_FIELDS = ['rest_district', 'rest_street', 'rest_distance']
+
+
+def _text(value) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    return str(value).strip()
+
+
+def _parse_location(value) -> Optional[Tuple[float, float]]:
+    """解析"经度,纬度"字符串，无法解析时返回None"""
+    text = _text(value)
+    if ',' not in text:
+        return None
+    try:
+        x, y = text.split(',', 1)
+        return float(x), float(y)
+    except ValueError:
+        return None
+
+
+def _distance(p1: Tuple[float, float], p2: Tuple[float, float]) -> float:
+    """两个"经度,纬度"坐标之间的近似距离（米）"""
+    dx = (p1[0] - p2[0]) * 111320 * math.cos(math.radians((p1[1] + p2[1]) / 2))
+    dy = (p1[1] - p2[1]) * 110540
+    return math.hypot(dx, dy)
+
+
+class RestaurantIndex:
+    """
+    已有餐厅主数据的索引，用于增量搜索
+
+    按餐厅ID（中文名哈希）和"规范化名称+坐标网格"两种方式索引，
+    判断搜索到的POI是新餐厅、未变化的已有餐厅，还是地址/电话/坐标有变化的已有餐厅
+    """
+    def __init__(self, records: List[Dict], cell_size: float = 200, moved_threshold: float = 50):
+        """
+        初始化索引
+
+        :param records: 已有餐厅数据（字典列表，字段同RestaurantModel）
+        :param cell_size: 网格尺寸（米），也是判定为同一餐厅的最大距离
+        :param moved_threshold: 坐标变化超过该距离（米）时视为有变化
+        """
+        self.records = records
+        self.cell_size = cell_size
+        self.moved_threshold = moved_threshold
+        self.by_id = {}  # 餐厅ID -> 记录下标列表（同名分店共用ID）
+        self.grid = {}   # (规范化名称, 网格) -> 记录下标列表
+        for idx, record in enumerate(records):
+            name = _text(record.get('rest_chinese_name'))
+            if not name:
+                continue
+            rest_id = _text(record.get('rest_id')) or hash_text(name)[:16]
+            self.by_id.setdefault(rest_id, []).append(idx)
+            location = _parse_location(record.get('rest_location'))
+            if location:
+                self.grid.setdefault((normalize_name(name), self._cell(location)), []).append(idx)
+
+    def _cell(self, location: Tuple[float, float]) -> Tuple[int, int]:
+        lon, lat = location
+        return (int(math.floor(lon * 111320 * math.cos(math.radians(lat)) / self.cell_size)),
+                int(math.floor(lat * 110540 / self.cell_size)))
+
+    def match(self, item: Dict) -> Optional[Dict]:
+        """
+        查找与POI对应的已有餐厅记录
+
+        :param item: 搜索得到的餐厅信息
+        :return: 已有记录或None
+        """
+        name = _text(item.get('rest_chinese_name'))
+        if not name:
+            return None
+        location = _parse_location(item.get('rest_location'))
+        candidates = self.by_id.get(hash_text(name)[:16], [])
+        if location is None:
+            # 没有坐标时仅在ID唯一的情况下认为是同一家餐厅
+            return self.records[candidates[0]] if len(candidates) == 1 else None
+
+        # 同名记录中取距离最近的
+        best, best_distance = None, float('inf')
+        for idx in candidates:
+            record_location = _parse_location(self.records[idx].get('rest_location'))
+            if record_location is None:
+                continue
+            distance = _distance(location, record_location)
+            if distance < best_distance:
+                best, best_distance = idx, distance
+        if best is not None and best_distance <= self.cell_size:
+            return self.records[best]
+
+        # 名称规范化后在相邻网格中查找（处理空格、全半角差异）
+        norm_name = normalize_name(name)
+        cell_x, cell_y = self._cell(location)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for idx in self.grid.get((norm_name, (cell_x + dx, cell_y + dy)), ()):
+                    record_location = _parse_location(self.records[idx].get('rest_location'))
+                    if _distance(location, record_location) <= self.cell_size:
+                        return self.records[idx]
+        return None
+
+    def diff(self, item: Dict, record: Dict) -> List[str]:
+        """
+        比较POI与已有记录，返回发生变化的原始字段
+        """
+        changed = []
+        address = _text(item.get('rest_chinese_address'))
+        if address and address != _text(record.get('rest_chinese_address')):
+            changed.append('rest_chinese_address')
+        phone = _text(item.get('rest_contact_phone'))
+        if phone and phone != _text(record.get('rest_contact_phone')):
+            changed.append('rest_contact_phone')
+        location = _parse_location(item.get('rest_location'))
+        record_location = _parse_location(record.get('rest_location'))
+        if location and (record_location is None or _distance(location, record_location) > self.moved_threshold):
+            changed.append('rest_location')
+        return changed
+
+    def partition(self, items: List[Dict]) -> Tuple[List[Dict], List[Dict], int]:
+        """
+        将搜索结果划分为新餐厅、有变化的已有餐厅和未变化的已有餐厅
+
+        有变化的餐厅以已有记录为基础，更新变化的原始字段并清空依赖这些字段的派生字段，
+        补全时只需重新生成这些字段
+
+        :param items: 搜索得到的餐厅信息列表
+        :return: (新餐厅列表, 有变化的餐厅列表, 未变化的餐厅数量)
+        """
+        new_items, changed_items, unchanged = [], [], 0
+        for item in items:
+            record = self.match(item)
+            if record is None:
+                new_items.append(item)
+                continue
+            changed_fields = self.diff(item, record)
+            if not changed_fields:
+                unchanged += 1
+                continue
+            merged = {k: v for k, v in record.items() if not (isinstance(v, float) and pd.isna(v))}
+            for field in changed_fields:
+                merged[field] = item[field]
+            derived = set()
+            if 'rest_chinese_address' in changed_fields:
+                derived.update(ADDRESS_DERIVED_FIELDS)
+            if 'rest_location' in changed_fields:
+                derived.update(LOCATION_DERIVED_FIELDS)
+            for field in derived:
+                merged.pop(field, None)
+            if item.get('rest_district'):
+                merged['rest_district'] = item['rest_district']
+            merged['rest_verified_date'] = None
+            changed_items.append(merged)
+        return new_items, changed_items, unchanged
@@ -0,0 +1,437 @@
+import os
+import sys
+import copy
+import json
+import time
+import socket
+import secrets
+import argparse
+import importlib
+import threading
+import traceback
+import subprocess
+import socketserver
+from typing import Any, Dict, List, Optional
+from app.services.functions.job_queue import JobQueue, COMPLETED, FAILED, CANCELLED
+from app.config.config import CONF
+from app.utils.file_io import rp
+from app.utils.logger import setup_logger
+
+# 设置日志
+LOGGER = setup_logger("moco.log")
+
+# 守护进程的连接信息（端口、进程号、口令）
+STATE_FILE = rp("worker_daemon.json", folder=["var", "run"])
+
+# 可执行的任务类型 -> 脚本模块（模块需提供 main(argv, cancel_event)）
+JOB_MODULES = {
+    'complete': 'app.services.scripts.complete_restaurants_info',
+    'search': 'app.services.scripts.search_restaurants',
+}
+
+# 默认的任务进程数
+DEFAULT_WORKERS = 2
+
+# 无任务时自动退出的空闲时间(秒)
+DEFAULT_IDLE_TIMEOUT = 30 * 60
+
+# 任务心跳间隔与超时时间(秒)
+HEARTBEAT_INTERVAL = 2
+HEARTBEAT_TIMEOUT = 60
+
+
+# 打包后（PyInstaller）主程序识别的参数，带此参数启动时转入本模块的main()
+FROZEN_SWITCH = '--worker-daemon'
+
+
+def _project_root() -> str:
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+
+def _spawn(args: List[str]) -> subprocess.Popen:
+    """在后台启动本模块的新进程（不打开控制台窗口）"""
+    kwargs = {'cwd': _project_root(), 'stdin': subprocess.DEVNULL,
+              'stdout': subprocess.DEVNULL, 'stderr': subprocess.DEVNULL}
+    if sys.platform == 'win32':
+        kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs['start_new_session'] = True
+    if getattr(sys, 'frozen', False):
+        # 打包后sys.executable是主程序本身，不能用-m运行模块，由main.py根据参数转入
+        command = [sys.executable, FROZEN_SWITCH, *args]
+    else:
+        command = [sys.executable, '-m', 'app.services.functions.worker_daemon', *args]
+    return subprocess.Popen(command, **kwargs)
+
+
+def _copy_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        return copy.deepcopy(state)
+    except Exception:
+        return dict(state)
+
+
+def _runtime_snapshot() -> Dict[str, Any]:
+    """复制CONF.runtime的当前属性"""
+    return _copy_state(vars(CONF.runtime))
+
+
+def _restore_runtime(snapshot: Dict[str, Any]) -> None:
+    """将CONF.runtime恢复为快照中的属性（删除之后新增的属性）"""
+    state = vars(CONF.runtime)
+    state.clear()
+    state.update(_copy_state(snapshot))
+
+
+def run_in_process(job_type: str, argv: List[str], job_id: str = None) -> threading.Event:
+    """
+    任务服务不可用时（如无法启动新进程）在当前进程的后台线程中执行任务，不经过任务队列，失败不重试
+
+    任务直接使用当前进程的CONF.runtime，忽略argv中的--config_file，避免序列化后的配置覆盖当前进程的配置
+
+    :param job_type: 任务类型（complete / search）
+    :param argv: 传给脚本的命令行参数（不含解释器和脚本路径）
+    :param job_id: 任务ID，仅用于日志
+    :return: 取消标志，设置后任务在下一个检查点停止
+    """
+    module = importlib.import_module(JOB_MODULES[job_type])
+    argv = [arg for arg in argv if not arg.startswith('--config_file')]
+    cancel_event = threading.Event()
+
+    def target():
+        try:
+            code = module.main(argv, cancel_event=cancel_event)
+            LOGGER.info(f"进程内任务 {job_id or job_type} 结束，返回码: {code}")
+        except SystemExit:
+            pass
+        except Exception as e:
+            LOGGER.error(f"进程内任务 {job_id or job_type} 执行出错: {e}\n{traceback.format_exc()}")
+
+    threading.Thread(target=target, name=f"job-{job_id or job_type}", daemon=True).start()
+    LOGGER.info(f"任务服务不可用，已在当前进程中执行任务 {job_id or job_type}")
+    return cancel_event
+
+
+class JobWorker:
+    """
+    常驻的任务执行进程
+
+    循环从任务队列领取任务，在本进程内调用脚本的main()执行：
+    pandas、openai等模块与配置只加载一次，类型缓存、POI缓存、城市代码索引等进程内缓存在任务之间保持；
+    每个进程同时只执行一个任务，任务对CONF.runtime的修改在任务结束后还原，不会带入下一个任务
+    """
+    def __init__(self, job_queue: JobQueue, worker_id: str, poll_interval: float = 0.5):
+        """
+        :param job_queue: 任务队列
+        :param worker_id: 进程标识
+        :param poll_interval: 队列为空时的轮询间隔(秒)
+        """
+        self.queue = job_queue
+        self.worker_id = worker_id
+        self.poll_interval = poll_interval
+        # 进程启动时的运行时配置，每个任务结束后恢复
+        self.runtime_baseline = _runtime_snapshot()
+
+    def _heartbeat(self, job_id: str, cancel_event: threading.Event, done: threading.Event) -> None:
+        while not done.wait(HEARTBEAT_INTERVAL):
+            try:
+                if self.queue.heartbeat(job_id):
+                    cancel_event.set()
+            except Exception as e:
+                LOGGER.warning(f"更新任务 {job_id} 心跳失败: {e}")
+
+    def run_job(self, job: Dict[str, Any]) -> str:
+        """
+        执行一个已领取的任务并记录结果
+
+        :return: 任务的最终状态
+        """
+        job_id = job['id']
+        cancel_event, done = threading.Event(), threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job_id, cancel_event, done), daemon=True).start()
+        LOGGER.info(f"[{self.worker_id}] 开始执行任务 {job_id}（{job['job_type']}，第 {job['attempts']} 次）")
+        error = None
+        try:
+            module = importlib.import_module(JOB_MODULES[job['job_type']])
+            code = module.main(job['argv'], cancel_event=cancel_event)
+            status = CANCELLED if cancel_event.is_set() else (FAILED if code else COMPLETED)
+        except SystemExit as e:
+            status = FAILED if e.code else COMPLETED
+        except Exception as e:
+            status, error = FAILED, str(e)
+            LOGGER.error(f"任务 {job_id} 执行出错: {e}\n{traceback.format_exc()}")
+        finally:
+            done.set()
+            _restore_runtime(self.runtime_baseline)
+        status = self.queue.finish(job_id, status, error)
+        LOGGER.info(f"[{self.worker_id}] 任务 {job_id} 结束，状态: {status}")
+        return status
+
+    def run(self, parent_pid: int = None) -> None:
+        """
+        持续领取并执行任务，父进程退出后停止
+        """
+        while parent_pid is None or os.getppid() == parent_pid:
+            job = self.queue.claim(self.worker_id)
+            if job is None:
+                time.sleep(self.poll_interval)
+                continue
+            if job['job_type'] not in JOB_MODULES:
+                self.queue.finish(job['id'], FAILED, f"未知的任务类型: {job['job_type']}")
+                continue
+            self.run_job(job)
+
+
+class WorkerDaemon:
+    """
+    本地任务服务
+
+    维持指定数量的任务执行进程（JobWorker）共同消费持久化任务队列，退出的执行进程会被重新拉起，
+    心跳超时的任务重新排队；通过回环TCP连接接收按行分隔的JSON命令（ping / submit / cancel / status / shutdown）
+    """
+    def __init__(self, workers: int = DEFAULT_WORKERS, idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+                 state_file: str = STATE_FILE, queue_path: str = None):
+        """
+        :param workers: 任务执行进程数
+        :param idle_timeout: 队列为空时自动退出的时间(秒)
+        :param state_file: 连接信息文件路径
+        :param queue_path: 任务队列数据库路径
+        """
+        self.workers = max(1, int(workers))
+        self.idle_timeout = idle_timeout
+        self.state_file = state_file
+        self.queue_path = queue_path
+        self.queue = JobQueue(queue_path)
+        self.token = secrets.token_hex(16)
+        self.processes = []
+        self.last_active = time.time()
+        self.server = None
+        self._stopping = threading.Event()
+
+    def _handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """处理一条命令"""
+        if request.get('token') != self.token:
+            return {'ok': False, 'error': '口令错误'}
+        cmd = request.get('cmd')
+        self.last_active = time.time()
+        if cmd == 'ping':
+            return {'ok': True, 'pid': os.getpid(), 'workers': self.workers}
+        if cmd == 'submit':
+            job_type = request.get('job_type')
+            if job_type not in JOB_MODULES:
+                return {'ok': False, 'error': f"未知的任务类型: {job_type}"}
+            job_id = self.queue.enqueue(job_type, list(request.get('argv') or []), cp_id=request.get('cp_id'),
+                                        priority=request.get('priority') or 0,
+                                        max_attempts=request.get('max_attempts') or 3, job_id=request.get('job_id'))
+            return {'ok': True, 'job_id': job_id}
+        if cmd in ('cancel', 'status'):
+            job_id = request.get('job_id')
+            if cmd == 'cancel':
+                self.queue.request_cancel(job_id)
+            job = self.queue.get(job_id)
+            if job is None:
+                return {'ok': False, 'error': '任务不存在'}
+            return {'ok': True, 'status': job['status'], 'error': job['error'],
+                    'attempts': job['attempts'], 'max_attempts': job['max_attempts']}
+        if cmd == 'shutdown':
+            threading.Thread(target=self.stop, daemon=True).start()
+            return {'ok': True}
+        return {'ok': False, 'error': f"未知命令: {cmd}"}
+
+    def _supervise(self) -> None:
+        """维持执行进程数量，重新排队心跳超时的任务，空闲超时后退出"""
+        while not self._stopping.wait(HEARTBEAT_INTERVAL):
+            try:
+                self.queue.requeue_stale(HEARTBEAT_TIMEOUT)
+                for i, process in enumerate(self.processes):
+                    if process.poll() is not None:
+                        LOGGER.warning(f"任务执行进程 {i} 已退出（返回码 {process.returncode}），重新启动")
+                        self.processes[i] = self._start_worker(i)
+                if self.queue.pending_count():
+                    self.last_active = time.time()
+                elif time.time() - self.last_active > self.idle_timeout:
+                    LOGGER.info("任务服务空闲超时，退出")
+                    self.stop()
+            except Exception as e:
+                LOGGER.error(f"任务服务巡检出错: {e}")
+
+    def _start_worker(self, index: int) -> subprocess.Popen:
+        args = ['--worker', f"{os.getpid()}-{index}", '--parent_pid', str(os.getpid())]
+        if self.queue_path:
+            args += ['--queue_path', self.queue_path]
+        return _spawn(args)
+
+    def stop(self) -> None:
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        for process in self.processes:
+            if process.poll() is None:
+                process.terminate()
+        if self.server is not None:
+            self.server.shutdown()
+
+    def serve_forever(self) -> None:
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    request = json.loads(self.rfile.readline().decode('utf-8'))
+                    response = daemon._handle(request)
+                except Exception as e:
+                    response = {'ok': False, 'error': str(e)}
+                self.wfile.write((json.dumps(response, ensure_ascii=False) + '\n').encode('utf-8'))
+
+        # 上次运行时未完成的任务重新排队
+        self.queue.requeue_stale(0)
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.processes = [self._start_worker(i) for i in range(self.workers)]
+        os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        with open(self.state_file, 'w', encoding='utf-8') as f:
+            json.dump({'port': self.server.server_address[1], 'pid': os.getpid(), 'token': self.token}, f)
+        threading.Thread(target=self._supervise, daemon=True).start()
+        LOGGER.info(f"任务服务已启动，端口: {self.server.server_address[1]}，执行进程数: {self.workers}")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            try:
+                os.remove(self.state_file)
+            except OSError:
+                pass
+
+
+class WorkerDaemonClient:
+    """
+    本地任务服务的客户端，按需启动任务服务并提交任务
+
+    执行进程数只在启动任务服务时生效：任务服务已在运行时，修改JOB_WORKERS要等它空闲超时退出
+    （或调用shutdown()）后，下次提交任务重新启动时才会应用
+    """
+    def __init__(self, workers: int = DEFAULT_WORKERS, state_file: str = STATE_FILE, start_timeout: float = 30):
+        """
+        :param workers: 启动任务服务时的执行进程数（任务服务已在运行时不生效）
+        :param state_file: 连接信息文件路径
+        :param start_timeout: 启动任务服务的最长等待时间(秒)
+        """
+        self.workers = workers
+        self.state_file = state_file
+        self.start_timeout = start_timeout
+
+    def _request(self, payload: Dict[str, Any], timeout: float = 5) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            with socket.create_connection(('127.0.0.1', state['port']), timeout=timeout) as sock:
+                sock.sendall((json.dumps({**payload, 'token': state['token']}, ensure_ascii=False) + '\n').encode('utf-8'))
+                data = b''
+                while not data.endswith(b'\n'):
+                    chunk = sock.recv(4096)
+                    if not chunk:
+                        break
+                    data += chunk
+            return json.loads(data.decode('utf-8'))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def is_running(self) -> bool:
+        response = self._request({'cmd': 'ping'})
+        return bool(response and response.get('ok'))
+
+    def ensure_running(self) -> bool:
+        """
+        确保任务服务在运行，未运行时在后台启动
+
+        :return: 是否可用
+        """
+        response = self._request({'cmd': 'ping'})
+        if response and response.get('ok'):
+            if response.get('workers') != self.workers:
+                LOGGER.info(f"任务服务已在运行（执行进程数 {response.get('workers')}），"
+                            f"执行进程数 {self.workers} 在任务服务重新启动后生效")
+            return True
+        try:
+            _spawn(['--workers', str(self.workers)])
+        except OSError as e:
+            LOGGER.error(f"启动任务服务失败: {e}")
+            return False
+        deadline = time.time() + self.start_timeout
+        while time.time() < deadline:
+            if self.is_running():
+                return True
+            time.sleep(0.2)
+        LOGGER.error("等待任务服务启动超时")
+        return False
+
+    def submit(self, job_type: str, argv: List[str], job_id: str = None, cp_id: str = None,
+               priority: int = 0, max_attempts: int = 3) -> Optional[str]:
+        """
+        提交任务（任务服务未运行时自动启动）
+
+        :param job_type: 任务类型（complete / search）
+        :param argv: 传给脚本的命令行参数（不含解释器和脚本路径）
+        :param job_id: 任务ID，默认自动生成
+        :param cp_id: 任务所属CP，用于公平调度
+        :param priority: 优先级，越大越先执行
+        :param max_attempts: 最大尝试次数（含首次）
+        :return: 任务ID，提交失败时返回None
+        """
+        if not self.ensure_running():
+            return None
+        response = self._request({'cmd': 'submit', 'job_type': job_type, 'argv': argv, 'job_id': job_id,
+                                  'cp_id': cp_id, 'priority': priority, 'max_attempts': max_attempts})
+        if not response or not response.get('ok'):
+            LOGGER.error(f"提交任务失败: {response.get('error') if response else '无响应'}")
+            return None
+        return response['job_id']
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """
+        取消排队中或运行中的任务（运行中的任务在下一个检查点停止）
+
+        :return: 取消后的任务状态（排队中的任务为cancelled，运行中的任务仍为running），失败时返回None
+        """
+        response = self._request({'cmd': 'cancel', 'job_id': job_id})
+        return response.get('status') if response and response.get('ok') else None
+
+    def status(self, job_id: str) -> Optional[str]:
+        info = self.job_info(job_id)
+        return info['status'] if info else None
+
+    def job_info(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        查询任务状态与尝试次数
+
+        :return: {'status', 'error', 'attempts', 'max_attempts'}，任务服务不可用或任务不存在时返回None
+        """
+        response = self._request({'cmd': 'status', 'job_id': job_id})
+        if not response or not response.get('ok'):
+            return None
+        return {key: response.get(key) for key in ('status', 'error', 'attempts', 'max_attempts')}
+
+    def shutdown(self) -> None:
+        self._request({'cmd': 'shutdown'})
+
+
+def main(argv: List[str] = None):
+    """
+    :param argv: 命令行参数，默认读取sys.argv（打包后由main.py传入FROZEN_SWITCH之后的参数）
+    """
+    parser = argparse.ArgumentParser(description='本地任务服务')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='任务执行进程数')
+    parser.add_argument('--worker', help='以任务执行进程方式运行，值为进程标识')
+    parser.add_argument('--parent_pid', type=int, help='任务服务进程号，退出后执行进程随之停止')
+    parser.add_argument('--queue_path', help='任务队列数据库路径')
+    args = parser.parse_args(argv)
+    if args.worker:
+        JobWorker(JobQueue(args.queue_path), args.worker).run(parent_pid=args.parent_pid)
+    else:
+        WorkerDaemon(workers=args.workers, queue_path=args.queue_path).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,16 @@
 import requests
-from typing import Dict, Any, List, Optional, Union
+from typing import Dict, Any, List, Optional, Tuple, Union
 from app.services.instances.base import BaseInstance, BaseGroup
 from app.models import RestaurantModel
 from app.utils.hash import hash_text
 from app.utils.logger import setup_logger
 from app.utils.file_io import rp
-from app.utils.query import robust_query
+from app.utils.query import robust_query, is_circuit_open
 from app.utils.conversion import convert_to_pinyin, translate_text
+from app.utils.type_cache import get_type_cache
+from app.utils.type_classifier import get_type_classifier
+from app.utils.poi_cache import get_poi_cache
+from app.utils.city_code import get_city_code_index
 import hashlib
 import time
 import uuid
@@ -21,6 +25,7 @@ from app.utils.oss import oss_get_json_file
 import pandas as pd
 import logging
 import re  # 添加正则表达式模块
+import concurrent.futures
 
 # 设置日志
 LOGGER = setup_logger("moco.log")
@@ -158,46 +163,81 @@ def query_gaode_poi(key, keywords, city_code, types="050000"):
         print(f"查询POI '{keywords}' 时发生错误: {str(e)}")
         return None
 
+def lookup_gaode_poi(keys: List[str], keywords: str, city_code: str, types: str = "050000",
+                     use_cache: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    带持久化缓存的高德POI查询（含"未找到"结果的缓存）
+    
+    :param keys: 高德地图API密钥列表
+    :param keywords: 搜索关键词
+    :param city_code: 城市代码
+    :param types: POI类型，默认为050000（餐饮服务）
+    :param use_cache: 是否使用持久化缓存
+    :return: API响应结果或None（查询失败）
+    """
+    poi_cache = get_poi_cache() if use_cache else None
+    if poi_cache is not None:
+        cached = poi_cache.get(keywords, city_code, types)
+        if cached is not None:
+            return cached
+    
+    def poi_query_func(key):
+        return query_gaode_poi(key, keywords, city_code, types)
+    
+    poi_result = robust_query(poi_query_func, keys, endpoint='gaode_poi', hedge=True,
+                              cache_key=(keywords, city_code, types))
+    # 仅缓存接口正常返回的结果，请求失败不缓存
+    if poi_cache is not None and poi_result is not None and not is_circuit_open('gaode_poi'):
+        poi_cache.put(keywords, city_code, types, poi_result)
+    return poi_result
+
 def get_city_code_from_excel(city_name, excel_path="app/config/citycode.xlsx"):
     """
-    从Excel文件中查询城市对应的citycode（支持模糊查询）
+    从citycode.xlsx的索引中查询城市对应的citycode（支持模糊查询）
     
     :param city_name: 城市名称
     :param excel_path: Excel文件路径
     :return: citycode或None
     """
     try:
-        df = pd.read_excel(excel_path)
-        
-        # 清理城市名称，去掉"市"字
-        clean_city_name = city_name.replace("市", "")
-        
-        # 首先尝试精确匹配
-        exact_match = df[df['中文名'] == city_name]
-        if not exact_match.empty and exact_match.iloc[0]['citycode'] != '\\N':
-            return exact_match.iloc[0]['citycode']
-        
-        # 尝试去掉"市"字的精确匹配
-        exact_match_clean = df[df['中文名'] == clean_city_name]
-        if not exact_match_clean.empty and exact_match_clean.iloc[0]['citycode'] != '\\N':
-            return exact_match_clean.iloc[0]['citycode']
-        
-        # 模糊匹配：包含城市名称
-        fuzzy_match = df[df['中文名'].str.contains(clean_city_name, na=False)]
-        if not fuzzy_match.empty:
-            # 过滤掉citycode为\N的记录
-            valid_matches = fuzzy_match[fuzzy_match['citycode'] != '\\N']
-            if not valid_matches.empty:
-                return valid_matches.iloc[0]['citycode']
-        
-        print(f"未找到城市 '{city_name}' 对应的citycode")
-        return None
+        city_code = get_city_code_index(excel_path).lookup(city_name)
+        if city_code is None:
+            print(f"未找到城市 '{city_name}' 对应的citycode")
+        return city_code
         
     except Exception as e:
         print(f"查询citycode时发生错误: {str(e)}")
         return None
 
 
+def extract_district_from_address(address: str) -> Optional[str]:
+    """
+    直接从地址文本中提取区域（区/县/县级市），无需调用API
+    
+    :param address: 餐厅中文地址
+    :return: 区域名称或None
+    """
+    if not address or not isinstance(address, str):
+        return None
+    
+    # 1. 匹配"XX区"模式
+    district_match = re.search(r'([^市县区]{1,10}区)', address)
+    if district_match:
+        return district_match.group(1)
+    
+    # 2. 如果没找到区，匹配"XX县"模式
+    county_match = re.search(r'([^市县区]{1,10}县)', address)
+    if county_match:
+        return county_match.group(1)
+    
+    # 3. 如果没找到区县，匹配"A市B市"模式（B市为县级市），取第二个市作为区域
+    city_match = re.search(r'([^市]{1,10}市)([^市]{1,10}市)', address)
+    if city_match:
+        return city_match.group(2)
+    
+    return None
+
+
 # ===========KIMI Utils==========
 
 def search_impl(arguments: Dict[str, Any]) -> Any:
@@ -301,6 +341,114 @@ def kimi_restaurant_type_analysis(rest_info: Dict[str, str], api_key: str = None
         return None
     
 
+def kimi_restaurant_type_batch_analysis(rest_infos: List[Dict[str, str]], candidate_types: List[str],
+                                        api_key: str = None) -> Optional[Dict[int, str]]:
+    """
+    使用KIMI在一次对话中批量分析多家餐厅的类型，要求返回结构化JSON
+    
+    :param rest_infos: 餐厅信息列表 [{'name': '餐厅名', 'address': '地址'}, ...]
+    :param candidate_types: 候选餐厅类型列表
+    :param api_key: KIMI API密钥
+    :return: {序号: 类型} 或 None
+    """
+    if not rest_infos or not api_key or not candidate_types:
+        return None
+    
+    try:
+        lines = [f"{i}. 名称：{info.get('name', '')}；地址：{info.get('address', '')}" for i, info in enumerate(rest_infos)]
+        prompt = """
+        请判断以下每家餐厅属于哪一种餐厅类型，类型必须从候选列表中原样选择一个：
+        {types}
+        
+        餐厅列表：
+        {restaurants}
+        
+        如果无法确定，请根据名字推理最可能的类型。请只返回JSON，格式为：
+        {{"results": [{{"id": 序号, "type": "候选类型"}}]}}
+        """.format(types="\n".join(candidate_types), restaurants="\n".join(lines))
+        
+        client = OpenAI(
+            api_key=api_key,
+            base_url="https://api.moonshot.cn/v1",
+        )
+        completion = client.chat.completions.create(
+            model="moonshot-v1-8k" if len(rest_infos) <= 30 else "moonshot-v1-32k",
+            messages=[
+                {"role": "system", "content": "你是一个专业的餐厅类型分析专家，请根据用户提供的餐厅名称和地址，分析其属于哪一种餐厅类型，并严格按要求输出JSON。"},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.1,
+            response_format={"type": "json_object"},
+        )
+        content = completion.choices[0].message.content
+        data = json.loads(content)
+        results = {}
+        for item in data.get('results', []):
+            try:
+                results[int(item['id'])] = str(item['type'])
+            except (KeyError, TypeError, ValueError):
+                continue
+        return results
+    except Exception as e:
+        print(f"KIMI批量餐厅类型分析异常: {str(e)}")
+        return None
+
+
+def batch_classify_restaurant_types(rest_infos: List[Dict[str, str]], candidate_types_merged: List[str], keys: List[str],
+                                    batch_size: int = 20, max_workers: int = 4, max_rounds: int = 3) -> Dict[int, str]:
+    """
+    分批调用KIMI批量分类，校验输出，只对失败的餐厅缩小批次重新查询
+    
+    :param rest_infos: 餐厅信息列表 [{'name': '餐厅名', 'address': '地址'}, ...]
+    :param candidate_types_merged: 配置中的候选类型列表（如"小食/小吃/美食"）
+    :param keys: KIMI API密钥列表
+    :param batch_size: 每次对话包含的餐厅数
+    :param max_workers: 并发对话数上限
+    :param max_rounds: 最多查询轮数（含首轮）
+    :return: {rest_infos下标: 候选类型}，始终未能分类的餐厅不在结果中
+    """
+    candidate_types = "/".join(candidate_types_merged).split("/")
+    
+    def validate(answer: str) -> Optional[str]:
+        answer = answer.strip()
+        if answer in candidate_types_merged:
+            return answer
+        for candidate_type in candidate_types:
+            if candidate_type and candidate_type in answer:
+                for candidate_type_lst in candidate_types_merged:
+                    if candidate_type in candidate_type_lst:
+                        return candidate_type_lst
+        return None
+    
+    def run_batch(indices: List[int]) -> Dict[int, str]:
+        items = [rest_infos[i] for i in indices]
+        def analyze_func(key):
+            return kimi_restaurant_type_batch_analysis(items, candidate_types_merged, key)
+        answers = robust_query(analyze_func, keys, endpoint='kimi_batch') or {}
+        out = {}
+        for local_id, answer in answers.items():
+            if 0 <= local_id < len(indices):
+                matched = validate(answer)
+                if matched:
+                    out[indices[local_id]] = matched
+        return out
+    
+    results = {}
+    pending = list(range(len(rest_infos)))
+    for round_idx in range(max_rounds):
+        if not pending:
+            break
+        size = max(1, batch_size >> round_idx)  # 重试时减小批次
+        batches = [pending[i:i + size] for i in range(0, len(pending), size)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+            for out in executor.map(run_batch, batches):
+                results.update(out)
+        pending = [i for i in pending if i not in results]
+        if pending:
+            LOGGER.warning(f"批量类型分析第 {round_idx+1} 轮后仍有 {len(pending)} 家餐厅未能分类")
+    return results
+    
+
 # ===========  解析地理信息 ==========
 
 def parse_geo_data(data: Union[str, Dict], level: str, filter_condition: Optional[Dict] = None) -> List[Dict[str, Any]]:
@@ -457,9 +605,11 @@ class Restaurant(BaseInstance):
         try:
             if not hasattr(self.conf.runtime, 'geoinfo'):
                 # self.logger.info(f"初始化地理位置信息...")
-                geoinfo = robust_query(query_gaode, self.conf.KEYS.gaode_keys, city=self.inst.rest_city)
+                geoinfo = robust_query(query_gaode, self.conf.KEYS.gaode_keys, endpoint='gaode_district', hedge=True, cache_key=self.inst.rest_city, city=self.inst.rest_city)
                 setattr(self.conf.runtime, 'geoinfo', {})
-                self.conf.runtime.geoinfo[self.inst.rest_city] = geoinfo
+                # 查询失败（或接口熔断中）时不缓存空结果，后续步骤会重新查询或使用默认值
+                if geoinfo is not None:
+                    self.conf.runtime.geoinfo[self.inst.rest_city] = geoinfo
         except Exception as e:
             # self.logger.error(f"初始化地理位置信息失败: {e}")
             self.conf.runtime.geoinfo = None
@@ -500,11 +650,15 @@ class Restaurant(BaseInstance):
                         return youdao_translate(chinese_name, 'zh', 'en', key)
                     
                     # 使用robust_query进行健壮性调用
-                    english_name = robust_query(translate_func, self.conf.KEYS.youdao_keys)
+                    english_name = robust_query(translate_func, self.conf.KEYS.youdao_keys, endpoint='youdao', hedge=True,
+                                                cache_key=chinese_name)
                     
                     if english_name:
                         self.inst.rest_english_name = english_name
                         # print(f"已为餐厅 '{chinese_name}' 使用有道翻译生成英文名: {english_name}")
+                    elif is_circuit_open('youdao'):
+                        # 接口熔断期间直接使用拼音，不再阻塞等待备用翻译接口
+                        self.inst.rest_english_name = convert_to_pinyin(chinese_name)
                     else:
                         # 翻译失败，使用默认值
                         # self.inst.rest_english_name = convert_to_pinyin(chinese_name)
@@ -542,11 +696,15 @@ class Restaurant(BaseInstance):
                         return youdao_translate(chinese_address, 'zh', 'en', key)
                     
                     # 使用robust_query进行健壮性调用
-                    english_address = robust_query(translate_func, self.conf.KEYS.youdao_keys)
+                    english_address = robust_query(translate_func, self.conf.KEYS.youdao_keys, endpoint='youdao', hedge=True,
+                                                   cache_key=chinese_address)
                     
                     if english_address:
                         self.inst.rest_english_address = english_address
                         # print(f"已为餐厅使用有道翻译生成英文地址: {english_address}")
+                    elif is_circuit_open('youdao'):
+                        # 接口熔断期间直接使用拼音，不再阻塞等待备用翻译接口
+                        self.inst.rest_english_address = convert_to_pinyin(chinese_address)
                     else:
                         # 翻译失败，使用默认值
                         # self.inst.rest_english_address = convert_to_pinyin(chinese_address)
@@ -591,7 +749,7 @@ class Restaurant(BaseInstance):
                 else:
                     # 调用高德地图API获取地理信息
                     # self.logger.info(f"调用高德地图API获取{city}的地理信息")
-                    geoinfo = robust_query(query_gaode, self.conf.KEYS.gaode_keys, city=city)
+                    geoinfo = robust_query(query_gaode, self.conf.KEYS.gaode_keys, endpoint='gaode_district', hedge=True, cache_key=city, city=city)
                     # 确保geoinfo不为None
                     if geoinfo is None:
                         # self.logger.error(f"无法获取城市 {city} 的地理信息")
@@ -660,7 +818,7 @@ class Restaurant(BaseInstance):
                 except: # 如果没有geoinfo则生成
                     # 调用高德地图API获取地理信息
                     # self.logger.info(f"调用高德地图API获取{city}的地理信息")
-                    geoinfo = robust_query(query_gaode, self.conf.KEYS.gaode_keys, city=city)
+                    geoinfo = robust_query(query_gaode, self.conf.KEYS.gaode_keys, endpoint='gaode_district', hedge=True, cache_key=city, city=city)
                     # 确保geoinfo不为None
                     if geoinfo is None:
                         # self.logger.error(f"无法获取城市 {city} 的地理信息")
@@ -742,7 +900,7 @@ class Restaurant(BaseInstance):
         else:
             # 调用高德地图API获取地理信息
             # self.logger.info(f"调用高德地图API获取{city}的地理信息")
-            geoinfo = robust_query(query_gaode, self.conf.KEYS.gaode_keys, city=city)
+            geoinfo = robust_query(query_gaode, self.conf.KEYS.gaode_keys, endpoint='gaode_district', hedge=True, cache_key=city, city=city)
             # 确保geoinfo不为None
             # if geoinfo is None:
             #     # self.logger.error(f"无法获取城市 {city} 的地理信息")
@@ -770,31 +928,7 @@ class Restaurant(BaseInstance):
             if not hasattr(self.inst, 'rest_district') or not self.inst.rest_district or pd.isna(self.inst.rest_district):
                 
                 # 优先尝试从地址中直接提取区域信息
-                extracted_district = None
-                
-                # 1. 匹配"XX区"模式
-                district_pattern = r'([^市县区]{1,10}区)'
-                district_match = re.search(district_pattern, address)
-                if district_match:
-                    extracted_district = district_match.group(1)
-                    LOGGER.info(f"从地址中直接提取到区域(区): {extracted_district}")
-                
-                # 2. 如果没找到区，匹配"XX县"模式
-                if not extracted_district:
-                    county_pattern = r'([^市县区]{1,10}县)'
-                    county_match = re.search(county_pattern, address)
-                    if county_match:
-                        extracted_district = county_match.group(1)
-                        LOGGER.info(f"从地址中直接提取到区域(县): {extracted_district}")
-                
-                # 3. 如果没找到区县，匹配"A市B市"模式（B市为县级市）
-                if not extracted_district:
-                    city_pattern = r'([^市]{1,10}市)([^市]{1,10}市)'
-                    city_match = re.search(city_pattern, address)
-                    if city_match:
-                        # 取第二个市作为区域（县级市）
-                        extracted_district = city_match.group(2)
-                        LOGGER.info(f"从地址中直接提取到区域(县级市): {extracted_district}")
+                extracted_district = extract_district_from_address(address)
                 
                 # 如果成功从地址中提取到区域，直接使用
                 if extracted_district:
@@ -810,11 +944,9 @@ class Restaurant(BaseInstance):
                         self.inst.rest_district = "未知区"  # 设置默认区域
                         result = False
                     else:
-                        # 2. 使用POI搜索API查询餐厅信息
-                        def poi_query_func(key):
-                            return query_gaode_poi(key, self.inst.rest_chinese_address, city_code, "050000")
-                        
-                        poi_result = robust_query(poi_query_func, self.conf.KEYS.gaode_keys)
+                        # 2. 使用POI搜索API查询餐厅信息（优先读取持久化缓存）
+                        poi_result = lookup_gaode_poi(self.conf.KEYS.gaode_keys, self.inst.rest_chinese_address, city_code,
+                                                      "050000", use_cache=getattr(self.conf.runtime, 'POI_CACHE', True))
 
                         if poi_result and poi_result.get('pois') and len(poi_result['pois']) > 0:
                             # 3. 从第一个POI结果中提取adname作为区域
@@ -828,6 +960,10 @@ class Restaurant(BaseInstance):
                                 # self.logger.warning(f"POI搜索结果中没有adname字段")
                                 self.inst.rest_district = "未知区"  # 设置默认区域
                                 result = False
+                        elif is_circuit_open('gaode_poi'):
+                            # POI接口熔断中，快速回退到默认区域
+                            self.inst.rest_district = city + "区"
+                            result = False
                         else:
                             # self.logger.warning(f"POI搜索未找到餐厅 {self.inst.rest_chinese_name} 的信息")
                             self.inst.rest_district = "未知区"  # 设置默认区域
@@ -850,26 +986,11 @@ class Restaurant(BaseInstance):
             
             if not hasattr(self.inst, 'rest_street') or pd.isna(self.inst.rest_street) or not self.inst.rest_street:  # 如果没有，则生成
                
-                try:
-                    geoinfo = self.conf.runtime.geoinfo[city]
-                except: # 如果没有geoinfo则生成
-                    # 调用高德地图API获取地理信息
-                    # self.logger.info(f"调用高德地图API获取{city}的地理信息")
-                    geoinfo = robust_query(query_gaode, self.conf.KEYS.gaode_keys, city=city)
-                    # 确保geoinfo不为None
-                    if geoinfo is None:
-                        # self.logger.error(f"无法获取城市 {city} 的地理信息")
-                        self.inst.rest_street = "未知街道"  # 设置默认街道
-                        result = False
-                        return result
-                    # 确保runtime存在
-                    if not hasattr(self.conf, 'runtime'):
-                        setattr(self.conf, 'runtime', type('RuntimeConfig', (), {}))
-                    # 确保geoinfo存在
-                    if not hasattr(self.conf.runtime, 'geoinfo'):
-                        setattr(self.conf.runtime, 'geoinfo', {})
-                    self.conf.runtime.geoinfo[city] = geoinfo  # 将获取到的地理信息保存到self.conf.runtime.geoinfo中
-                    # self.logger.info(f"已将{city}的地理信息保存到self.conf.runtime.geoinfo中")
+                if geoinfo is None:
+                    # 函数开头已查询过城市地理信息，查询失败（含接口熔断）时直接使用默认街道，不再重复请求
+                    self.inst.rest_street = "未知街道"
+                    result = False
+                    return result
                 
                 if target_district:
                     cand_street = get_geo_data_by_level(geoinfo, 'street', {'name': target_district, 'level': 'district'})
@@ -919,6 +1040,51 @@ class Restaurant(BaseInstance):
         
         return result
     
+    def _type_cache(self, candidate_types_merged: List[str]):
+        """
+        获取类型缓存（运行时配置TYPE_CACHE为False时返回None）
+        
+        :param candidate_types_merged: 配置中的候选类型列表，变化时缓存失效
+        :return: RestaurantTypeCache或None
+        """
+        if not getattr(self.conf.runtime, 'TYPE_CACHE', True):
+            return None
+        type_cache = get_type_cache()
+        type_cache.ensure_candidates(candidate_types_merged)
+        return type_cache
+    
+    def _classify_type_locally(self, candidate_types_merged: List[str]) -> Tuple[Optional[str], float, str]:
+        """
+        使用本地分类器推断餐厅类型（名称关键词、类型缓存、高德POI类别、学习词典）
+        
+        :param candidate_types_merged: 配置中的候选类型列表（如"小食/小吃/美食"）
+        :return: (餐厅类型或None, 置信度, 来源)
+        """
+        classifier = get_type_classifier(candidate_types_merged, self._type_cache(candidate_types_merged))
+        return classifier.classify(self.inst.rest_chinese_name,
+                                   getattr(self.inst, 'rest_type_gaode', '') or '',
+                                   getattr(self.inst, 'rest_chinese_address', None))
+    
+    def _resolve_type_locally(self, candidate_types_merged: List[str], candidate_types: List[str]) -> Tuple[Optional[str], bool]:
+        """
+        不调用大模型推断餐厅类型，置信度达到运行时配置TYPE_CONFIDENCE_THRESHOLD（默认0.6）时视为已确定；
+        只有名称直接包含候选类型关键词的结果写入类型缓存，其余推断结果不持久化
+        
+        :param candidate_types_merged: 配置中的候选类型列表（如"小食/小吃/美食"）
+        :param candidate_types: 拆分后的候选类型列表
+        :return: (本地推断的餐厅类型或None, 是否达到置信度阈值)
+        """
+        threshold = getattr(self.conf.runtime, 'TYPE_CONFIDENCE_THRESHOLD', 0.6)
+        rest_type, confidence, provenance = self._classify_type_locally(candidate_types_merged)
+        if not rest_type or confidence < threshold:
+            return rest_type, False
+        if provenance == 'keyword':
+            type_cache = self._type_cache(candidate_types_merged)
+            if type_cache is not None:
+                type_cache.put(self.inst.rest_chinese_name, rest_type, confidence, provenance,
+                               address=getattr(self.inst, 'rest_chinese_address', None))
+        return rest_type, True
+    
     def _generate_type(self) -> bool:
         """
         使用KIMI分析餐厅类型
@@ -933,12 +1099,14 @@ class Restaurant(BaseInstance):
                     candidate_types_merged = list(self.conf.BUSINESS.RESTAURANT.收油关系映射._config_dict.keys())
                     candidate_types = "/".join(list(self.conf.BUSINESS.RESTAURANT.收油关系映射._config_dict.keys())).split("/")
                     
-                    # 尝试通过餐厅名称中包含的关键词匹配类型
-                    for candidate_type in candidate_types:
-                        if candidate_type in self.inst.rest_chinese_name:
-                            self.inst.rest_type = candidate_type
-                            # self.logger.info(f"已直接通过餐厅名为餐厅 '{self.inst.rest_chinese_name}' 推断类型: {self.inst.rest_type}")
-                            return True
+                    # 先使用本地分类器推断类型，置信度足够时不调用大模型
+                    local_type, confident = self._resolve_type_locally(candidate_types_merged, candidate_types)
+                    if confident:
+                        self.inst.rest_type = local_type
+                        return True
+                    type_cache = self._type_cache(candidate_types_merged)
+                    # 大模型不可用或分析失败时，使用本地低置信度结果，仍无结果则使用默认类型
+                    fallback_type = local_type or "小食/小吃/美食/饮食/私房菜"
                     
                     if hasattr(self.conf, 'runtime') and hasattr(self.conf.runtime, 'USE_LLM') and self.conf.runtime.USE_LLM:
                         # 如果通过名称未能推断类型，尝试使用KIMI API
@@ -956,7 +1124,7 @@ class Restaurant(BaseInstance):
                                 return kimi_restaurant_type_analysis(rest_info, key)
                             
                             # 使用robust_query进行健壮性调用
-                            rest_type_ans = robust_query(analyze_func, self.conf.KEYS.kimi_keys)
+                            rest_type_ans = robust_query(analyze_func, self.conf.KEYS.kimi_keys, endpoint='kimi')
                             
                             if rest_type_ans:
                                 # 从KIMI的回答中找出最匹配的类型
@@ -970,22 +1138,27 @@ class Restaurant(BaseInstance):
                                     for candidate_type_lst in candidate_types_merged:
                                         if matched_type in candidate_type_lst:
                                             self.inst.rest_type = candidate_type_lst
+                                            if type_cache is not None:
+                                                type_cache.put(self.inst.rest_chinese_name, candidate_type_lst, 0.8, 'kimi',
+                                                               address=rest_info['address'])
+                                                get_type_classifier(candidate_types_merged, type_cache).learn(
+                                                    self.inst.rest_chinese_name, candidate_type_lst)
                                             # self.logger.info(f"已通过LLM为餐厅 '{self.inst.rest_chinese_name}' 分析类型: {matched_type}")
                                             return True
                                 else:  # 如果没有匹配的类型，使用默认类型
-                                    self.inst.rest_type = "小食/小吃/美食/饮食/私房菜"
+                                    self.inst.rest_type = fallback_type
                                     # self.logger.warning(f"无法确定餐厅类型，使用默认餐厅类型: {self.inst.rest_type}")
                                     return False
                             else:  # 如果KIMI分析失败，使用默认类型
-                                self.inst.rest_type = "小食/小吃/美食/饮食/私房菜"
+                                self.inst.rest_type = fallback_type
                                 # self.logger.warning(f"无法确定餐厅类型，使用默认餐厅类型: {self.inst.rest_type}")
                                 return False
                         else:  # 如果没有KIMI Keys 则使用默认类型
-                            self.inst.rest_type = "小食/小吃/美食/饮食/私房菜"
+                            self.inst.rest_type = fallback_type
                             # self.logger.warning(f"无法确定餐厅类型，使用默认餐厅类型: {self.inst.rest_type}")
                             return False
                     else:
-                        self.inst.rest_type = "小食/小吃/美食/饮食/私房菜"
+                        self.inst.rest_type = fallback_type
                         # self.logger.warning(f"无法确定餐厅类型，使用默认餐厅类型: {self.inst.rest_type}")
                         return False
                 else:  # 如果不存在收油关系映射或者配置不全
@@ -1316,6 +1489,62 @@ class RestaurantsGroup(BaseGroup):
         """
         return f"RestaurantsGroup(数量={self.count()}, 类型={self.group_type})" 
     
+    def generate_types_batch(self, batch_size: int = 20, max_workers: int = 4) -> int:
+        """
+        批量生成组内所有缺失的餐厅类型：先本地推断，剩余的多家餐厅合并为一次KIMI对话分析
+        
+        :param batch_size: 每次对话包含的餐厅数
+        :param max_workers: 并发对话数上限
+        :return: 通过大模型分类的餐厅数量
+        """
+        pending = [r for r in self.members
+                   if not hasattr(r.inst, 'rest_type') or pd.isna(r.inst.rest_type) or not r.inst.rest_type]
+        if not pending:
+            return 0
+        
+        conf = pending[0].conf
+        default_type = "小食/小吃/美食/饮食/私房菜"
+        if not (hasattr(conf, 'BUSINESS') and hasattr(conf.BUSINESS, 'RESTAURANT') and hasattr(conf.BUSINESS.RESTAURANT, '收油关系映射')):
+            for r in pending:
+                r.inst.rest_type = default_type
+            return 0
+        candidate_types_merged = list(conf.BUSINESS.RESTAURANT.收油关系映射._config_dict.keys())
+        candidate_types = "/".join(candidate_types_merged).split("/")
+        
+        # 先使用本地分类器推断类型，置信度足够时不调用大模型
+        unresolved = []
+        local_types = {}  # 未确定的餐厅 -> 本地低置信度结果
+        for r in pending:
+            local_type, confident = r._resolve_type_locally(candidate_types_merged, candidate_types)
+            if confident:
+                r.inst.rest_type = local_type
+            else:
+                local_types[id(r)] = local_type
+                unresolved.append(r)
+        
+        classified = 0
+        use_llm = getattr(conf.runtime, 'USE_LLM', False)
+        if unresolved and use_llm and hasattr(conf, 'KEYS') and hasattr(conf.KEYS, 'kimi_keys'):
+            rest_infos = [{'name': r.inst.rest_chinese_name, 'address': getattr(r.inst, 'rest_chinese_address', '')}
+                          for r in unresolved]
+            results = batch_classify_restaurant_types(rest_infos, candidate_types_merged, conf.KEYS.kimi_keys,
+                                                      batch_size=batch_size, max_workers=max_workers)
+            type_cache = unresolved[0]._type_cache(candidate_types_merged)
+            for idx, rest_type in results.items():
+                unresolved[idx].inst.rest_type = rest_type
+                if type_cache is not None:
+                    type_cache.put(unresolved[idx].inst.rest_chinese_name, rest_type, 0.7, 'kimi_batch',
+                                   address=rest_infos[idx]['address'])
+                    get_type_classifier(candidate_types_merged, type_cache).learn(
+                        unresolved[idx].inst.rest_chinese_name, rest_type)
+            classified = len(results)
+        
+        # 仍未分类的使用本地低置信度结果，仍无结果则使用默认类型
+        for r in unresolved:
+            if not getattr(r.inst, 'rest_type', None):
+                r.inst.rest_type = local_types[id(r)] or default_type
+        return classified
+    
     def update_restaurant_info(self, restaurant_id: str, update_dict: Dict[str, Any]) -> bool:
         """
         更新指定餐厅的信息
@@ -9,13 +9,17 @@
 python complete_restaurants_info.py --input_file=xxx.xlsx --output_dir=/tmp/ --cp_location=xxx,xxx
 
 参数说明：
---input_file: 输入的Excel文件路径
+--input_file: 输入文件路径，支持Excel/CSV以及主程序传递的 .feather / .pkl 二进制文件
 --output_dir: 输出目录
 --cp_location: CP的经纬度坐标，格式为"经度,纬度"
 --task_id: 任务ID，用于标识当前任务，主程序通过该ID监控任务状态
 --num_workers: 工作线程数，默认为2
 --batch_size: 批次大小，默认为20
 --log_file: 日志文件路径，默认为output_dir中的log_{task_id}.txt
+--progress_port: 主程序进度通道的本地端口，提供时通过该端口实时推送进度和每条记录的结果
+
+对同一输入数据（及CP位置）重新运行时，从 var/cache/journals 中按内容指纹命名的记录日志恢复，
+已完成的记录不会重复处理；任务成功完成后删除该日志
 """
 
 import os
@@ -30,6 +34,7 @@ import traceback
 import logging
 import uuid
 import shutil
+import hashlib
 from datetime import datetime
 from pathlib import Path
 
@@ -42,6 +47,9 @@ try:
     from app.services.instances.restaurant import Restaurant, RestaurantsGroup
     from app.services.functions.get_restaurant_service import GetRestaurantService
     from app.utils.logger import setup_logger, get_batch_logger, write_batch_completion_file, count_completed_batches
+    from app.utils.record_journal import RecordJournal, JournalLockedError
+    from app.utils.progress_channel import ProgressChannel
+    from app.utils.file_io import FRAME_SUFFIXES, write_frame, RecordBatchReader, rp
 except ImportError as e:
     print(f"导入模块失败: {e}")
     sys.exit(1)
@@ -50,7 +58,7 @@ class RestaurantCompleter:
     """餐厅信息补全器"""
     
     def __init__(self, input_file, output_dir, cp_location=None, task_id=None, 
-                 num_workers=2, batch_size=20, log_file=None):
+                 num_workers=2, batch_size=20, log_file=None, progress_port=None, cancel_event=None):
         """
         初始化补全器
         
@@ -62,9 +70,12 @@ class RestaurantCompleter:
             num_workers: 工作线程数
             batch_size: 批次大小
             log_file: 日志文件路径
+            progress_port: 主程序进度通道端口
+            cancel_event: 取消标志，设置后在下一批次开始前停止（已完成的记录保留在记录日志中）
         """
         self.input_file = input_file
         self.output_dir = output_dir
+        self.cancel_event = cancel_event
         self.cp_location = cp_location
         
         # 确保每次运行都创建新的任务ID
@@ -83,10 +94,19 @@ class RestaurantCompleter:
         self.task_result_file = os.path.join(self.task_dir, f"result_{self.task_id}.xlsx")
         self.result_file = os.path.join(self.output_dir, f"result_{self.task_id}【最终文件，请下载】.xlsx")
         
+        # 逐条记录日志，用于断点续跑（按输入行号记录已完成的餐厅）。
+        # 日志以输入文件内容和CP位置的指纹命名，主程序每次运行生成新的task_id，
+        # 对同一份数据重新运行时仍能找到上次的日志；
+        # 日志在任务运行期间加锁，同一数据的另一个任务正在运行时改用任务目录下的私有日志
+        self.journal_file = rp(f"{self._input_fingerprint()}.jsonl", folder=["var", "cache", "journals"])
+        
         # 设置日志文件
         self.log_file = log_file or os.path.join(self.output_dir, f"log_{self.task_id}.txt")
         self._setup_logger()
         
+        # 进度通道（未提供端口或连接失败时只写状态文件）
+        self.channel = ProgressChannel(progress_port)
+        
         # 初始化状态
         self.status = {
             "task_id": self.task_id,
@@ -156,6 +176,30 @@ class RestaurantCompleter:
         """更新状态"""
         self.status.update(kwargs)
         self._save_status()
+        self.channel.send("status", **self.status)
+    
+    def _input_fingerprint(self):
+        """输入文件内容与CP位置的SHA1指纹（输入文件不可读时退回task_id）"""
+        digest = hashlib.sha1(str(self.cp_location).encode('utf-8'))
+        try:
+            with open(self.input_file, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+        except OSError:
+            return self.task_id
+        return digest.hexdigest()
+    
+    def _record_completed(self, journal, rows):
+        """
+        返回单个餐厅处理结束时的回调：写入记录日志并推送到进度通道
+        
+        补全失败（状态未就绪）的餐厅以失败记录写入，保留在结果中，重新运行时会再次补全
+        """
+        def callback(idx, restaurant):
+            record = restaurant.to_dict()
+            journal.append(rows[idx], record, done=restaurant.get_status() == 'ready')
+            self.channel.send("record", row=rows[idx], record=record)
+        return callback
     
     def _log_progress(self, message, progress=None):
         """记录进度"""
@@ -177,6 +221,13 @@ class RestaurantCompleter:
             self.logger.info(f"{message}到主目录: {self.result_file}")
             df.to_excel(self.result_file, index=False)
             
+            # 同时写出二进制结果，供主程序直接加载
+            try:
+                result_frame_file = write_frame(df, os.path.join(self.task_dir, f"result_{self.task_id}"))
+                self._update_status(result_frame_file=result_frame_file)
+            except Exception as e:
+                self.logger.warning(f"写出二进制结果失败: {e}")
+            
             # 验证文件是否存在
             if os.path.exists(self.result_file):
                 self.logger.info(f"已确认主目录结果文件存在: {self.result_file}")
@@ -250,6 +301,9 @@ class RestaurantCompleter:
             # 2. 分批处理数据
             result = self._process_data(restaurant_data, self.logger)
             
+            if self.status.get("status") == "cancelled":
+                return False
+            
             if result:
                 self._update_status(
                     status="completed", 
@@ -284,25 +338,25 @@ class RestaurantCompleter:
             return False
     
     def _load_data(self):
-        """加载数据"""
+        """打开数据文件，返回按批次流式读取记录的读取器（不将整个文件载入内存）"""
         try:
             self.logger.info(f"开始加载文件: {self.input_file}")
             self._flush_log()
-            if self.input_file.endswith(('.xlsx', '.xls')):
+            if self.input_file.endswith(FRAME_SUFFIXES):
+                self.logger.info("检测到二进制数据文件格式")
+            elif self.input_file.endswith(('.xlsx', '.xls')):
                 self.logger.info("检测到Excel文件格式")
-                self._flush_log()
-                restaurant_data = pd.read_excel(self.input_file)
             elif self.input_file.endswith('.csv'):
                 self.logger.info("检测到CSV文件格式")
-                self._flush_log()
-                restaurant_data = pd.read_csv(self.input_file)
             else:
                 self.logger.error(f"不支持的文件类型: {self.input_file}")
                 self._flush_log()
                 return None
+            self._flush_log()
+            restaurant_data = RecordBatchReader(self.input_file)
             
             self.logger.info(f"成功加载数据，共 {len(restaurant_data)} 条记录")
-            self.logger.debug(f"数据列: {list(restaurant_data.columns)}")
+            self.logger.debug(f"数据列: {restaurant_data.columns()}")
             self._flush_log()
             return restaurant_data
         except Exception as e:
@@ -311,8 +365,18 @@ class RestaurantCompleter:
             self._flush_log()
             return None
     
+    def _open_journal(self, group_size):
+        """打开记录日志；共享日志被其他任务占用时使用本任务私有的日志"""
+        try:
+            return RecordJournal(self.journal_file, group_size=group_size)
+        except JournalLockedError:
+            self.logger.warning(f"记录日志正被同一数据的其他任务使用，本任务不续跑: {self.journal_file}")
+            self.journal_file = os.path.join(self.task_dir, "journal.jsonl")
+            return RecordJournal(self.journal_file, group_size=group_size)
+
     def _process_data(self, restaurant_data, logger):
         """处理数据"""
+        journal = None
         try:
             total_restaurants = len(restaurant_data)
             batch_size = self.batch_size
@@ -324,12 +388,11 @@ class RestaurantCompleter:
             self.logger.info(f"处理配置: 批次大小={batch_size}, 工作线程数={num_workers}")
             self._flush_log()
             
-            # 批次索引列表
-            batch_indices = list(range(0, total_restaurants, batch_size))
-            
-            # 所有处理后的记录
-            all_processed_records = []
-            completed_count = 0
+            # 已完成的记录逐条追加到日志，重新运行时跳过已完成的行
+            journal = self._open_journal(max(1, min(batch_size, 50)))
+            completed_count = len(journal)
+            if completed_count:
+                self._log_progress(f"从记录日志恢复，已完成 {completed_count}/{total_restaurants} 条记录")
             
             # 创建服务实例
             self.logger.info("创建GetRestaurantService服务实例")
@@ -339,12 +402,22 @@ class RestaurantCompleter:
             # 记录处理开始时间
             process_start_time = time.time()
             
-            # 逐批处理
-            for batch_idx, start_idx in enumerate(batch_indices):
+            # 逐批流式读取并处理
+            for batch_idx, (start_idx, batch_records) in enumerate(restaurant_data.iter_batches(batch_size)):
+                if self.cancel_event is not None and self.cancel_event.is_set():
+                    self.logger.info(f"任务已取消，已完成 {completed_count}/{total_restaurants} 条记录")
+                    self._flush_log()
+                    self._update_status(
+                        status="cancelled",
+                        message=f"任务已取消，已完成 {completed_count}/{total_restaurants} 条记录",
+                        end_time=datetime.now().isoformat()
+                    )
+                    return False
+                
                 batch_start_time = time.time()
                 
                 # 计算批次范围
-                end_idx = min(start_idx + batch_size, total_restaurants)
+                end_idx = start_idx + len(batch_records)
                 
                 # 更新进度
                 progress = int((batch_idx / total_batches) * 100)
@@ -358,19 +431,24 @@ class RestaurantCompleter:
                     # 提取批次数据
                     self.logger.debug(f"提取批次数据 {start_idx+1}-{end_idx}")
                     self._flush_log()
-                    batch_data = restaurant_data.iloc[start_idx:end_idx].copy()
+                    # 只处理记录日志中尚未完成（未处理或上次失败）的行
+                    row_keys = [row for row in range(start_idx, end_idx) if row not in journal]
+                    batch_id = f"{batch_idx+1}"
+                    if not row_keys:
+                        self.logger.info(f"批次 {batch_id} 已在之前的运行中完成，跳过")
+                        self._flush_log()
+                        continue
+                    batch_records = [batch_records[row - start_idx] for row in row_keys]
                     
                     # 获取批次专用日志
-                    batch_id = f"{batch_idx+1}"
                     batch_logger = get_batch_logger(batch_id, self.task_dir)
                     batch_logger.info(f"开始处理批次 {batch_idx+1}/{total_batches} ({start_idx+1}-{end_idx})")
                     
-                    # 转换为记录
-                    batch_records = batch_data.to_dict('records')
-                    batch_logger.debug(f"批次数据转换为记录，数量: {len(batch_records)}")
+                    batch_logger.debug(f"批次记录数量: {len(batch_records)}")
                     
                     # 创建餐厅实例
                     restaurant_instances = []
+                    instance_rows = []  # 与restaurant_instances一一对应的输入行号
                     success_count = 0
                     batch_logger.info(f"开始创建餐厅实例...")
                     
@@ -378,6 +456,7 @@ class RestaurantCompleter:
                         try:
                             restaurant = Restaurant(restaurant_info, cp_location=self.cp_location, logger=batch_logger)
                             restaurant_instances.append(restaurant)
+                            instance_rows.append(row_keys[idx])
                             success_count += 1
                             # 每创建5个实例更新一次进度
                             # if idx % 5 == 4 or idx == len(batch_records) - 1:
@@ -389,7 +468,6 @@ class RestaurantCompleter:
                     batch_logger.info(f"成功创建 {success_count}/{len(batch_records)} 个餐厅实例")
                     
                     # 释放批次数据
-                    batch_data = None
                     batch_records = None
                     gc.collect()
                     
@@ -412,7 +490,9 @@ class RestaurantCompleter:
                                 restaurant_group, 
                                 num_workers=num_workers,  # PROD
                                 # num_workers=1,  # DEBUG
-                                logger_file=os.path.join(self.task_dir, f"batch_{batch_id}.log")  # 传递批处理日志文件路径
+                                logger_file=os.path.join(self.task_dir, f"batch_{batch_id}.log"),  # 传递批处理日志文件路径
+                                # 每个餐厅处理完立即写入记录日志
+                                on_complete=self._record_completed(journal, instance_rows)
                             )
                             
                             batch_logger.info(f"补全信息完成")
@@ -423,17 +503,19 @@ class RestaurantCompleter:
                         
                         restaurant_group = None
                         
-                        # 提取结果
-                        batch_processed_records = []
+                        # 补齐回调未写入记录日志的餐厅（如补全整体失败时的原始数据，按失败记录写入）
                         batch_completed = 0
                         batch_logger.info(f"开始提取处理结果...")
                         
                         for idx, restaurant in enumerate(processed_group.members):
-                            if hasattr(restaurant, 'inst') and restaurant.inst:
+                            if idx < len(instance_rows) and instance_rows[idx] in journal:
+                                batch_completed += 1
+                                continue
+                            if hasattr(restaurant, 'inst') and restaurant.inst and idx < len(instance_rows):
                                 try:
-                                    restaurant_dict = restaurant.to_dict()
-                                    batch_processed_records.append(restaurant_dict)
-                                    batch_completed += 1
+                                    self._record_completed(journal, instance_rows)(idx, restaurant)
+                                    if instance_rows[idx] in journal:
+                                        batch_completed += 1
                                     
                                     # 每处理5个餐厅记录一次日志
                                     if idx % 5 == 4 or idx == len(processed_group.members) - 1:
@@ -441,13 +523,13 @@ class RestaurantCompleter:
                                 except Exception as e:
                                     batch_logger.error(f"提取餐厅数据失败: {e}")
                         
+                        # 批次结束时将记录日志落盘
+                        journal.flush()
+                        
                         # 更新计数
-                        completed_count += batch_completed
+                        completed_count = len(journal)
                         batch_logger.info(f"本批次成功处理 {batch_completed} 条记录")
                         
-                        # 添加到总结果
-                        all_processed_records.extend(batch_processed_records)
-                        
                         # 写入批次完成标记文件
                         completion_file = write_batch_completion_file(batch_id, self.task_dir)
                         batch_logger.info(f"已创建批次完成标记文件: {completion_file}")
@@ -459,24 +541,9 @@ class RestaurantCompleter:
                         )
                         
                         # 释放资源
-                        batch_processed_records = None
                         processed_group = None
                         gc.collect()
                         
-                        # 每个批次都保存中间结果，增加实时性
-                        # 保存中间结果
-                        batch_logger.info(f"保存中间结果...")
-                        
-                        if all_processed_records:
-                            try:
-                                interim_df = pd.DataFrame(all_processed_records)
-                                # 将结果保存到两个位置
-                                self._save_to_both_locations(interim_df, "保存中间结果")
-                                interim_df = None
-                            except Exception as e:
-                                batch_logger.error(f"保存中间结果失败: {e}")
-                                batch_logger.exception("详细错误信息:")
-                        
                         # 更新状态
                         completed_batches = count_completed_batches(self.task_dir)
                         progress_percentage = int((completed_batches / total_batches) * 100)
@@ -524,7 +591,11 @@ class RestaurantCompleter:
             self.logger.info(f"所有批次处理完成，总耗时: {total_process_time:.2f}秒 (约 {total_process_time/60:.2f}分钟)")
             self._flush_log()
             
-            # 所有批次处理完毕，创建最终结果
+            # 所有批次处理完毕，按输入顺序从记录日志生成最终结果
+            # （完整遍历后记录数为精确值，可能与开始时的估计不同）
+            total_restaurants = len(restaurant_data)
+            all_processed_records = journal.records(list(range(total_restaurants)))
+            completed_count = len(journal)
             if all_processed_records:
                 try:
                     # 创建最终DataFrame
@@ -535,6 +606,14 @@ class RestaurantCompleter:
                     # 保存最终结果到两个位置
                     success = self._save_to_both_locations(result_df, "保存最终结果")
                     
+                    # 全部记录都已完成并保存后删除记录日志，之后对同一数据的运行重新补全；
+                    # 仍有未完成或失败的记录时保留日志，重新运行只补全剩余部分
+                    if success and completed_count == total_restaurants:
+                        try:
+                            journal.discard()
+                        except OSError as e:
+                            self.logger.warning(f"删除记录日志失败: {e}")
+                    
                     # 更新状态
                     self._update_status(
                         completed=completed_count,
@@ -571,6 +650,9 @@ class RestaurantCompleter:
                 error=str(e)
             )
             return False
+        finally:
+            if journal is not None:
+                journal.close()
 
     def check_complete_status(self):
         """检查补全任务状态"""
@@ -752,7 +834,7 @@ class RestaurantCompleter:
             if hasattr(self, 'progress_label'):
                 self.progress_label.setVisible(False)
 
-def parse_args():
+def parse_args(argv=None):
     """解析命令行参数"""
     parser = argparse.ArgumentParser(description='餐厅信息补全脚本')
     parser.add_argument('--input_file', required=True, help='输入文件路径')
@@ -763,12 +845,19 @@ def parse_args():
     parser.add_argument('--batch_size', default=20, type=int, help='批次大小')
     parser.add_argument('--log_file', help='日志文件路径')
     parser.add_argument('--config_file', help='运行时配置文件路径，JSON格式')
-    return parser.parse_args()
+    parser.add_argument('--progress_port', type=int, help='主程序进度通道端口')
+    return parser.parse_args(argv)
 
-def main():
-    """主函数"""
+def main(argv=None, cancel_event=None):
+    """
+    主函数
+    
+    Args:
+        argv: 命令行参数，默认读取sys.argv（常驻任务进程调用时传入）
+        cancel_event: 取消标志
+    """
     # 解析命令行参数
-    args = parse_args()
+    args = parse_args(argv)
     
     # 如果提供了配置文件，加载运行时配置
     if args.config_file:
@@ -800,11 +889,16 @@ def main():
         task_id=args.task_id,
         num_workers=args.num_workers,
         batch_size=args.batch_size,
-        log_file=args.log_file
+        log_file=args.log_file,
+        progress_port=args.progress_port,
+        cancel_event=cancel_event
     )
     
     # 执行处理
-    success = completer.run()
+    try:
+        success = completer.run()
+    finally:
+        completer.channel.close()
     
     # 返回结果
     return 0 if success else 1
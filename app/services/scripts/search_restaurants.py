@@ -10,7 +10,10 @@ import sys
 import argparse
 import json
 import tempfile
+import math
 import datetime
+import threading
+import concurrent.futures
 import pandas as pd
 from pathlib import Path
 
@@ -22,6 +25,7 @@ from app.services.instances.restaurant import RestaurantModel, Restaurant, Resta
 from app.services.functions.get_restaurant_service import GetRestaurantService
 from app.config.config import CONF
 from app.utils.logger import get_logger
+from app.utils.file_io import RecordBatchReader
 
 # 获取日志对象
 LOGGER = get_logger()
@@ -48,7 +52,7 @@ def load_runtime_config(config_file):
     return False
 
 
-def search_restaurants(city, cp_id, use_llm=True, output_dir=None, keyword=None):
+def search_restaurants(city, cp_id, use_llm=True, output_dir=None, keyword=None, benchmark_path=None):
     """
     搜索餐厅信息
     
@@ -58,6 +62,7 @@ def search_restaurants(city, cp_id, use_llm=True, output_dir=None, keyword=None)
         use_llm: 是否使用大模型
         output_dir: 输出目录
         keyword: 搜索关键词（可选）
+        benchmark_path: 已有餐厅数据文件（可选），运行时配置INCREMENTAL_SEARCH开启时只返回新餐厅和有变化的餐厅
     
     Returns:
         result_file: 结果文件路径
@@ -65,8 +70,14 @@ def search_restaurants(city, cp_id, use_llm=True, output_dir=None, keyword=None)
     try:
         LOGGER.info(f"开始搜索餐厅 - 城市: {city}, CP: {cp_id}, 关键词: {keyword}")
         
+        # 增量搜索由运行时配置决定，开启时才需要已有餐厅数据作为基准
+        incremental = bool(getattr(CONF.runtime, 'INCREMENTAL_SEARCH', False))
+        if incremental and not benchmark_path:
+            LOGGER.warning("已开启增量搜索，但未提供已有餐厅数据文件，执行完整搜索")
+            incremental = False
+        
         # 创建服务实例
-        restaurant_service = GetRestaurantService()
+        restaurant_service = GetRestaurantService(benchmark_path=benchmark_path if incremental else None)
         
         # 先加载默认关键词
         restaurant_service.load_keywords()
@@ -97,7 +108,8 @@ def search_restaurants(city, cp_id, use_llm=True, output_dir=None, keyword=None)
             file_path=None, 
             use_api=True, 
             if_gen_info=False,  # 搜索阶段不生成详细信息
-            use_llm=use_llm
+            use_llm=use_llm,
+            incremental=incremental
         )
         
         # 恢复原始关键词列表
@@ -205,6 +217,116 @@ def check_existing_results(city, temp_base_dir):
     return existing_dirs
 
 
+class StreamingMerger:
+    """
+    流式合并搜索结果：结果文件分批读取，每条记录到达时即按（餐厅名称, 地址）去重，
+    去重后的记录每chunk_size条追加到磁盘上的临时文件，内存中只保留去重键；
+    最终用openpyxl只写模式逐行写出合并结果
+    """
+    def __init__(self, chunk_size=1000, spool_dir=None):
+        """
+        :param chunk_size: 每积累多少条记录写入一次临时文件
+        :param spool_dir: 临时文件目录，默认为系统临时目录
+        """
+        self.chunk_size = max(1, int(chunk_size))
+        self.columns = []
+        self.count = 0
+        self._seen = set()
+        self._buffer = []
+        self._lock = threading.Lock()
+        spool = tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.jsonl', dir=spool_dir, delete=False)
+        spool.close()
+        self._spool_path = spool.name
+
+    @staticmethod
+    def _key_part(value):
+        # 空值（None/NaN）统一为None，使缺少名称或地址的重复记录也能去重（与drop_duplicates一致）
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return None
+        return str(value).strip()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        with open(self._spool_path, 'a', encoding='utf-8') as f:
+            for record in self._buffer:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        self._buffer = []
+
+    def add_records(self, records):
+        """
+        加入一批记录，返回新增（未重复）的记录数
+        """
+        added = 0
+        with self._lock:
+            for record in records:
+                key = (self._key_part(record.get('rest_chinese_name')), self._key_part(record.get('rest_chinese_address')))
+                if key in self._seen:
+                    continue
+                self._seen.add(key)
+                for column in record:
+                    if column not in self.columns:
+                        self.columns.append(column)
+                self._buffer.append(record)
+                added += 1
+                if len(self._buffer) >= self.chunk_size:
+                    self._flush()
+            self.count += added
+        return added
+
+    def add_file(self, file_path):
+        """
+        分批加入一个结果文件，返回新增的记录数
+        """
+        if not (os.path.exists(file_path) and file_path.endswith('.xlsx')):
+            return 0
+        total = added = 0
+        try:
+            for _, records in RecordBatchReader(file_path).iter_batches(self.chunk_size):
+                total += len(records)
+                added += self.add_records(records)
+        except Exception as e:
+            LOGGER.error(f"加载文件失败 {file_path}: {e}")
+            return added
+        LOGGER.info(f"已加载 {total} 条记录从: {file_path}，新增 {added} 条")
+        return added
+
+    def write(self, output_file):
+        """
+        写出合并结果并删除临时文件，返回记录数
+        """
+        from openpyxl import Workbook
+        with self._lock:
+            self._flush()
+            try:
+                if not self.count:
+                    return 0
+                workbook = Workbook(write_only=True)
+                sheet = workbook.create_sheet()
+                sheet.append(self.columns)
+                with open(self._spool_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        record = json.loads(line)
+                        sheet.append([self._cell(record.get(column)) for column in self.columns])
+                workbook.save(output_file)
+                LOGGER.info(f"已合并 {self.count} 条记录到: {output_file}")
+                return self.count
+            finally:
+                self.close()
+
+    @staticmethod
+    def _cell(value):
+        # 空值写为空单元格（与to_excel一致）
+        if isinstance(value, float) and math.isnan(value):
+            return None
+        return value
+
+    def close(self):
+        """删除临时文件"""
+        if self._spool_path and os.path.exists(self._spool_path):
+            os.remove(self._spool_path)
+
+
 def merge_results(result_files, output_file):
     """
     合并多个结果文件
@@ -216,41 +338,114 @@ def merge_results(result_files, output_file):
     Returns:
         merged_count: 合并后的记录数
     """
-    all_data = []
-    
+    merger = StreamingMerger()
     for file_path in result_files:
-        if os.path.exists(file_path) and file_path.endswith('.xlsx'):
-            try:
-                data = pd.read_excel(file_path)
-                all_data.append(data)
-                LOGGER.info(f"已加载 {len(data)} 条记录从: {file_path}")
-            except Exception as e:
-                LOGGER.error(f"加载文件失败 {file_path}: {e}")
+        merger.add_file(file_path)
+    return merger.write(output_file)
+
+
+def run_search_jobs(jobs, cp_id, use_llm=True, output_dir=None, max_workers=4, benchmark_path=None, cancel_event=None):
+    """
+    并行执行多个（城市, 关键词）搜索任务
     
-    if all_data:
-        # 合并所有数据
-        merged_data = pd.concat(all_data, ignore_index=True)
-        
-        # 去重（基于餐厅名称和地址）
-        if 'rest_chinese_name' in merged_data.columns and 'rest_chinese_address' in merged_data.columns:
-            merged_data = merged_data.drop_duplicates(
-                subset=['rest_chinese_name', 'rest_chinese_address'], 
-                keep='first'
-            )
-        
-        # 保存合并结果
-        merged_data.to_excel(output_file, index=False)
-        LOGGER.info(f"已合并 {len(merged_data)} 条记录到: {output_file}")
-        
-        return len(merged_data)
+    所有任务共享进程内的高德密钥限流器（以及运行时配置GAODE_GLOBAL_QPS设置的全局限流），
+    每个任务完成后立即记录到任务清单并流式合并，重新运行时跳过清单中已完成的任务
     
-    return 0
+    Args:
+        jobs: 任务列表 [(城市, 关键词或None), ...]
+        cp_id: CP ID
+        use_llm: 是否使用大模型
+        output_dir: 输出目录
+        max_workers: 并行任务数
+        benchmark_path: 已有餐厅数据文件（可选）
+        cancel_event: 取消标志，设置后不再开始新的任务（已完成的任务保留在清单中，重新运行时跳过；
+            失败或没有结果的任务重新运行时再次执行）
+    
+    Returns:
+        merged_file: 合并结果文件路径（没有结果或已取消时为None）
+    """
+    output_dir = output_dir or os.path.join(tempfile.gettempdir(), f"restaurant_search_{cp_id}")
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_file = os.path.join(output_dir, "jobs_manifest.json")
+    manifest = {}
+    if os.path.exists(manifest_file):
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    manifest_lock = threading.Lock()
+
+    def job_key(city, keyword):
+        return f"{city}|{keyword or ''}"
+
+    def record_job(city, keyword, info):
+        with manifest_lock:
+            manifest[job_key(city, keyword)] = info
+            tmp_file = manifest_file + ".tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, manifest_file)
+
+    merger = StreamingMerger()
+    pending = []
+    for city, keyword in jobs:
+        info = manifest.get(job_key(city, keyword))
+        if info and info.get('status') == 'completed' and info.get('file'):
+            # 已完成的任务直接合并其结果；失败（failed）或没有结果（empty）的任务重新执行
+            merger.add_file(info['file'])
+        else:
+            pending.append((city, keyword))
+    LOGGER.info(f"共 {len(jobs)} 个搜索任务，待执行 {len(pending)} 个，并行数: {max_workers}")
+
+    def run_job(city, keyword):
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        result_file = search_restaurants(city=city, cp_id=cp_id, use_llm=use_llm,
+                                         output_dir=os.path.join(output_dir, city), keyword=keyword,
+                                         benchmark_path=benchmark_path)
+        return result_file
 
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(run_job, city, keyword): (city, keyword) for city, keyword in pending}
+        for done_count, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            city, keyword = futures[future]
+            if cancel_event is not None and cancel_event.is_set():
+                # 取消后不再开始排队中的任务，已开始的任务结束后丢弃结果
+                for pending_future in futures:
+                    pending_future.cancel()
+                continue
+            try:
+                result_file = future.result()
+                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+                if not result_file:
+                    # search_restaurants出错时也返回None，无法与确实没有结果区分，记为empty，重新运行时再次执行
+                    record_job(city, keyword, {'status': 'empty', 'file': None, 'timestamp': timestamp})
+                    LOGGER.warning(f"[{done_count}/{len(pending)}] 任务没有结果: {city} {keyword or '全部'}，重新运行时将重试")
+                    continue
+                record_job(city, keyword, {'status': 'completed', 'file': result_file, 'timestamp': timestamp})
+                added = merger.add_file(result_file)
+                LOGGER.info(f"[{done_count}/{len(pending)}] 任务完成: {city} {keyword or '全部'}，新增 {added} 条")
+            except Exception as e:
+                record_job(city, keyword, {'status': 'failed', 'error': str(e)})
+                LOGGER.error(f"[{done_count}/{len(pending)}] 任务失败: {city} {keyword or '全部'}: {e}")
 
-def main():
-    """主函数"""
+    if cancel_event is not None and cancel_event.is_set():
+        merger.close()
+        LOGGER.info("多城市搜索已取消")
+        return None
+    merged_file = os.path.join(output_dir, f"merged_restaurants_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
+    return merged_file if merger.write(merged_file) else None
+
+
+def main(argv=None, cancel_event=None):
+    """
+    主函数
+    
+    :param argv: 命令行参数，默认读取sys.argv（常驻任务进程调用时传入）
+    :param cancel_event: 取消标志，设置后在下一个关键词开始前停止
+    """
     parser = argparse.ArgumentParser(description='餐厅搜索脚本（低资源版）')
-    parser.add_argument('--city', required=True, help='城市名称')
+    parser.add_argument('--city', help='城市名称')
+    parser.add_argument('--cities', nargs='*', help='多城市搜索：城市列表，与关键词组合为任务并行执行')
+    parser.add_argument('--max_workers', type=int, default=4, help='多城市搜索的并行任务数')
     parser.add_argument('--cp_id', required=True, help='CP ID')
     parser.add_argument('--use_llm', type=bool, default=True, help='是否使用大模型')
     parser.add_argument('--output_dir', help='输出目录')
@@ -267,7 +462,7 @@ def main():
     parser.add_argument('--address_similarity_threshold', type=float, default=0.6, help='地址相似度阈值')
     parser.add_argument('--distance_threshold', type=int, default=1000, help='距离阈值（米）')
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     # 加载运行时配置
     if args.config_file:
@@ -280,6 +475,25 @@ def main():
         print(f"合并完成: {count} 条记录")
         return
     
+    # 多城市并行搜索
+    if args.cities:
+        jobs = [(city, keyword) for city in args.cities for keyword in (args.keywords or [None])]
+        merged_file = run_search_jobs(jobs, args.cp_id, use_llm=args.use_llm, output_dir=args.output_dir,
+                                      max_workers=args.max_workers,
+                                      benchmark_path=args.existing_data_file if args.append_mode else None,
+                                      cancel_event=cancel_event)
+        if cancel_event is not None and cancel_event.is_set():
+            LOGGER.info("搜索任务已取消")
+            return 1
+        if merged_file:
+            print(f"搜索完成，结果已保存到: {merged_file}")
+        else:
+            print("搜索完成，但未找到任何餐厅")
+        return
+    
+    if not args.city:
+        parser.error('需要提供 --city 或 --cities')
+    
     # 检查已存在的结果
     if args.check_existing:
         temp_base_dir = tempfile.gettempdir()
@@ -304,13 +518,17 @@ def main():
         if args.keywords:
             # 按关键词搜索
             for keyword in args.keywords:
+                if cancel_event is not None and cancel_event.is_set():
+                    LOGGER.info("搜索任务已取消")
+                    return 1
                 LOGGER.info(f"正在搜索关键词: {keyword}")
                 result_file = search_restaurants(
                     city=args.city,
                     cp_id=args.cp_id,
                     use_llm=args.use_llm,
                     output_dir=args.output_dir,
-                    keyword=keyword
+                    keyword=keyword,
+                    benchmark_path=args.existing_data_file if existing_data is not None else None
                 )
                 if result_file:
                     result_files.append(result_file)
@@ -322,7 +540,8 @@ def main():
                 cp_id=args.cp_id,
                 use_llm=args.use_llm,
                 output_dir=args.output_dir,
-                keyword=None
+                keyword=None,
+                benchmark_path=args.existing_data_file if existing_data is not None else None
             )
             if result_file:
                 result_files.append(result_file)
@@ -0,0 +1,147 @@
+import os
+import pickle
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+import pandas as pd
+from app.utils.logger import setup_logger
+
+
+LOGGER = setup_logger("moco.log")
+
+# 各Excel路径对应的索引实例
+_CITY_CODE_INDEXES = {}
+_CITY_CODE_INDEXES_LOCK = threading.Lock()
+
+# 索引格式版本，结构变化时递增以使旧的二进制缓存失效
+_INDEX_VERSION = 1
+
+# 后缀规范化时去掉的行政区划后缀
+_SUFFIXES = ("市", "区", "县")
+
+
+def strip_suffix(name: str) -> str:
+    """
+    去掉名称末尾的"市"/"区"/"县"后缀，如 "广州市" -> "广州"
+    """
+    for suffix in _SUFFIXES:
+        if len(name) > len(suffix) + 1 and name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+class CityCodeIndex:
+    """
+    城市代码索引
+
+    启动时只读取一次citycode.xlsx并在其旁边保存二进制缓存（Excel变化时自动重建），
+    支持精确查询、后缀规范化查询以及基于字二元组倒排索引的模糊（包含）查询
+    """
+    def __init__(self, excel_path: str = "app/config/citycode.xlsx"):
+        """
+        初始化索引
+
+        :param excel_path: citycode.xlsx路径
+        """
+        self.excel_path = excel_path
+        self.cache_path = os.path.splitext(excel_path)[0] + ".idx.pkl"
+        self.names = []       # 按Excel行顺序的有效名称（citycode不为\N）
+        self.codes = []       # 与names一一对应的citycode
+        self.exact = {}       # 名称 -> citycode
+        self.normalized = {}  # 去后缀名称 -> citycode
+        self.bigrams = {}     # 字二元组 -> 行号列表（升序）
+        self._memo = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _source_signature(self) -> tuple:
+        stat = os.stat(self.excel_path)
+        return (_INDEX_VERSION, stat.st_size, int(stat.st_mtime))
+
+    def _load(self) -> None:
+        signature = self._source_signature()
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, 'rb') as f:
+                    data = pickle.load(f)
+                if data.get('signature') == signature:
+                    self.names, self.codes = data['names'], data['codes']
+                    self._build()
+                    return
+            except Exception as e:
+                LOGGER.warning(f"读取城市代码索引缓存失败，重新构建: {e}")
+
+        df = pd.read_excel(self.excel_path, dtype={'citycode': str})
+        for name, code in zip(df['中文名'], df['citycode']):
+            if not isinstance(name, str) or pd.isna(code) or code == '\\N':
+                continue
+            self.names.append(name)
+            self.codes.append(code)
+        self._build()
+        try:
+            with open(self.cache_path, 'wb') as f:
+                pickle.dump({'signature': signature, 'names': self.names, 'codes': self.codes}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as e:
+            LOGGER.warning(f"保存城市代码索引缓存失败: {e}")
+
+    def _build(self) -> None:
+        bigrams = defaultdict(list)
+        for row, (name, code) in enumerate(zip(self.names, self.codes)):
+            # 同名时保留Excel中靠前的记录，与原先iloc[0]的行为一致
+            self.exact.setdefault(name, code)
+            self.normalized.setdefault(strip_suffix(name), code)
+            for gram in {name[i:i + 2] for i in range(len(name) - 1)}:
+                bigrams[gram].append(row)
+        self.bigrams = dict(bigrams)
+
+    def _contains(self, text: str) -> Optional[str]:
+        """
+        返回名称包含text的第一条记录的citycode
+        """
+        if len(text) < 2:
+            for name, code in zip(self.names, self.codes):
+                if text in name:
+                    return code
+            return None
+        postings = [self.bigrams.get(text[i:i + 2]) for i in range(len(text) - 1)]
+        if not all(postings):
+            return None
+        candidates = set(min(postings, key=len))
+        for posting in postings:
+            candidates.intersection_update(posting)
+        for row in sorted(candidates):
+            if text in self.names[row]:
+                return self.codes[row]
+        return None
+
+    def lookup(self, city_name: str) -> Optional[str]:
+        """
+        查询城市代码：精确 -> 去"市"精确 -> 后缀规范化 -> 模糊包含
+
+        :param city_name: 城市名称
+        :return: citycode或None
+        """
+        if not city_name or not isinstance(city_name, str):
+            return None
+        with self._lock:
+            if city_name in self._memo:
+                return self._memo[city_name]
+        clean_city_name = city_name.replace("市", "")
+        code = (self.exact.get(city_name)
+                or self.exact.get(clean_city_name)
+                or self.normalized.get(strip_suffix(city_name))
+                or self._contains(clean_city_name))
+        with self._lock:
+            self._memo[city_name] = code
+        return code
+
+
+def get_city_code_index(excel_path: str = "app/config/citycode.xlsx") -> CityCodeIndex:
+    """
+    获取（或创建）进程内共享的城市代码索引
+    """
+    with _CITY_CODE_INDEXES_LOCK:
+        if excel_path not in _CITY_CODE_INDEXES:
+            _CITY_CODE_INDEXES[excel_path] = CityCodeIndex(excel_path)
+        return _CITY_CODE_INDEXES[excel_path]
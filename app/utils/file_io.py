@@ -1,6 +1,9 @@
 import os
 from typing import Union
 
+# 进程间交换DataFrame使用的二进制格式后缀（Excel只用于面向用户的输出）
+FRAME_SUFFIXES = ('.feather', '.pkl')
+
 
 def rp(file_name, folder:Union[str, list]="assets"):
     """
@@ -29,6 +32,181 @@ def rp(file_name, folder:Union[str, list]="assets"):
     return os.path.normpath(full_path)
 
 
+def write_frame(df, path_base: str) -> str:
+    """
+    将DataFrame写入进程间交换用的二进制文件，避免xlsx的写入/解析开销。
+    安装了pyarrow时使用Arrow IPC（Feather），否则（或列类型不被Arrow支持时）使用pickle。
+    先写入同目录下的临时文件再重命名，写入失败不会留下不完整的文件。
+
+    参数:
+        df (pd.DataFrame): 要写入的数据。
+        path_base (str): 不含后缀的文件路径。
+
+    返回:
+        str: 实际写入的文件路径。
+    """
+    df = df.reset_index(drop=True)
+    try:
+        import pyarrow  # noqa: F401
+        return _write_atomic(df.to_feather, path_base + '.feather')
+    except Exception:
+        return _write_atomic(df.to_pickle, path_base + '.pkl')
+
+
+def _write_atomic(writer, path: str) -> str:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        writer(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def read_frame(path: str):
+    """
+    按文件后缀读取DataFrame，支持 .feather / .pkl / .xlsx / .xls / .csv。
+
+    参数:
+        path (str): 文件路径。
+
+    返回:
+        pd.DataFrame: 读取的数据。
+    """
+    import pandas as pd
+    if path.endswith('.feather'):
+        return pd.read_feather(path)
+    if path.endswith('.pkl'):
+        return pd.read_pickle(path)
+    if path.endswith(('.xlsx', '.xls')):
+        return pd.read_excel(path)
+    if path.endswith('.csv'):
+        return pd.read_csv(path)
+    raise ValueError(f"不支持的文件类型: {path}")
+
+
+class RecordBatchReader:
+    """
+    按批次流式读取数据文件中的记录（字典列表），内存占用与批次大小成正比。
+    .xlsx 使用openpyxl只读模式逐行读取，.csv 按块读取；
+    其余格式（.xls 及进程间交换用的二进制文件）整体读取后再分批。
+    空单元格读取为NaN，中间的空行保留为全NaN记录、末尾空行丢弃，
+    行号与pd.read_excel/pd.read_csv一致。
+    """
+    def __init__(self, path: str):
+        """
+        参数:
+            path (str): 数据文件路径。
+        """
+        self.path = path
+        self._count = None
+
+    def columns(self) -> list:
+        """返回列名"""
+        if self.path.endswith('.xlsx'):
+            for header in self._iter_xlsx_rows(header_only=True):
+                return header
+            return []
+        if self.path.endswith('.csv'):
+            import pandas as pd
+            return list(pd.read_csv(self.path, nrows=0).columns)
+        return list(read_frame(self.path).columns)
+
+    def __len__(self) -> int:
+        """
+        记录数。完整遍历一次后为精确值；此前.xlsx取工作表尺寸信息，
+        .csv按换行符计数，不额外解析文件（末尾空行等可能使其略微偏大）。
+        """
+        if self._count is None:
+            self._count = self._estimate_count()
+        return self._count
+
+    def _estimate_count(self) -> int:
+        if self.path.endswith('.xlsx'):
+            from openpyxl import load_workbook
+            workbook = load_workbook(self.path, read_only=True, data_only=True)
+            try:
+                max_row = workbook.active.max_row
+            finally:
+                workbook.close()
+            if max_row is not None:
+                return max(0, max_row - 1)
+        elif self.path.endswith('.csv'):
+            newlines, last = 0, b'\n'
+            with open(self.path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    newlines += block.count(b'\n')
+                    last = block[-1:]
+            # 最后一行没有换行符时补计一行，再减去表头
+            return max(0, newlines + (last != b'\n') - 1)
+        for _ in self.iter_batches(1000):
+            pass
+        return self._count
+
+    def _iter_xlsx_rows(self, header_only: bool = False):
+        from openpyxl import load_workbook
+        workbook = load_workbook(self.path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            header = [f"Unnamed: {i}" if name is None else name for i, name in enumerate(header)]
+            if header_only:
+                yield header
+                return
+            # 完全为空的行先暂存，之后出现非空行时再输出，
+            # 这样中间空行得以保留，而工作表末尾的空行被丢弃
+            blank_rows = 0
+            for values in rows:
+                if all(value is None for value in values):
+                    blank_rows += 1
+                    continue
+                for _ in range(blank_rows):
+                    yield {name: float('nan') for name in header}
+                blank_rows = 0
+                yield {name: (float('nan') if value is None else value) for name, value in zip(header, values)}
+        finally:
+            workbook.close()
+
+    def iter_batches(self, batch_size: int):
+        """
+        按批次读取记录
+
+        参数:
+            batch_size (int): 每批记录数。
+
+        返回:
+            Iterator[Tuple[int, List[dict]]]: (批次首条记录的行号, 记录列表)。
+        """
+        batch_size = max(1, int(batch_size))
+        start = 0
+        if self.path.endswith('.xlsx'):
+            batch = []
+            for record in self._iter_xlsx_rows():
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    yield start, batch
+                    start += len(batch)
+                    batch = []
+            if batch:
+                yield start, batch
+                start += len(batch)
+        elif self.path.endswith('.csv'):
+            import pandas as pd
+            for chunk in pd.read_csv(self.path, chunksize=batch_size):
+                yield start, chunk.to_dict('records')
+                start += len(chunk)
+        else:
+            df = read_frame(self.path)
+            for start in range(0, len(df), batch_size):
+                yield start, df.iloc[start:start + batch_size].to_dict('records')
+            start = len(df)
+        # 完整遍历后记录精确的记录数
+        self._count = start
+
 
 if __name__ == "__main__":
     # 测试获取 config.json 文件路径
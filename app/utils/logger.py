@@ -2,6 +2,8 @@ import logging
 from logging.handlers import RotatingFileHandler
 from app.utils import rp
 import os
+import time
+import queue
 import threading
 
 # 全局日志对象
@@ -57,6 +59,101 @@ class RealTimeRotatingFileHandler(RotatingFileHandler):
         super().emit(record)
         self.flush()  # 立即刷新缓冲区
 
+class AsyncFileLogWriter:
+    """
+    基于队列的异步日志写入器
+
+    工作线程只把日志行放入有界队列，由单独的写入线程批量写入文件；
+    队列接近满时对INFO日志抽样，队列已满时丢弃并计数，调用方不会因磁盘I/O阻塞
+    """
+    _SENTINEL = object()
+
+    def __init__(self, log_file, max_queue=10000, batch_size=256, flush_interval=0.5, sample_rate=10):
+        """
+        :param log_file: 日志文件路径
+        :param max_queue: 队列容量
+        :param batch_size: 每次最多合并写入的日志行数
+        :param flush_interval: 无新日志时的最长刷新间隔（秒）
+        :param sample_rate: 队列超过80%时，INFO日志每sample_rate条保留1条
+        """
+        self.log_file = log_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sample_rate = max(1, int(sample_rate))
+        self.high_water = int(max_queue * 0.8)
+        self.dropped = 0
+        self.sampled_out = 0
+        self._sample_counter = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="moco-log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, level, message):
+        """
+        非阻塞地写入一条日志
+        """
+        if level == "INFO" and self._queue.qsize() >= self.high_water:
+            self._sample_counter += 1
+            if self._sample_counter % self.sample_rate:
+                self.sampled_out += 1
+                return
+        line = f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {level} - {message}\n"
+        try:
+            self._queue.put_nowait((level, line))
+        except queue.Full:
+            self.dropped += 1
+            if level == "ERROR":
+                print(f"ERROR - {message[:200]}")
+
+    def _run(self):
+        closing = False
+        while not closing:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            while True:
+                if item is self._SENTINEL:
+                    closing = True
+                else:
+                    batch.append(item)
+                if closing or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if self.dropped or self.sampled_out:
+                dropped, sampled_out = self.dropped, self.sampled_out
+                self.dropped = self.sampled_out = 0
+                batch.append(("WARNING", f"{time.strftime('%Y-%m-%d %H:%M:%S')} - WARNING - "
+                                         f"日志队列繁忙，丢弃 {dropped} 条，抽样略过 {sampled_out} 条\n"))
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(''.join(line for _, line in batch))
+                f.flush()
+                # 批次中包含ERROR时才fsync，减少磁盘I/O
+                if any(level == "ERROR" for level, _ in batch):
+                    os.fsync(f.fileno())
+        except Exception as e:
+            print(f"写入日志文件失败: {e}")
+
+    def close(self, timeout=5.0):
+        """
+        写完队列中剩余的日志后停止写入线程
+        """
+        try:
+            self._queue.put(self._SENTINEL, timeout=timeout)
+        except Exception:
+            pass
+        self._thread.join(timeout)
+
+
 def setup_logger(log_file="moco.log", max_size=5 * 1024 * 1024, backup_count=3):
     """
     设置主日志系统
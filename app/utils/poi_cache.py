@@ -0,0 +1,102 @@
+import os
+import time
+import json
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+from app.utils.file_io import rp
+from app.utils.logger import setup_logger
+
+
+LOGGER = setup_logger("moco.log")
+
+# 各路径对应的缓存实例
+_POI_CACHES = {}
+_POI_CACHES_LOCK = threading.Lock()
+
+# 默认有效期：命中结果30天，未找到结果3天
+DEFAULT_TTL = 30 * 24 * 3600
+DEFAULT_NEGATIVE_TTL = 3 * 24 * 3600
+
+
+class PoiCache:
+    """
+    高德POI查询结果的持久化缓存（SQLite，WAL模式，可跨进程共享）
+
+    以 (关键词, 城市代码, POI类型) 为键保存原始响应，"未找到"的结果同样缓存（有效期较短），
+    补全中途失败后重新运行时无需重复查询已查过的POI
+    """
+    def __init__(self, path: str = None, ttl: float = DEFAULT_TTL, negative_ttl: float = DEFAULT_NEGATIVE_TTL):
+        """
+        初始化缓存
+
+        :param path: SQLite文件路径，默认为 var/cache/poi_cache.sqlite
+        :param ttl: 有结果的响应有效期(秒)
+        :param negative_ttl: 未找到结果的响应有效期(秒)
+        """
+        self.path = path or rp("poi_cache.sqlite", folder=["var", "cache"])
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS poi ("
+            "keywords TEXT, city_code TEXT, types TEXT, response TEXT, found INTEGER, updated_at REAL, "
+            "PRIMARY KEY (keywords, city_code, types))")
+        self._conn.commit()
+
+    def get(self, keywords: str, city_code: str, types: str = "050000") -> Optional[Dict[str, Any]]:
+        """
+        查询缓存，过期条目视为未命中
+
+        :return: 缓存的高德POI响应（未找到时为pois为空的响应）或None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, found, updated_at FROM poi WHERE keywords = ? AND city_code = ? AND types = ?",
+                (keywords, str(city_code), types)).fetchone()
+        if row is None:
+            return None
+        response, found, updated_at = row
+        if time.time() - updated_at > (self.ttl if found else self.negative_ttl):
+            return None
+        return json.loads(response)
+
+    def put(self, keywords: str, city_code: str, types: str, response: Dict[str, Any]) -> None:
+        """
+        写入一次成功的POI查询响应（pois为空时作为"未找到"缓存）
+        """
+        found = 1 if response.get('pois') else 0
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO poi (keywords, city_code, types, response, found, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (keywords, str(city_code), types, json.dumps(response, ensure_ascii=False), found, time.time()))
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        """
+        删除过期条目
+
+        :return: 删除的条目数
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM poi WHERE (found = 1 AND updated_at < ?) OR (found = 0 AND updated_at < ?)",
+                (now - self.ttl, now - self.negative_ttl))
+            self._conn.commit()
+        return cursor.rowcount
+
+
+def get_poi_cache(path: str = None) -> PoiCache:
+    """
+    获取（或创建）进程内共享的POI缓存实例
+    """
+    key = path or ''
+    with _POI_CACHES_LOCK:
+        if key not in _POI_CACHES:
+            _POI_CACHES[key] = PoiCache(path)
+        return _POI_CACHES[key]
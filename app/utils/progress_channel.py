@@ -0,0 +1,68 @@
+import json
+import socket
+import threading
+from typing import Any, Dict, Optional
+from app.utils.logger import setup_logger
+
+
+LOGGER = setup_logger("moco.log")
+
+
+class ProgressChannel:
+    """
+    子进程向主程序推送进度事件的本地通道
+
+    通过回环TCP连接发送按行分隔的JSON事件（如 {"event": "status", ...}），
+    主程序监听端口并增量处理；连接失败或中断时静默降级，不影响任务本身
+    """
+    def __init__(self, port: Optional[int], host: str = "127.0.0.1", timeout: float = 3):
+        """
+        :param port: 主程序监听的端口，为空时不发送任何事件
+        :param host: 主程序监听的地址
+        :param timeout: 连接及发送超时时间(秒)
+        """
+        self._lock = threading.Lock()
+        self._sock = None
+        if not port:
+            return
+        try:
+            self._sock = socket.create_connection((host, int(port)), timeout=timeout)
+            self._sock.settimeout(timeout)
+        except OSError as e:
+            LOGGER.warning(f"连接进度通道失败，仅使用状态文件: {e}")
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None
+
+    def send(self, event: str, **data: Any) -> None:
+        """
+        发送一个事件
+
+        :param event: 事件类型（status / record / error）
+        :param data: 事件内容，需可JSON序列化（无法序列化的值转为字符串）
+        """
+        if self._sock is None:
+            return
+        payload: Dict[str, Any] = {'event': event, **data}
+        line = (json.dumps(payload, ensure_ascii=False, default=str) + '\n').encode('utf-8')
+        with self._lock:
+            if self._sock is None:
+                return
+            try:
+                self._sock.sendall(line)
+            except OSError as e:
+                LOGGER.warning(f"进度通道已断开: {e}")
+                self._close()
+
+    def _close(self) -> None:
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+        self._sock = None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._sock is not None:
+                self._close()
@@ -1,51 +1,348 @@
 import requests
 import time
 import logging
-from typing import Callable, List, Any, Optional
+import threading
+import concurrent.futures
+from collections import deque, OrderedDict
+from typing import Callable, List, Any, Optional, Hashable
 from app.utils.logger import setup_logger
 
 
 LOGGER = setup_logger("moco.log")
 
-def robust_query(query_func: Callable, keys: List[str], max_retries: int = 1, 
-                interval: float = 1.0, timeout: float = 10.0, **kwargs) -> Optional[Any]:
+# 对冲请求使用的共享线程池（延迟创建）
+_HEDGE_EXECUTOR = None
+_HEDGE_EXECUTOR_LOCK = threading.Lock()
+_HEDGE_MAX_WORKERS = 32
+
+# 各端点的熔断器、延迟统计、最近成功结果缓存和限流器
+_BREAKERS = {}
+_LATENCIES = {}
+_RESULT_CACHES = {}
+_RATE_LIMITERS = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+class LatencyTracker:
+    """
+    记录某个端点最近若干次成功请求的耗时，用于推算对冲延迟
+    """
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, elapsed: float) -> None:
+        with self._lock:
+            self.samples.append(elapsed)
+
+    def percentile(self, pct: float = 0.95) -> Optional[float]:
+        """
+        返回耗时分位数，样本不足时返回None
+        """
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, int(len(ordered) * pct))
+        return ordered[idx]
+
+
+class CircuitBreaker:
+    """
+    端点级熔断器：连续失败达到阈值后熔断，冷却期内直接快速失败，
+    冷却期结束后放行一次探测请求（半开），成功则恢复，失败则重新熔断
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        判断当前是否允许发起请求
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.time() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state != self.CLOSED
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    LOGGER.warning(f"端点连续失败 {self.failures} 次，熔断 {self.cooldown} 秒")
+                self.state = self.OPEN
+                self.opened_at = time.time()
+                self._probing = False
+
+
+class RateLimiter:
+    """
+    令牌桶限流器：平均每秒最多放行rate个请求，允许burst个请求的突发
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = max(float(rate), 1e-6)
+        self.burst = max(1, int(burst))
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        获取一个令牌，令牌不足时阻塞等待
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def get_rate_limiter(name: str, rate: float, burst: int = 1) -> RateLimiter:
+    """
+    获取（或创建）指定名称（如端点+密钥）的限流器
+    """
+    with _REGISTRY_LOCK:
+        if name not in _RATE_LIMITERS:
+            _RATE_LIMITERS[name] = RateLimiter(rate, burst)
+        return _RATE_LIMITERS[name]
+
+
+def _get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _HEDGE_EXECUTOR
+    with _HEDGE_EXECUTOR_LOCK:
+        if _HEDGE_EXECUTOR is None:
+            _HEDGE_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+                max_workers=_HEDGE_MAX_WORKERS, thread_name_prefix="moco-hedge")
+        return _HEDGE_EXECUTOR
+
+
+def get_circuit_breaker(endpoint: str) -> CircuitBreaker:
+    """
+    获取（或创建）端点对应的熔断器
+    """
+    with _REGISTRY_LOCK:
+        if endpoint not in _BREAKERS:
+            _BREAKERS[endpoint] = CircuitBreaker()
+        return _BREAKERS[endpoint]
+
+
+def _get_latency_tracker(endpoint: str) -> LatencyTracker:
+    with _REGISTRY_LOCK:
+        if endpoint not in _LATENCIES:
+            _LATENCIES[endpoint] = LatencyTracker()
+        return _LATENCIES[endpoint]
+
+
+def is_circuit_open(endpoint: str) -> bool:
+    """
+    判断端点当前是否处于熔断（或半开）状态
+    """
+    with _REGISTRY_LOCK:
+        breaker = _BREAKERS.get(endpoint)
+    return breaker is not None and breaker.is_open()
+
+
+def _cache_get(endpoint: str, cache_key: Hashable):
+    with _REGISTRY_LOCK:
+        cache = _RESULT_CACHES.get(endpoint)
+        if cache is None or cache_key not in cache:
+            return None
+        cache.move_to_end(cache_key)
+        return cache[cache_key]
+
+
+def _cache_put(endpoint: str, cache_key: Hashable, value: Any, max_size: int = 2048) -> None:
+    with _REGISTRY_LOCK:
+        cache = _RESULT_CACHES.setdefault(endpoint, OrderedDict())
+        cache[cache_key] = value
+        cache.move_to_end(cache_key)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
+
+
+def _hedged_query(query_func: Callable, keys: List[str], endpoint: str, timeout: float,
+                  min_delay: float, **kwargs) -> Optional[Any]:
+    """
+    对冲请求：先在第一个密钥上发起请求，该请求实际开始执行后超过p95延迟仍未返回时，
+    在下一个密钥上发起重复请求，取最先返回的有效结果。
+    对冲延迟从请求在线程池中真正开始执行时计时，在共享线程池中排队的时间不计入，
+    避免线程池繁忙时大量发起重复请求；返回时取消仍在排队的请求
+    """
+    tracker = _get_latency_tracker(endpoint)
+    p95 = tracker.percentile(0.95)
+    # 样本不足时使用保守的默认对冲延迟
+    hedge_delay = max(min_delay, p95 if p95 is not None else 1.0)
+    executor = _get_executor()
+    started_at = {}  # 密钥 -> 请求实际开始执行的时间
+
+    def timed_call(key):
+        start = time.time()
+        started_at[key] = start
+        ans = query_func(key, **kwargs)
+        return ans, time.time() - start
+
+    deadline = time.time() + timeout
+    pending = {}
+    launched = []
+    key_iter = iter(keys)
+
+    def launch_next() -> bool:
+        key = next(key_iter, None)
+        if key is None:
+            return False
+        pending[executor.submit(timed_call, key)] = key
+        launched.append(key)
+        return True
+
+    launch_next()
+    try:
+        while pending:
+            now = time.time()
+            remaining = deadline - now
+            if remaining <= 0:
+                LOGGER.error(f"对冲查询超时 (端点: {endpoint})")
+                break
+            last_start = started_at.get(launched[-1])
+            if last_start is None:
+                # 最近发起的请求仍在排队，只等待结果，不计入对冲延迟
+                wait_time = min(0.05, remaining)
+            else:
+                wait_time = min(max(0.0, last_start + hedge_delay - now), remaining)
+            done, _ = concurrent.futures.wait(
+                list(pending), timeout=wait_time, return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                last_start = started_at.get(launched[-1])
+                if last_start is not None and time.time() - last_start >= hedge_delay:
+                    # 实际执行超过对冲延迟仍未返回，在下一个密钥上发起重复请求
+                    launch_next()
+                continue
+            for future in done:
+                key = pending.pop(future)
+                try:
+                    ans, elapsed = future.result()
+                except Exception as e:
+                    LOGGER.error(f"对冲查询失败 (密钥: {key[:8]}...): {str(e)}")
+                    continue
+                if ans is not None:
+                    tracker.record(elapsed)
+                    return ans
+                LOGGER.warning(f"使用密钥 {key[:8]}... 查询返回空结果")
+            if not pending:
+                # 已返回的请求全部失败，立即换下一个密钥
+                launch_next()
+        return None
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def robust_query(query_func: Callable, keys: List[str], max_retries: int = 1,
+                interval: float = 1.0, timeout: float = 10.0, endpoint: Optional[str] = None,
+                hedge: bool = False, hedge_min_delay: float = 0.2,
+                cache_key: Optional[Hashable] = None, fallback: Any = None, **kwargs) -> Optional[Any]:
     """
     健壮的API查询封装，支持多个API密钥轮询和错误重试
-    
+
     :param query_func: 查询函数，接受key作为参数
     :param keys: API密钥列表
     :param max_retries: 每个密钥的最大重试次数
     :param interval: 重试间隔时间(秒)
     :param timeout: 查询超时时间(秒)
-    :return: 查询结果或None(如果所有尝试都失败)
+    :param endpoint: 端点名称，用于熔断和延迟统计；未指定时不熔断，延迟按查询函数名统计
+    :param hedge: 是否启用对冲请求（超过p95延迟后在另一个密钥上发起重复请求）
+    :param hedge_min_delay: 对冲延迟下限(秒)
+    :param cache_key: 结果缓存键，熔断期间优先返回该键最近一次成功的结果
+    :param fallback: 熔断期间且无缓存时返回的默认值
+    :return: 查询结果；所有尝试都失败时返回None，熔断期间返回缓存或fallback
     """
     if not keys:
         # LOGGER.error("未提供任何API密钥")
         return None
-        
+
+    # 只有显式指定端点的调用方才启用熔断；其余调用方（如城市搜索）未处理熔断时快速返回的None
+    breaker = get_circuit_breaker(endpoint) if endpoint else None
+    endpoint = endpoint or getattr(query_func, '__name__', 'default')
+    if breaker is not None and not breaker.allow():
+        # 熔断期间快速失败，返回缓存或默认值
+        cached = _cache_get(endpoint, cache_key) if cache_key is not None else None
+        return cached if cached is not None else fallback
+
+    if hedge and len(keys) > 1:
+        ans = _hedged_query(query_func, keys, endpoint, timeout, hedge_min_delay, **kwargs)
+        if ans is not None:
+            if breaker is not None:
+                breaker.record_success()
+            if cache_key is not None:
+                _cache_put(endpoint, cache_key, ans)
+            return ans
+        if breaker is not None:
+            breaker.record_failure()
+        LOGGER.error("所有API密钥和重试次数均已用尽，查询失败")
+        return None
+
+    tracker = _get_latency_tracker(endpoint)
     for key in keys:
         for attempt in range(max_retries):
             try:
                 # 设置超时
                 start_time = time.time()
                 ans = query_func(key, **kwargs)
-                
+
                 # 检查结果是否有效
                 if ans is not None:
+                    tracker.record(time.time() - start_time)
+                    if breaker is not None:
+                        breaker.record_success()
+                    if cache_key is not None:
+                        _cache_put(endpoint, cache_key, ans)
                     return ans
-                
+
                 LOGGER.warning(f"使用密钥 {key[:8]}... 查询返回空结果，尝试 {attempt+1}/{max_retries}")
             except Exception as e:
                 LOGGER.error(f"查询失败 (密钥: {key[:8]}..., 尝试: {attempt+1}/{max_retries}): {str(e)}")
-            
+
             # 检查是否超时
             if time.time() - start_time > timeout:
                 LOGGER.error(f"查询超时 (密钥: {key[:8]}...)")
                 break
-                
+
             # 在重试前等待
             if attempt < max_retries - 1:
                 time.sleep(interval)
-    
+
+    if breaker is not None:
+        breaker.record_failure()
     LOGGER.error("所有API密钥和重试次数均已用尽，查询失败")
     return None
@@ -0,0 +1,216 @@
+import os
+import json
+import threading
+from datetime import date, datetime
+from typing import Any, Dict, Hashable, List, Optional
+from app.utils.logger import setup_logger
+
+
+LOGGER = setup_logger("moco.log")
+
+
+class JournalLockedError(OSError):
+    """记录日志已被其他任务打开"""
+
+
+class RecordJournal:
+    """
+    只追加的逐条记录日志（JSONL），用于长任务的断点续跑
+
+    每条完成的记录立即追加写入，每group_size条fsync一次；
+    重新运行时读取日志即可精确恢复到最后一条已落盘的记录，
+    日志末尾因崩溃而不完整的行会被忽略。
+    numpy标量按对应的Python类型写入，日期时间带类型标记写入，
+    恢复后的记录与写入时类型一致。
+    处理失败的记录以done=False写入：保留在records()中，但不计入已完成，重新运行时会再次处理。
+    打开期间持有日志的独占文件锁，同一日志被其他任务占用时构造函数抛出JournalLockedError
+    """
+    def __init__(self, path: str, group_size: int = 20):
+        """
+        :param path: 日志文件路径
+        :param group_size: 每写入多少条记录fsync一次
+        """
+        self.path = path
+        self.group_size = max(1, int(group_size))
+        self._records = {}
+        self._failed = set()  # 最后一次写入为失败的key
+        self._pending = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock_file = self._acquire_file_lock(path + '.lock')
+        try:
+            self._load()
+            self._file = open(self.path, 'a', encoding='utf-8')
+        except Exception:
+            self._release_file_lock()
+            raise
+
+    @staticmethod
+    def _acquire_file_lock(lock_path: str):
+        # 进程退出时系统自动释放锁，崩溃后不会留下死锁
+        lock_file = open(lock_path, 'a+b')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise JournalLockedError(f"记录日志正被其他任务使用: {lock_path}")
+        return lock_file
+
+    def _release_file_lock(self) -> None:
+        if self._lock_file is None:
+            return
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                self._lock_file.seek(0)
+                msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+        except OSError:
+            pass
+        self._lock_file.close()
+        self._lock_file = None
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        valid_size = 0
+        with open(self.path, 'rb') as f:
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    break  # 崩溃时写了一半的行
+                try:
+                    entry = json.loads(raw.decode('utf-8'), object_hook=self._decode)
+                except ValueError:
+                    break
+                key = self._key(entry['key'])
+                self._records[key] = entry['record']
+                if entry.get('done', True):
+                    self._failed.discard(key)
+                else:
+                    self._failed.add(key)
+                valid_size += len(raw)
+        if valid_size < os.path.getsize(self.path):
+            # 截掉不完整的尾部，保证后续追加的行是完整的
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_size)
+            LOGGER.warning(f"记录日志末尾不完整，已截断: {self.path}")
+
+    @staticmethod
+    def _encode(value: Any) -> Any:
+        # json无法直接序列化的值：numpy标量转为Python标量，日期时间带类型标记
+        if type(value).__name__ == 'NaTType':
+            return None
+        if hasattr(value, 'item') and callable(value.item) and not hasattr(value, '__len__'):
+            return value.item()
+        if isinstance(value, datetime):
+            kind = 'timestamp' if type(value).__name__ == 'Timestamp' else 'datetime'
+            return {'__type__': kind, 'value': value.isoformat()}
+        if isinstance(value, date):
+            return {'__type__': 'date', 'value': value.isoformat()}
+        if isinstance(value, (set, frozenset)):
+            return list(value)
+        return str(value)
+
+    @staticmethod
+    def _decode(obj: Dict[str, Any]) -> Any:
+        kind = obj.get('__type__')
+        if kind is None or len(obj) != 2 or 'value' not in obj:
+            return obj
+        try:
+            if kind == 'timestamp':
+                import pandas as pd
+                return pd.Timestamp(obj['value'])
+            if kind == 'datetime':
+                return datetime.fromisoformat(obj['value'])
+            if kind == 'date':
+                return date.fromisoformat(obj['value'])
+        except ValueError:
+            pass
+        return obj
+
+    @staticmethod
+    def _key(key: Hashable) -> Hashable:
+        # JSON中的列表在恢复后统一为元组，便于作为字典键
+        return tuple(key) if isinstance(key, list) else key
+
+    def __len__(self) -> int:
+        """已完成的记录数"""
+        with self._lock:
+            return len(self._records) - len(self._failed)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """key是否已完成（失败的记录不算）"""
+        with self._lock:
+            return key in self._records and key not in self._failed
+
+    def append(self, key: Hashable, record: Dict[str, Any], done: bool = True) -> None:
+        """
+        追加一条记录（同一key重复写入时以最后一次为准）
+
+        :param done: 是否处理成功，失败的记录在重新运行时会再次处理
+        """
+        entry = {'key': key, 'record': record}
+        if not done:
+            entry['done'] = False
+        line = json.dumps(entry, ensure_ascii=False, default=self._encode) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._records[key] = record
+            if done:
+                self._failed.discard(key)
+            else:
+                self._failed.add(key)
+            self._pending += 1
+            if self._pending >= self.group_size:
+                self._sync()
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def flush(self) -> None:
+        """
+        将已追加的记录全部落盘
+        """
+        with self._lock:
+            if self._pending:
+                self._sync()
+
+    def records(self, keys: Optional[List[Hashable]] = None) -> List[Dict[str, Any]]:
+        """
+        按给定顺序返回已写入的记录，包括失败的记录（默认按写入顺序）
+        """
+        with self._lock:
+            if keys is None:
+                return list(self._records.values())
+            return [self._records[key] for key in keys if key in self._records]
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self.flush()
+        with self._lock:
+            self._file.close()
+        self._release_file_lock()
+
+    def discard(self) -> None:
+        """
+        关闭并删除日志（持有锁期间删除，避免删掉其他任务刚打开的日志）
+        """
+        if not self._file.closed:
+            self.flush()
+            with self._lock:
+                self._file.close()
+        try:
+            os.remove(self.path)
+        finally:
+            self._release_file_lock()
@@ -0,0 +1,191 @@
+import os
+import re
+import time
+import json
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from typing import Dict, List, Optional
+from app.utils.file_io import rp
+from app.utils.logger import setup_logger
+
+
+LOGGER = setup_logger("moco.log")
+
+# 各路径对应的缓存实例
+_TYPE_CACHES = {}
+_TYPE_CACHES_LOCK = threading.Lock()
+
+# 分店后缀，如 "海底捞火锅(天河店)"、"海底捞火锅（天河城店）"、"海底捞火锅·天河店"
+_BRANCH_PATTERN = re.compile(r'(?:[(\[（【][^)\]）】]*[)\]）】]|[·\-—]\s*\S+店)\s*$')
+
+
+def normalize_name(name: str) -> str:
+    """
+    规范化餐厅名称：全角转半角、去空白、小写
+    """
+    if not name or not isinstance(name, str):
+        return ''
+    name = unicodedata.normalize('NFKC', name)
+    return re.sub(r'\s+', '', name).lower()
+
+
+def extract_brand(name: str) -> str:
+    """
+    去掉分店后缀，得到品牌名，如 "海底捞火锅(天河店)" -> "海底捞火锅"
+    """
+    brand = normalize_name(name)
+    while True:
+        stripped = _BRANCH_PATTERN.sub('', brand).strip()
+        if stripped == brand or not stripped:
+            return brand
+        brand = stripped
+
+
+def candidates_fingerprint(candidate_types: List[str]) -> str:
+    """
+    候选类型列表的指纹，候选类型变化时缓存失效
+    """
+    payload = json.dumps(sorted(candidate_types), ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class RestaurantTypeCache:
+    """
+    餐厅类型分类结果的持久化缓存（SQLite）
+
+    按规范化名称（可选附带地址）和品牌名两级缓存，记录置信度和来源，
+    同一品牌的不同分店只需分析一次即可跨餐厅、跨CP、跨运行复用
+    """
+    def __init__(self, path: str = None):
+        """
+        初始化缓存
+
+        :param path: SQLite文件路径，默认为 var/cache/rest_type_cache.sqlite
+        """
+        self.path = path or rp("rest_type_cache.sqlite", folder=["var", "cache"])
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rest_type ("
+            "key TEXT PRIMARY KEY, kind TEXT, rest_type TEXT, confidence REAL, "
+            "provenance TEXT, updated_at REAL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT)")
+        self._conn.commit()
+        self._fingerprint = None
+
+    def ensure_candidates(self, candidate_types: List[str]) -> None:
+        """
+        检查候选类型列表是否变化，变化则清空缓存
+
+        :param candidate_types: 配置中的候选类型列表
+        """
+        fingerprint = candidates_fingerprint(candidate_types)
+        if fingerprint == self._fingerprint:
+            return
+        with self._lock:
+            row = self._conn.execute("SELECT v FROM meta WHERE k = 'candidates'").fetchone()
+            if row is None or row[0] != fingerprint:
+                if row is not None:
+                    LOGGER.info("候选餐厅类型已变化，清空类型缓存")
+                self._conn.execute("DELETE FROM rest_type")
+                self._conn.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('candidates', ?)", (fingerprint,))
+                self._conn.commit()
+            self._fingerprint = fingerprint
+
+    @staticmethod
+    def _keys(name: str, address: str = None, brand: str = None) -> List[tuple]:
+        keys = []
+        norm_name = normalize_name(name)
+        norm_address = normalize_name(address)  # 地址缺失（None/NaN/空串）时为空
+        if norm_name and norm_address:
+            keys.append(('name_addr', f"na:{norm_name}|{norm_address}"))
+        if norm_name:
+            keys.append(('name', f"n:{norm_name}"))
+        brand = normalize_name(brand) if brand else extract_brand(name)
+        if brand:
+            keys.append(('brand', f"b:{brand}"))
+        return keys
+
+    def get(self, name: str, address: str = None, brand: str = None) -> Optional[Dict]:
+        """
+        查询缓存，按 名称+地址 -> 名称 -> 品牌 的顺序命中
+
+        :return: {'rest_type', 'confidence', 'provenance', 'kind'} 或 None
+        """
+        keys = self._keys(name, address, brand)
+        if not keys:
+            return None
+        with self._lock:
+            for kind, key in keys:
+                row = self._conn.execute(
+                    "SELECT rest_type, confidence, provenance FROM rest_type WHERE key = ?", (key,)).fetchone()
+                if row:
+                    return {'rest_type': row[0], 'confidence': row[1], 'provenance': row[2], 'kind': kind}
+        return None
+
+    def put(self, name: str, rest_type: str, confidence: float, provenance: str,
+            address: str = None, brand: str = None) -> None:
+        """
+        写入分类结果，同时写入名称级和品牌级缓存（品牌级不覆盖置信度更高的已有结果）
+
+        :param name: 餐厅名称
+        :param rest_type: 分类结果
+        :param confidence: 置信度，0-1
+        :param provenance: 来源，如 'kimi'、'keyword'
+        :param address: 餐厅地址，可选
+        :param brand: 品牌名，可选，默认从名称中提取
+        """
+        now = time.time()
+        with self._lock:
+            for kind, key in self._keys(name, address, brand):
+                if kind == 'brand':
+                    self._conn.execute(
+                        "INSERT INTO rest_type (key, kind, rest_type, confidence, provenance, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                        "rest_type = excluded.rest_type, confidence = excluded.confidence, "
+                        "provenance = excluded.provenance, updated_at = excluded.updated_at "
+                        "WHERE excluded.confidence >= rest_type.confidence",
+                        (key, kind, rest_type, confidence, provenance, now))
+                else:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO rest_type (key, kind, rest_type, confidence, provenance, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (key, kind, rest_type, confidence, provenance, now))
+            self._conn.commit()
+
+    def entries(self, kind: str = 'name', min_confidence: float = 0.0, provenances: List[str] = None) -> List[tuple]:
+        """
+        列出某一级缓存的全部条目
+
+        :param kind: 缓存级别，'name_addr'、'name' 或 'brand'
+        :param min_confidence: 置信度下限
+        :param provenances: 只列出这些来源的条目，默认不限
+        :return: [(规范化名称/品牌, 类型, 置信度), ...]
+        """
+        query = "SELECT key, rest_type, confidence FROM rest_type WHERE kind = ? AND confidence >= ?"
+        params = [kind, min_confidence]
+        if provenances:
+            query += f" AND provenance IN ({','.join('?' * len(provenances))})"
+            params.extend(provenances)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [(key.split(':', 1)[1], rest_type, confidence) for key, rest_type, confidence in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rest_type").fetchone()[0]
+
+
+def get_type_cache(path: str = None) -> RestaurantTypeCache:
+    """
+    获取（或创建）进程内共享的类型缓存实例
+    """
+    key = path or ''
+    with _TYPE_CACHES_LOCK:
+        if key not in _TYPE_CACHES:
+            _TYPE_CACHES[key] = RestaurantTypeCache(path)
+        return _TYPE_CACHES[key]
@@ -0,0 +1,264 @@
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import List, Optional, Tuple
+from app.utils.type_cache import RestaurantTypeCache, candidates_fingerprint, extract_brand, normalize_name
+from app.utils.logger import setup_logger
+
+
+LOGGER = setup_logger("moco.log")
+
+# 各候选类型列表对应的分类器实例
+_CLASSIFIERS = {}
+_CLASSIFIERS_LOCK = threading.Lock()
+
+# 高德POI类别关键词 -> 类型关键词（类型关键词需出现在候选类型中才生效）
+GAODE_CATEGORY_HINTS = [
+    ('火锅', '火锅'),
+    ('烧烤', '烧烤'),
+    ('烤肉', '烤肉'),
+    ('中餐厅', '中餐'),
+    ('综合酒楼', '中餐'),
+    ('海鲜酒楼', '中餐'),
+    ('四川菜', '中餐'),
+    ('广东菜', '中餐'),
+    ('山东菜', '中餐'),
+    ('江苏菜', '中餐'),
+    ('浙江菜', '中餐'),
+    ('上海菜', '中餐'),
+    ('湖南菜', '中餐'),
+    ('安徽菜', '中餐'),
+    ('福建菜', '中餐'),
+    ('北京菜', '中餐'),
+    ('湖北菜', '中餐'),
+    ('东北菜', '中餐'),
+    ('云贵菜', '中餐'),
+    ('西北菜', '中餐'),
+    ('潮州菜', '中餐'),
+    ('台湾菜', '中餐'),
+    ('清真菜馆', '中餐'),
+    ('中式素菜馆', '中餐'),
+    ('老字号', '中餐'),
+    ('特色/地方风味餐厅', '中餐'),
+    ('快餐厅', '小吃'),
+    ('休闲餐饮场所', '小吃'),
+    ('糕饼店', '小吃'),
+    ('甜品店', '小吃'),
+    ('冷饮店', '小吃'),
+]
+
+# 餐厅名称中的常见关键词 -> 类型关键词（只收录含义明确的词，单字如"面""粉""串""烤"误判太多，不收录）
+NAME_HINTS = [
+    ('串串', '火锅'),
+    ('涮肉', '火锅'),
+    ('打边炉', '火锅'),
+    ('烤鸭', '中餐'),
+    ('烤串', '烧烤'),
+    ('撸串', '烧烤'),
+    ('炒菜', '中餐'),
+    ('小炒', '中餐'),
+    ('菜馆', '中餐'),
+    ('酒楼', '中餐'),
+    ('酒家', '中餐'),
+    ('饭店', '中餐'),
+    ('食府', '中餐'),
+    ('农家乐', '中餐'),
+    ('米粉', '小吃'),
+    ('粉店', '小吃'),
+    ('面馆', '小吃'),
+    ('拉面', '小吃'),
+    ('饺子', '小吃'),
+    ('包子', '小吃'),
+    ('馄饨', '小吃'),
+    ('粥铺', '小吃'),
+    ('甜品', '小吃'),
+    ('奶茶', '小吃'),
+    ('快餐', '小吃'),
+]
+
+# 各信号来源的置信度（名称常见关键词只作为参考，低于接受阈值0.6，单独出现时仍交给大模型确认）
+KEYWORD_CONFIDENCE = 0.95
+GAODE_CONFIDENCE = 0.85
+HINT_CONFIDENCE = 0.5
+
+# 可以写入类型缓存、参与学习的确认来源：名称直接包含候选类型关键词或大模型分析结果，
+# 其余来源（高德类别、常见关键词、学习词典）都是推断，不能反过来作为学习样本
+CONFIRMED_PROVENANCES = ('keyword', 'kimi', 'kimi_batch')
+
+_TOKEN_PATTERN = re.compile(r'[一-鿿a-z0-9]+')
+
+
+def name_tokens(name: str) -> List[str]:
+    """
+    将餐厅名称（去掉分店后缀）切分为字二元组
+    """
+    tokens = []
+    for segment in _TOKEN_PATTERN.findall(extract_brand(name)):
+        tokens.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+    return tokens
+
+
+class RestaurantTypeClassifier:
+    """
+    本地餐厅类型分类器
+
+    综合名称中的候选类型关键词、类型缓存、高德POI类别、名称常见关键词，
+    以及从已分类餐厅中学习到的名称字二元组词典，给出类型和置信度，
+    只有置信度不足时才需要调用大模型
+    """
+    def __init__(self, candidate_types_merged: List[str], type_cache: Optional[RestaurantTypeCache] = None,
+                 min_support: int = 2):
+        """
+        初始化分类器
+
+        :param candidate_types_merged: 配置中的候选类型列表（如"小食/小吃/美食"）
+        :param type_cache: 类型缓存，用于查询历史结果和初始化学习词典
+        :param min_support: 学习词典中字二元组参与投票所需的最少样本数
+        """
+        self.candidate_types_merged = list(candidate_types_merged)
+        self.type_cache = type_cache
+        self.min_support = min_support
+        # 拆分后的类型关键词 -> 候选类型
+        self._keyword_map = {}
+        for merged in self.candidate_types_merged:
+            for keyword in merged.split('/'):
+                if keyword and keyword not in self._keyword_map:
+                    self._keyword_map[keyword] = merged
+        self._tokens = defaultdict(Counter)
+        self._lock = threading.Lock()
+        if type_cache is not None:
+            for name, rest_type, _ in type_cache.entries('name', provenances=CONFIRMED_PROVENANCES):
+                self.learn(name, rest_type)
+
+    def _resolve(self, keyword: str) -> Optional[str]:
+        """
+        将类型关键词映射为候选类型，关键词不在候选类型中时返回None
+        """
+        if keyword in self._keyword_map:
+            return self._keyword_map[keyword]
+        for merged in self.candidate_types_merged:
+            if keyword in merged:
+                return merged
+        return None
+
+    def learn(self, name: str, rest_type: str) -> None:
+        """
+        将一条已确认的分类结果加入学习词典
+
+        :param name: 餐厅名称
+        :param rest_type: 候选类型
+        """
+        if rest_type not in self.candidate_types_merged:
+            return
+        with self._lock:
+            for token in set(name_tokens(name)):
+                self._tokens[token][rest_type] += 1
+
+    def _token_vote(self, name: str) -> Tuple[Optional[str], float]:
+        """
+        根据学习词典投票，返回类型及置信度
+        """
+        votes = Counter()
+        weight_sum = 0.0
+        with self._lock:
+            for token in set(name_tokens(name)):
+                dist = self._tokens.get(token)
+                if not dist:
+                    continue
+                support = sum(dist.values())
+                if support < self.min_support:
+                    continue
+                weight = min(support, 10) / 10
+                for rest_type, count in dist.items():
+                    votes[rest_type] += weight * count / support
+                weight_sum += weight
+        if not votes:
+            return None, 0.0
+        best, score = votes.most_common(1)[0]
+        # 至少需要两个有效字二元组才给出满置信度
+        confidence = score / weight_sum * min(1.0, weight_sum / 2) * 0.9
+        return best, confidence
+
+    def classify(self, name: str, rest_type_gaode: str = '', address: str = None) -> Tuple[Optional[str], float, str]:
+        """
+        对餐厅进行分类
+
+        :param name: 餐厅名称
+        :param rest_type_gaode: 高德POI类别，如 "餐饮服务;中餐厅;火锅店"
+        :param address: 餐厅地址，可选
+        :return: (候选类型或None, 置信度, 来源)
+        """
+        if not name or not isinstance(name, str):
+            return None, 0.0, 'none'
+        signals = []  # (类型, 置信度, 来源)
+        norm_name = normalize_name(name)
+
+        # 名称中直接包含候选类型关键词（优先匹配较长的关键词）
+        for keyword in sorted(self._keyword_map, key=len, reverse=True):
+            if keyword in norm_name:
+                signals.append((self._keyword_map[keyword], KEYWORD_CONFIDENCE, 'keyword'))
+                break
+
+        # 类型缓存（同品牌分店复用）
+        if self.type_cache is not None:
+            cached = self.type_cache.get(name, address)
+            if (cached and cached['rest_type'] in self.candidate_types_merged
+                    and cached['provenance'] in CONFIRMED_PROVENANCES):
+                signals.append((cached['rest_type'], cached['confidence'], 'cache'))
+
+        # 高德POI类别（从最细一级开始匹配）
+        if isinstance(rest_type_gaode, str) and rest_type_gaode:
+            levels = rest_type_gaode.split('|')[0].split(';')
+            matched = None
+            for level in reversed(levels):
+                for category, keyword in GAODE_CATEGORY_HINTS:
+                    if category in level:
+                        matched = self._resolve(keyword)
+                        if matched:
+                            break
+                if matched:
+                    break
+            if matched:
+                signals.append((matched, GAODE_CONFIDENCE, 'gaode'))
+
+        # 名称中的常见关键词，多个关键词指向不同类型时降低置信度
+        hinted = []
+        for hint, keyword in NAME_HINTS:
+            if hint in norm_name:
+                resolved = self._resolve(keyword)
+                if resolved and resolved not in hinted:
+                    hinted.append(resolved)
+        if hinted:
+            signals.append((hinted[0], HINT_CONFIDENCE if len(hinted) == 1 else HINT_CONFIDENCE / 2, 'hint'))
+
+        # 学习词典
+        token_type, token_confidence = self._token_vote(name)
+        if token_type:
+            signals.append((token_type, token_confidence, 'token'))
+
+        if not signals:
+            return None, 0.0, 'none'
+
+        # 同一类型的多个信号合并置信度：1 - ∏(1 - p)
+        merged = {}
+        for rest_type, confidence, provenance in signals:
+            if rest_type in merged:
+                prev_confidence, prev_provenance = merged[rest_type]
+                merged[rest_type] = (1 - (1 - prev_confidence) * (1 - confidence), prev_provenance)
+            else:
+                merged[rest_type] = (confidence, provenance)
+        best = max(merged, key=lambda t: merged[t][0])
+        confidence, provenance = merged[best]
+        return best, min(confidence, 0.99), provenance
+
+
+def get_type_classifier(candidate_types_merged: List[str],
+                        type_cache: Optional[RestaurantTypeCache] = None) -> RestaurantTypeClassifier:
+    """
+    获取（或创建）进程内共享的分类器实例，候选类型变化时重新创建
+    """
+    key = (candidates_fingerprint(candidate_types_merged), id(type_cache))
+    with _CLASSIFIERS_LOCK:
+        if key not in _CLASSIFIERS:
+            _CLASSIFIERS[key] = RestaurantTypeClassifier(candidate_types_merged, type_cache)
+        return _CLASSIFIERS[key]
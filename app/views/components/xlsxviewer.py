@@ -7,6 +7,7 @@ import sys
 import os
 import platform
 import subprocess
+import warnings
 from app.utils import oss_put_excel_file,oss_rename_excel_file, oss_get_excel_file
 from datetime import datetime
 import openpyxl
@@ -803,6 +804,50 @@ class XlsxViewerWidget(QWidget):
             return self.model.get_original_data()
         return None
     
+    def update_rows(self, records):
+        """
+        按行号就地更新部分行，不重建模型，只刷新变化的行
+        
+        Args:
+            records: {行号: {字段名: 值}}，行号为原始数据中的位置
+        """
+        if self._original_data is None or self.model is None or not records:
+            return
+        display_data = self.model.getDataFrame()
+        updated_rows = []
+        for row, record in records.items():
+            if not isinstance(row, int) or not 0 <= row < len(self._original_data):
+                continue
+            for field, value in record.items():
+                if field in self._original_data.columns:
+                    self._set_cell(self._original_data, row, field, value)
+                display_name = self.column_mapping.get(field, field)
+                if display_name in display_data.columns and row < len(display_data):
+                    if self.datetime_columns and field in self.datetime_columns:
+                        try:
+                            value = pd.to_datetime(value).strftime('%Y-%m-%d')
+                        except (ValueError, TypeError):
+                            pass
+                    self._set_cell(display_data, row, display_name, value)
+            updated_rows.append(row)
+        if not updated_rows:
+            return
+        self.model._cache.clear()
+        self.model.dataChanged.emit(self.model.index(min(updated_rows), 0),
+                                    self.model.index(max(updated_rows), max(0, self.model.columnCount() - 1)))
+    
+    @staticmethod
+    def _set_cell(frame, row, column, value):
+        """写入单个单元格，类型与列不兼容时先将该列转为object"""
+        col = frame.columns.get_loc(column)
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('error', FutureWarning)
+                frame.iloc[row, col] = value
+        except (TypeError, ValueError, FutureWarning):
+            frame[column] = frame[column].astype(object)
+            frame.iloc[row, col] = value
+    
     def set_data(self, data):
         """设置新数据"""
         if isinstance(data, pd.DataFrame):
@@ -20,6 +20,7 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
                             QApplication, QCheckBox, QSpinBox, QRadioButton, QToolButton, QDoubleSpinBox)
 from PyQt5.QtCore import Qt, QSize, QPoint, QRect, QThread, pyqtSignal, QEvent, QTimer
 from PyQt5.QtGui import QColor, QIcon, QPixmap, QPainter
+from PyQt5.QtNetwork import QTcpServer, QHostAddress
 import pandas as pd
 import random
 import time
@@ -32,8 +33,10 @@ from app.services.instances.cp import CP
 from app.config.config import CONF
 import oss2
 from app.services.functions.get_restaurant_service import GetRestaurantService
+from app.services.functions.worker_daemon import WorkerDaemonClient, run_in_process
 from app.services.instances.restaurant import RestaurantModel, Restaurant, RestaurantsGroup
 from app.utils import oss_get_excel_file, oss_put_excel_file
+from app.utils.file_io import write_frame, read_frame
 import concurrent.futures
 import copy
 import re
@@ -984,6 +987,26 @@ class RestaurantCompleteWorker(QThread):
             # 无论如何，都标记为已完成
             self.progress.emit("处理已完成")
 
+## 本地任务服务调用线程类
+class DaemonCallWorker(QThread):
+    """在后台线程中调用本地任务服务（启动服务、提交、取消、查询任务），避免等待时阻塞界面"""
+    result = pyqtSignal(object)  # 调用结果，出错时为None
+    
+    def __init__(self, call, parent=None):
+        """
+        :param call: 无参数的调用，返回值通过result信号发送回主线程
+        """
+        super().__init__(parent)
+        self.call = call
+    
+    def run(self):
+        try:
+            value = self.call()
+        except Exception as e:
+            LOGGER.error(f"调用本地任务服务时出错: {str(e)}")
+            value = None
+        self.result.emit(value)
+
 class Tab2(QWidget):
     """餐厅获取Tab，实现餐厅信息获取功能"""
     
@@ -1045,12 +1068,17 @@ class Tab2(QWidget):
                 except Exception:
                     pass
             
-            # 停止任务监控定时器
+            # 停止任务监控定时器并关闭各任务的进度通道
             if hasattr(self, 'task_monitor_timer') and self.task_monitor_timer is not None:
                 try:
                     self.task_monitor_timer.stop()
                 except Exception:
                     pass
+            for task_id in list(getattr(self, 'progress_tasks', {})):
+                try:
+                    self._stop_progress_server(task_id)
+                except Exception:
+                    pass
             
             # 检查是否已经在closeEvent中处理过
             if hasattr(self, 'cleaned_in_close_event') and self.cleaned_in_close_event:
@@ -2212,12 +2240,12 @@ class Tab2(QWidget):
                     restaurant_data = self.xlsx_viewer.model._original_data.copy()
                     LOGGER.info(f"从当前表格中获取 {len(restaurant_data)} 条餐厅记录")
                     
-                    # 保存到临时文件
+                    # 保存到临时文件（二进制格式，子进程无需解析Excel）
                     temp_dir = tempfile.gettempdir()
                     temp_dir = os.path.join(temp_dir, self.timestamp)
                     os.makedirs(temp_dir, exist_ok=True)
-                    input_file = os.path.join(temp_dir, f"restaurant_data_{self.timestamp}.xlsx")
-                    restaurant_data.to_excel(input_file, index=False)
+                    # 文件名带随机后缀，排队中的多个任务互不覆盖
+                    input_file = write_frame(restaurant_data, os.path.join(temp_dir, f"restaurant_data_{self.timestamp}_{uuid.uuid4().hex[:8]}"))
                     LOGGER.info(f"已将餐厅数据保存到临时文件: {input_file}")
                     
                     # 记录临时文件以便清理
@@ -2294,7 +2322,7 @@ class Tab2(QWidget):
                                      'services', 'scripts', 'complete_restaurants_info.py')
             
             # 创建临时配置文件，保存当前runtime配置
-            runtime_config_file = os.path.join(output_dir, f"runtime_config.json")
+            runtime_config_file = os.path.join(output_dir, f"runtime_config_{task_id}.json")
             try:
                 # 确保输出目录存在
                 os.makedirs(output_dir, exist_ok=True)
@@ -2353,6 +2381,12 @@ class Tab2(QWidget):
             if runtime_config_file and os.path.exists(runtime_config_file):
                 cmd.append(f"--config_file={runtime_config_file}")
             
+            # 启动进度通道，子进程通过该端口实时推送进度和结果
+            progress_port = self._start_progress_server(
+                task_id, source_data=self.xlsx_viewer.model._original_data if restaurant_data is not None else None)
+            if progress_port:
+                cmd.append(f"--progress_port={progress_port}")
+            
             # 如果有CP位置，添加到命令行
             if cp_location:
                 cmd.append(f"--cp_location={cp_location}")
@@ -2390,51 +2424,29 @@ class Tab2(QWidget):
             # 显示日志按钮
             self.view_log_button.setVisible(True)
             
-            # 将命令转换为字符串
-            cmd_str = ' '.join(cmd)
-            
-            # 根据平台使用不同的启动方式
-            if sys.platform == 'win32':  # Windows
-                # 在Windows上使用start命令打开新的CMD窗口
-                start_cmd = f'start cmd /k "{cmd_str}"'
-                os.system(start_cmd)
-                LOGGER.info(f"已在Windows新窗口启动命令: {cmd_str}")
-            elif sys.platform == 'darwin':  # macOS
-                # 在Mac上使用Terminal运行
-                script_content = f"""
-                #!/bin/bash
-                cd "{os.getcwd()}"
-                {cmd_str}
-                echo "按任意键关闭窗口..."
-                read -n 1
-                """
-                
-                # 创建临时脚本文件
-                script_file = os.path.join(output_dir, f"run_script_{task_id}.sh")
-                with open(script_file, 'w') as f:
-                    f.write(script_content)
-                
-                # 添加执行权限
-                os.chmod(script_file, 0o755)
-                
-                # 使用Terminal运行脚本
-                mac_cmd = f"open -a Terminal {script_file}"
-                os.system(mac_cmd)
-                
-                # 记录临时文件
-                self.temp_files.append(script_file)
-                if hasattr(self.conf.runtime, 'temp_files'):
-                    self.conf.runtime.temp_files.append(script_file)
-                
-                LOGGER.info(f"已在macOS新窗口启动命令: {cmd_str}")
-            else:  # Linux等其他系统
-                # 使用终端模拟器
-                linux_cmd = f"xterm -e '{cmd_str}; echo \"按回车键关闭窗口...\"; read'"
-                os.system(linux_cmd)
-                LOGGER.info(f"已在Linux新窗口启动命令: {cmd_str}")
-            
-            # 记录日志
-            LOGGER.info(f"已在新窗口启动命令: {cmd_str}")
+            # 添加取消任务按钮（如果不存在）
+            if not hasattr(self, 'cancel_task_button'):
+                self.cancel_task_button = QPushButton("取消任务")
+                self.cancel_task_button.setStyleSheet("margin-left: 10px;")
+                self.cancel_task_button.clicked.connect(self.cancel_current_task)
+                if hasattr(self, 'complete_button_layout') and self.complete_button_layout:
+                    self.complete_button_layout.addWidget(self.cancel_task_button)
+                else:
+                    self.log_layout.addWidget(self.cancel_task_button)
+            self.cancel_task_button.setEnabled(True)
+            self.cancel_task_button.setVisible(True)
+            
+            # 优先提交到本地任务队列，由常驻任务进程执行（无需重新启动解释器，缓存在任务间保持）；
+            # 无法启动任务服务时（如打包环境中启动失败）在当前进程的后台线程中执行。
+            # JOB_WORKERS只在启动任务服务时生效，任务服务已在运行时修改要等其重新启动后才应用。
+            # 启动任务服务最多需要等待数十秒，在后台线程中提交，结果回到主线程处理
+            task = self.current_task
+            task['submitting'] = True
+            workers = getattr(self.conf.runtime, 'JOB_WORKERS', 2)
+            cp_id = self.current_cp.get('cp_id') if self.current_cp else None
+            self._daemon_call(
+                lambda: WorkerDaemonClient(workers=workers).submit('complete', cmd[2:], job_id=task_id, cp_id=cp_id),
+                lambda job_id: self._on_complete_submitted(task, cmd, job_id))
             
             # 隐藏进度标签
             if hasattr(self, 'progress_label'):
@@ -2607,8 +2619,12 @@ class Tab2(QWidget):
                 
                 # 尝试加载结果
                 try:
-                    # 从文件加载数据
-                    result_data = pd.read_excel(result_file)
+                    # 从文件加载数据（优先使用二进制结果文件）
+                    result_frame_file = status_data.get('result_frame_file')
+                    if result_frame_file and os.path.exists(result_frame_file):
+                        result_data = read_frame(result_frame_file)
+                    else:
+                        result_data = pd.read_excel(result_file)
                     
                     # 更新UI
                     if len(result_data) > 0:
@@ -2957,6 +2973,94 @@ class Tab2(QWidget):
             # 重新启用验证按钮
             self.verify_status_button.setEnabled(True)
     
+    def _daemon_call(self, call, callback):
+        """
+        在后台线程中调用本地任务服务，完成后在主线程中以调用结果执行callback
+        
+        :param call: 无参数的调用
+        :param callback: 接收调用结果的函数（调用出错时收到None）
+        """
+        if not hasattr(self, 'daemon_calls'):
+            self.daemon_calls = set()
+        worker = DaemonCallWorker(call, self)
+        # 保持引用直到线程结束
+        self.daemon_calls.add(worker)
+        worker.result.connect(callback)
+        worker.finished.connect(lambda: self.daemon_calls.discard(worker))
+        worker.finished.connect(worker.deleteLater)
+        worker.start()
+    
+    def _on_complete_submitted(self, task, cmd, job_id):
+        """补全任务提交到本地任务队列后的处理；提交失败时在当前进程中执行"""
+        task_id = task['task_id']
+        task.pop('submitting', None)
+        if job_id:
+            task['daemon_job_id'] = job_id
+            # 任务失败后由任务队列重新排队重试，监控时据此查询是否仍会重试
+            progress_task = self._progress_task(task_id)
+            if progress_task is not None:
+                progress_task['daemon_job_id'] = job_id
+            LOGGER.info(f"已提交补全任务到本地任务队列: {job_id}")
+            if task.get('cancel_requested'):
+                self._daemon_call(lambda: WorkerDaemonClient().cancel(job_id),
+                                  lambda status: self._on_task_cancelled(task_id, status))
+        elif task.get('cancel_requested'):
+            # 提交期间已取消，不再在当前进程中执行
+            self._on_task_cancelled(task_id, 'cancelled')
+        else:
+            task['cancel_event'] = run_in_process('complete', cmd[2:], job_id=task_id)
+    
+    def _on_search_submitted(self, task, cmd, job_id):
+        """搜索任务提交到本地任务队列后的处理；提交失败时在当前进程中执行"""
+        if job_id:
+            task['daemon_job_id'] = job_id
+        else:
+            task['cancel_event'] = run_in_process('search', cmd[2:])
+    
+    def cancel_current_task(self):
+        """取消最近启动的补全任务：排队中的任务直接取消，运行中的任务在下一批次开始前停止"""
+        try:
+            task = getattr(self, 'current_task', None) or {}
+            task_id = task.get('task_id')
+            if task.get('daemon_job_id'):
+                job_id = task['daemon_job_id']
+                self.cancel_task_button.setEnabled(False)
+                self._daemon_call(lambda: WorkerDaemonClient().cancel(job_id),
+                                  lambda status: self._on_task_cancelled(task_id, status))
+                return
+            if task.get('cancel_event') is not None:
+                task['cancel_event'].set()
+                status = 'running'
+            elif task.get('submitting'):
+                # 仍在提交中，提交完成后再取消
+                task['cancel_requested'] = True
+                status = 'running'
+            else:
+                status = None
+            self._on_task_cancelled(task_id, status)
+        except Exception as e:
+            LOGGER.error(f"取消补全任务时出错: {str(e)}")
+    
+    def _on_task_cancelled(self, task_id, status):
+        """
+        处理取消请求的结果
+        
+        :param status: 取消后的任务状态（cancelled为已直接取消，running为等待当前批次完成后停止），失败时为None
+        """
+        try:
+            if status is None:
+                QMessageBox.warning(self, "取消失败", "无法取消任务，任务可能已经结束")
+                self.cancel_task_button.setEnabled(True)
+                return
+            self.cancel_task_button.setEnabled(False)
+            if status == 'cancelled':
+                # 尚未开始执行的任务不会再写状态文件，直接结束监控
+                self._handle_task_status(task_id, {'status': 'cancelled', 'message': '补全任务已取消'})
+            else:
+                self.update_progress("正在取消补全任务，当前批次完成后停止...")
+        except Exception as e:
+            LOGGER.error(f"取消补全任务时出错: {str(e)}")
+    
     def view_current_log(self):
         """打开当前任务的输出目录"""
         try:
@@ -3186,38 +3290,20 @@ class Tab2(QWidget):
                 'existing_data_file': existing_data_file
             }
             
-            # 根据平台启动命令
-            if sys.platform == 'win32':
-                # Windows
-                mode_text = "增补模式" if is_append_mode else "全新搜索"
-                title = f"餐厅搜索({mode_text}) - {city}"
-                start_cmd = f'start "{title}" cmd /k "{cmd_str} & echo. & echo 搜索完成，按任意键关闭窗口... & pause > nul"'
-                os.system(start_cmd)
-            elif sys.platform == 'darwin':
-                # macOS
-                script_content = f"""#!/bin/bash
-cd "{os.getcwd()}"
-{cmd_str}
-echo ""
-echo "搜索完成，按任意键关闭窗口..."
-read -n 1
-"""
-                script_file = os.path.join(output_dir, "run_search.sh")
-                with open(script_file, 'w') as f:
-                    f.write(script_content)
-                os.chmod(script_file, 0o755)
-                os.system(f"open -a Terminal {script_file}")
-                self.temp_files.append(script_file)
-            else:
-                # Linux
-                os.system(f"xterm -e '{cmd_str}; echo \"搜索完成，按回车键关闭窗口...\"; read'")
+            # 优先提交到本地任务队列，无法启动任务服务时在当前进程的后台线程中执行（在后台线程中提交）
+            task = self.current_low_resource_task
+            workers = getattr(self.conf.runtime, 'JOB_WORKERS', 2)
+            cp_id = self.current_cp['cp_id']
+            self._daemon_call(
+                lambda: WorkerDaemonClient(workers=workers).submit('search', cmd[2:], cp_id=cp_id),
+                lambda job_id: self._on_search_submitted(task, cmd, job_id))
             
             LOGGER.info(f"已启动低资源版餐厅搜索: {cmd_str}")
             
             # 显示提示信息
             mode_text = "增补模式" if is_append_mode else "全新搜索"
             message = (
-                f"餐厅搜索已在新窗口中启动({mode_text})。\n"
+                f"餐厅搜索已在后台启动({mode_text})。\n"
                 f"搜索城市: {city}\n"
                 f"输出目录: {output_dir}\n"
             )
@@ -3512,48 +3598,237 @@ read -n 1
             LOGGER.error(f"加载搜索结果时出错: {str(e)}")
             QMessageBox.critical(self, "加载失败", f"加载搜索结果时出错: {str(e)}")
     
+    def _progress_task(self, task_id, create=False):
+        """
+        返回任务的进度通道与监控状态（按task_id保存，多个任务同时运行时互不影响）
+        
+        :param task_id: 任务ID
+        :param create: 不存在时是否创建
+        :return: 状态字典，不存在且create为False时返回None
+        """
+        if not hasattr(self, 'progress_tasks'):
+            self.progress_tasks = {}
+        if create and task_id not in self.progress_tasks:
+            self.progress_tasks[task_id] = {
+                'server': None, 'socket': None, 'buffer': b"",
+                'finished': False, 'polling': False,
+                'status_file': None, 'output_dir': None,
+                # 通过通道收到、尚未显示到表格的逐条结果（按输入行号）
+                'pending': {}, 'refresh_time': 0,
+                # 任务队列中的任务ID（失败后可能重新排队重试）及已提示过的重试次数
+                'daemon_job_id': None, 'retry_attempts': 0,
+                # 任务输入对应的表格数据，表格仍显示该数据时才就地更新
+                'source_data': None,
+            }
+        return self.progress_tasks.get(task_id)
+    
+    def _start_progress_server(self, task_id, source_data=None):
+        """
+        启动任务的本地进度通道，返回监听端口（失败时返回None，退回到轮询状态文件）
+        
+        :param task_id: 任务ID
+        :param source_data: 任务输入对应的表格数据，收到的结果按行号就地更新到表格
+        """
+        task = self._progress_task(task_id, create=True)
+        task['source_data'] = source_data
+        try:
+            server = QTcpServer(self)
+            if not server.listen(QHostAddress.LocalHost, 0):
+                LOGGER.warning(f"进度通道监听失败: {server.errorString()}")
+                return None
+            server.newConnection.connect(lambda: self._on_progress_connection(task_id))
+            task['server'] = server
+            LOGGER.info(f"任务 {task_id} 的进度通道已启动，端口: {server.serverPort()}")
+            return server.serverPort()
+        except Exception as e:
+            LOGGER.error(f"启动进度通道失败: {str(e)}")
+            return None
+    
+    def _stop_progress_server(self, task_id):
+        """关闭任务的进度通道"""
+        task = self._progress_task(task_id)
+        if task is None:
+            return
+        if task['socket'] is not None:
+            task['socket'].disconnected.disconnect()
+            task['socket'].close()
+            task['socket'] = None
+        if task['server'] is not None:
+            task['server'].close()
+            task['server'] = None
+    
+    def _on_progress_connection(self, task_id):
+        """子进程连接到任务的进度通道"""
+        task = self._progress_task(task_id)
+        if task is None or task['server'] is None:
+            return
+        socket = task['server'].nextPendingConnection()
+        if socket is None:
+            return
+        if task['socket'] is not None:
+            # 每个任务只接受一个子进程的连接
+            socket.close()
+            return
+        task['socket'] = socket
+        socket.readyRead.connect(lambda: self._on_progress_ready_read(task_id))
+        socket.disconnected.connect(lambda: self._on_progress_disconnected(task_id))
+        # 已连接，不再需要轮询状态文件
+        task['polling'] = False
+        LOGGER.info(f"任务 {task_id} 的补全子进程已连接到进度通道")
+    
+    def _on_progress_ready_read(self, task_id):
+        """读取子进程推送的事件（按行分隔的JSON）"""
+        task = self._progress_task(task_id)
+        if task is None or task['socket'] is None:
+            return
+        try:
+            task['buffer'] += bytes(task['socket'].readAll())
+            *lines, task['buffer'] = task['buffer'].split(b"\n")
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    event = json.loads(line.decode('utf-8'))
+                except ValueError as e:
+                    LOGGER.warning(f"无法解析进度事件: {e}")
+                    continue
+                self._handle_progress_event(task_id, event)
+        except Exception as e:
+            LOGGER.error(f"处理进度事件时出错: {str(e)}")
+    
+    def _on_progress_disconnected(self, task_id):
+        """子进程断开连接，未收到结束状态时退回到轮询状态文件"""
+        task = self._progress_task(task_id)
+        if task is None:
+            return
+        task['socket'] = None
+        if not task['finished']:
+            LOGGER.warning(f"任务 {task_id} 的进度通道在任务结束前断开，改为轮询状态文件")
+            self._check_task_status(task_id)
+            if not task['finished']:
+                task['polling'] = True
+                self._ensure_task_polling()
+    
+    def _handle_progress_event(self, task_id, event):
+        """处理单个进度事件"""
+        task = self._progress_task(task_id)
+        event_type = event.get('event')
+        if event_type == 'status':
+            if event.get('message'):
+                self.update_progress(event['message'])
+            self._handle_task_status(task_id, event)
+        elif event_type == 'record' and task is not None:
+            task['pending'][event.get('row')] = event.get('record') or {}
+            self._refresh_streamed_records(task_id)
+        elif event_type == 'error':
+            LOGGER.error(f"补全子进程报告错误: {event.get('message', '')}")
+    
+    def _refresh_streamed_records(self, task_id, force=False):
+        """将新收到的补全结果按行号就地更新到表格（限制刷新频率，只更新变化的行）"""
+        task = self._progress_task(task_id)
+        if task is None or not task['pending']:
+            return
+        now = time.time()
+        if not force and now - task['refresh_time'] < 1:
+            return
+        task['refresh_time'] = now
+        pending, task['pending'] = task['pending'], {}
+        # 表格已切换为其他数据时不再更新，结果在任务完成后整体加载
+        if task['source_data'] is None or self.xlsx_viewer._original_data is not task['source_data']:
+            return
+        try:
+            self.xlsx_viewer.update_rows(pending)
+        except Exception as e:
+            LOGGER.error(f"显示补全结果时出错: {str(e)}")
+    
     def _start_task_monitoring(self, task_id, status_file, output_dir):
         """开始监控任务完成状态"""
         try:
-            # 存储监控相关信息
-            self.monitoring_task_id = task_id
-            self.monitoring_status_file = status_file
-            self.monitoring_output_dir = output_dir
-            
-            # 创建定时器用于轮询状态
-            if not hasattr(self, 'task_monitor_timer'):
-                self.task_monitor_timer = QTimer()
-                self.task_monitor_timer.timeout.connect(self._check_task_status)
-            
-            # 每5秒检查一次状态
-            self.task_monitor_timer.start(5000)
+            task = self._progress_task(task_id, create=True)
+            task['status_file'] = status_file
+            task['output_dir'] = output_dir
+            # 进度通道可用时由子进程推送状态，轮询只作为连接前的兜底
+            task['polling'] = task['socket'] is None
+            self._ensure_task_polling()
             LOGGER.info(f"开始监控任务状态: {task_id}")
             
         except Exception as e:
             LOGGER.error(f"启动任务监控失败: {str(e)}")
     
-    def _check_task_status(self):
+    def _ensure_task_polling(self):
+        """启动轮询定时器（所有任务共用，每5秒检查一次需要轮询的任务）"""
+        if not hasattr(self, 'task_monitor_timer'):
+            self.task_monitor_timer = QTimer()
+            self.task_monitor_timer.timeout.connect(self._poll_task_status)
+        if not self.task_monitor_timer.isActive():
+            self.task_monitor_timer.start(5000)
+    
+    def _poll_task_status(self):
+        """检查所有需要轮询的任务，没有时停止定时器"""
+        polling = [task_id for task_id, task in getattr(self, 'progress_tasks', {}).items()
+                   if task['polling'] and not task['finished']]
+        if not polling:
+            self.task_monitor_timer.stop()
+            return
+        for task_id in polling:
+            self._check_task_status(task_id)
+    
+    def _check_task_status(self, task_id):
         """检查任务状态"""
         try:
-            if not hasattr(self, 'monitoring_status_file') or not os.path.exists(self.monitoring_status_file):
+            task = self._progress_task(task_id)
+            if task is None or not task['status_file'] or not os.path.exists(task['status_file']):
                 return
             
             # 读取状态文件
-            with open(self.monitoring_status_file, 'r', encoding='utf-8') as f:
+            with open(task['status_file'], 'r', encoding='utf-8') as f:
                 status_data = json.load(f)
             
+            self._handle_task_status(task_id, status_data)
+                
+        except Exception as e:
+            LOGGER.error(f"检查任务状态时出错: {str(e)}")
+    
+    def _handle_task_status(self, task_id, status_data):
+        """根据任务状态（来自进度通道或状态文件）处理任务结束"""
+        try:
+            task = self._progress_task(task_id)
+            if task is None:
+                return
             task_status = status_data.get('status', '')
             
+            # 任务队列中的任务失败后会在达到最大尝试次数前重新排队，此时保持监控而不按失败结束
+            if task_status == 'failed' and not task['finished'] and not self._job_failed_finally(task_id, status_data):
+                return
+            
+            if task_status in ('completed', 'failed', 'cancelled'):
+                if task['finished']:
+                    return
+                task['finished'] = True
+                task['polling'] = False
+                self._stop_progress_server(task_id)
+                if hasattr(self, 'cancel_task_button') and (getattr(self, 'current_task', None) or {}).get('task_id') == task_id:
+                    self.cancel_task_button.setVisible(False)
+                if task_status == 'completed':
+                    self._refresh_streamed_records(task_id, force=True)
+                # 任务结束后释放该任务的状态
+                self.progress_tasks.pop(task_id, None)
+            
             if task_status == 'completed':
-                # 任务已完成，停止监控
-                self.task_monitor_timer.stop()
+                # 优先加载子进程写出的二进制结果，无需重新解析Excel
+                result_frame_file = status_data.get('result_frame_file')
+                if result_frame_file and os.path.exists(result_frame_file):
+                    try:
+                        self.xlsx_viewer.load_data(data=read_frame(result_frame_file))
+                    except Exception as e:
+                        LOGGER.error(f"加载补全结果时出错: {str(e)}")
                 
                 # 检查结果文件是否存在
                 result_file = status_data.get('result_file', '')
                 if not result_file:
                     # 如果状态文件中没有result_file路径，尝试构造路径
-                    result_file = os.path.join(self.monitoring_output_dir, 
-                                             f"result_{self.monitoring_task_id}【最终文件，请下载】.xlsx")
+                    result_file = os.path.join(task['output_dir'] or '',
+                                             f"result_{task_id}【最终文件，请下载】.xlsx")
                 
                 if os.path.exists(result_file):
                     # 弹窗询问用户是否打开文件
@@ -3563,13 +3838,56 @@ read -n 1
                     QMessageBox.information(self, "任务完成", "餐厅信息补全任务已完成，但结果文件未找到。")
                 
             elif task_status == 'failed':
-                # 任务失败，停止监控
-                self.task_monitor_timer.stop()
                 error_msg = status_data.get('error', '未知错误')
                 QMessageBox.warning(self, "任务失败", f"餐厅信息补全任务失败: {error_msg}")
+            
+            elif task_status == 'cancelled':
+                LOGGER.info(status_data.get('message', '补全任务已取消'))
                 
         except Exception as e:
-            LOGGER.error(f"检查任务状态时出错: {str(e)}")
+            LOGGER.error(f"处理任务状态时出错: {str(e)}")
+    
+    def _job_failed_finally(self, task_id, status_data):
+        """
+        判断报告失败的任务是否已确认最终失败（不在任务队列中或不再重试）
+        
+        任务在任务队列中时先返回False，在后台线程中查询任务队列，结果由_on_failed_job_info处理
+        """
+        task = self._progress_task(task_id)
+        if not task.get('daemon_job_id') or task.get('failed_finally'):
+            return True
+        if not task.get('job_info_pending'):
+            task['job_info_pending'] = True
+            job_id = task['daemon_job_id']
+            self._daemon_call(lambda: WorkerDaemonClient().job_info(job_id),
+                              lambda info: self._on_failed_job_info(task_id, status_data, info))
+        return False
+    
+    def _on_failed_job_info(self, task_id, status_data, info):
+        """
+        根据任务队列中的状态处理报告失败的任务
+        
+        最终失败时按失败结束任务；重新排队等待重试时显示“重试中 (n/m)”，
+        保持进度通道并轮询，由重试的子进程重新连接
+        """
+        task = self._progress_task(task_id)
+        if task is None or task['finished']:
+            return
+        task['job_info_pending'] = False
+        if info is None or info['status'] not in ('queued', 'running'):
+            task['failed_finally'] = True
+            self._handle_task_status(task_id, status_data)
+            return
+        if info['status'] == 'queued' and task['retry_attempts'] != info['attempts']:
+            task['retry_attempts'] = info['attempts']
+            message = f"补全任务失败，重试中 ({info['attempts'] + 1}/{info['max_attempts']})"
+            if info.get('error'):
+                message += f"：{info['error']}"
+            LOGGER.warning(f"任务 {task_id} {message}")
+            self.update_progress(message)
+        # 执行进程尚未记录结果（或重试已开始）时继续轮询，直到子进程重新连接或任务最终结束
+        task['polling'] = True
+        self._ensure_task_polling()
     
     def _show_completion_dialog(self, result_file):
         """显示任务完成对话框并询问是否打开文件"""
@@ -135,6 +135,20 @@ class TransportDialog(QDialog):
         sort_layout.addStretch()
         layout.addLayout(sort_layout)
 
+        # 装车方式
+        packer_layout = QHBoxLayout()
+        packer_layout.setAlignment(Qt.AlignLeft)
+        packer_label = QLabel("装车方式:")
+        packer_label.setFixedWidth(label_width)
+        packer_label.setAlignment(Qt.AlignLeft | Qt.AlignVCenter)
+        packer_layout.addWidget(packer_label)
+        self.packer_combo = QComboBox(self)
+        self.packer_combo.addItems(["顺序装车", "优化装车（最大化收油量）"])
+        self.packer_combo.setFixedWidth(input_width)
+        packer_layout.addWidget(self.packer_combo)
+        packer_layout.addStretch()
+        layout.addLayout(packer_layout)
+
         # 自定义区域顺序选择框（初始隐藏）
         self.custom_order_widget = QWidget()
         custom_order_layout = QVBoxLayout(self.custom_order_widget)
@@ -479,6 +493,10 @@ class TransportDialog(QDialog):
         
         return self.days_input.text(), self.month_year_combo.currentText(), self.bucket_ratio_input.text(), weight, sort_by_letter, district_order, is_custom_order
 
+    def get_packer_mode(self):
+        """获取装车方式：greedy（顺序装车）或 optimal（优化装车）"""
+        return 'optimal' if self.packer_combo.currentIndex() == 1 else 'greedy'
+
     def update_days_input(self):
         """根据选择的年月更新运输天数的默认值"""
         selected_date = self.month_year_combo.currentText()
@@ -1605,6 +1623,7 @@ class Tab3(QWidget):
             # 将区域顺序传递给服务层
             CONF.runtime.district_order = final_district_order
             CONF.runtime.sort_by_letter = sort_by_letter
+            CONF.runtime.TRIP_PACKER = dialog.get_packer_mode()
             
             try:
                 service = GetReceiveRecordService(model=ReceiveRecordModel, conf=CONF)
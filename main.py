@@ -2,12 +2,13 @@
 # -*- coding: utf-8 -*-
 
 import sys
-from PyQt5.QtWidgets import QApplication
-from app.views.main_window import MainWindow
+import multiprocessing
 
 def main():
     """应用程序主入口"""
     try:
+        from PyQt5.QtWidgets import QApplication
+        from app.views.main_window import MainWindow
         app = QApplication(sys.argv)
         main_window = MainWindow()
         main_window.show()
@@ -19,4 +20,11 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
+    # 打包后（PyInstaller）以spawn方式启动的子进程在此处执行并退出，不会重复启动界面
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker-daemon':
+        # 打包后的本地任务服务及任务执行进程（见worker_daemon._spawn），不加载界面
+        from app.services.functions.worker_daemon import main as worker_daemon_main
+        worker_daemon_main(sys.argv[2:])
+        sys.exit(0)
     main()